@@ -1,5 +1,4 @@
 import streamlit as st
-import os
 
 st.set_page_config(layout="wide")
 
@@ -11,8 +10,9 @@ if "module" not in st.session_state:
 # FLIGHT SCORE MODULE
 # =========================================================
 if st.session_state.module == "flightscore":
-    from compute_flightscore import compute_flight_score, compute_flight_metrics
-    import tempfile
+    from analysis_service import analyze
+    from log_ingest import spool_upload
+    from ranking import Ranking
 
     st.title("✈️ FlightScore")
 
@@ -25,21 +25,40 @@ if st.session_state.module == "flightscore":
     if not uploaded:
         st.stop()
 
-    flights = []
+    # only uploads not seen earlier this session are spooled and scored;
+    # the ranking is kept sorted across reruns
+    if "home_ranking" not in st.session_state:
+        st.session_state.home_ranking = Ranking()
+        st.session_state.home_uploads = {}   # upload id -> row key
+
+    ranking = st.session_state.home_ranking
+    uploads = st.session_state.home_uploads
+    current = set()
 
     for f in uploaded:
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".bin")
-        tmp.write(f.read())
+        upload_id = getattr(f, "file_id", None) or (f.name, f.size)
+        current.add(upload_id)
+        if upload_id in uploads:
+            continue
+
+        spooled = spool_upload(f, f.name)
 
-        score = compute_flight_score(tmp.name)
+        score = analyze("score", spooled.path, digest=spooled.digest)
 
-        flights.append({
+        ranking.add({
+            "key": spooled.digest,
             "name": f.name,
-            "path": tmp.name,
+            "path": spooled.path,
             "score": score
         })
+        uploads[upload_id] = spooled.digest
+
+    for upload_id in [u for u in uploads if u not in current]:
+        key = uploads.pop(upload_id)
+        if key not in uploads.values():
+            ranking.discard(key)
 
-    flights.sort(key=lambda x: x["score"], reverse=True)
+    flights = ranking.ordered()
 
     st.subheader("Ranking")
 
@@ -55,9 +74,9 @@ if st.session_state.module == "flightscore":
             sel = st.session_state.selected_flight
     
         st.divider()
-        st.subheader(f"Flight Details — {os.path.basename(sel['path'])}")
+        st.subheader(f"Flight Details — {sel['name']}")
     
-        metrics = compute_flight_metrics(sel["path"])
+        metrics = analyze("metrics", sel["path"])
     
         colA, colB, colC = st.columns(3)
     
@@ -0,0 +1,637 @@
+"""
+Local analysis service shared by all Streamlit sessions.
+
+Run once per host:
+
+    python analysis_service.py --port 8765 --workers 4 --cache-mb 512 --dataset-mb 1024
+
+The daemon keeps warm worker processes (pymavlink and the compute
+modules are imported once per worker) and an in-memory cache of
+finished results keyed by log content hash, evicted LRU against a byte
+budget.  Concurrent requests for the same log share one computation.
+
+A log always goes to the same worker (chosen by its content hash), which
+keeps its decoded columns in a DatasetCache bounded by its share of
+--dataset-mb, so "metrics" and then "degrade" for one flight decode it
+once.  A worker that dies (say, out of memory on a huge log) fails the
+requests it was running and is replaced; the other workers carry on.
+
+Pages call analyze(); when no daemon is listening it falls back to
+computing in-process so the app still works standalone.
+
+--memory-budget-mb (or FLIGHT_MEMORY_BUDGET_MB) caps the memory one
+analysis may use: logs estimated to need more are analysed in streaming
+mode with online accumulators (see online_stats).
+
+Results already in the persistent results store (filled by
+watch_folder.py) are returned without computing.
+
+HTTP API (JSON responses, localhost by default), usable without the app:
+
+    GET  /health                    cache statistics
+    POST /analyze/<kind>            {"path": ref, "digest": optional}
+    POST /upload/<kind>?name=x.bin  raw log bytes as the body (plain or
+                                    chunked); spooled while hashing
+    POST /batch/<kind>              {"logs": [ref or {"path", "digest"}, ...]}
+
+kind is one of KINDS; "degrade" includes the subsystem assessment.  At
+most --max-requests POSTs are handled at once, beyond that the reply is
+503 with Retry-After.  upload_analyze() and analyze_batch() are the
+matching clients.
+"""
+
+import argparse
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import numpy as np
+
+import log_ingest
+from flight_dataset import FlightDataset
+from online_stats import over_budget
+from results_store import shared_store
+
+DEFAULT_URL = os.environ.get("FLIGHT_ANALYSIS_URL", "http://127.0.0.1:8765")
+
+MEMORY_BUDGET_MB = (float(os.environ["FLIGHT_MEMORY_BUDGET_MB"])
+                    if os.environ.get("FLIGHT_MEMORY_BUDGET_MB") else None)
+
+KINDS = ("score", "preview", "metrics", "degrade")
+
+
+# ---------------- HELPERS ----------------
+
+def file_digest(ref, chunk_bytes=1 << 20):
+    path, _ = log_ingest.split_ref(ref)
+    return log_ingest.ref_digest(log_ingest.file_sha256(path, chunk_bytes), ref)
+
+
+def to_jsonable(obj):
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+# ---------------- ANALYSIS KINDS ----------------
+
+def _degrade_result(metrics, series):
+    from anomalies import detect_events
+    from compute_logic1 import assess_subsystems, overall_bottleneck
+
+    subs = assess_subsystems(metrics)
+    return to_jsonable({
+        "metrics": metrics,
+        "series": series,
+        "subsystems": subs,
+        "bottleneck": list(overall_bottleneck(subs)),
+        "events": detect_events(series),
+    })
+
+
+def _run_dataset(kind, dataset):
+    # compressed logs and session datasets: one decode of every column
+    # both modules read, then the dataset-aware entry points
+    from compute_flightscore import compute_flight_metrics, compute_flight_score
+    from compute_logic1 import analyze_log
+
+    if kind in ("score", "preview"):
+        score = compute_flight_score(dataset)
+        if kind == "score":
+            return score
+        # decoded in full anyway (and no random access into a compressed
+        # stream): the exact score is the preview
+        return {"score": score, "ci_low": score, "ci_high": score,
+                "coverage": 1.0, "exact": True}
+
+    if kind == "metrics":
+        return to_jsonable(compute_flight_metrics(dataset))
+
+    if kind == "degrade":
+        return _degrade_result(*analyze_log(dataset))
+
+    raise ValueError(f"unknown analysis kind: {kind}")
+
+
+def _run_budgeted(kind, ref, memory_budget_mb):
+    # logs over the memory budget: online accumulators only
+    from compute_flightscore import compute_flight_metrics, compute_flight_score_preview
+    from compute_logic1 import analyze_log
+
+    if kind == "degrade":
+        return _degrade_result(*analyze_log(ref, memory_budget_mb))
+
+    if kind == "preview" and log_ingest.is_raw_dataflash(ref):
+        # reads a few chunks only, whatever the log size
+        return to_jsonable(compute_flight_score_preview(ref))
+
+    metrics = to_jsonable(compute_flight_metrics(ref, memory_budget_mb))
+
+    if kind == "metrics":
+        return metrics
+
+    score = metrics["flight_score"]
+    if kind == "score":
+        return score
+
+    if kind == "preview":
+        return {"score": score, "ci_low": score, "ci_high": score,
+                "coverage": 1.0, "exact": True}
+
+    raise ValueError(f"unknown analysis kind: {kind}")
+
+
+def run_analysis(kind, path, memory_budget_mb=MEMORY_BUDGET_MB):
+    """
+    Compute one analysis kind for a log ref or FlightDataset; result is
+    JSON-serialisable.
+    """
+    if isinstance(path, FlightDataset):
+        if path.decoded or not over_budget(path.ref, memory_budget_mb):
+            return _run_dataset(kind, path)
+        path = path.ref
+
+    if over_budget(path, memory_budget_mb):
+        return _run_budgeted(kind, path, memory_budget_mb)
+
+    if not log_ingest.is_raw_dataflash(path):
+        return _run_dataset(kind, FlightDataset(path))
+
+    if kind == "score":
+        from compute_flightscore import compute_flight_score
+        return compute_flight_score(path)
+
+    if kind == "preview":
+        from compute_flightscore import compute_flight_score_preview
+        return to_jsonable(compute_flight_score_preview(path))
+
+    if kind == "metrics":
+        from compute_flightscore import compute_flight_metrics
+        return to_jsonable(compute_flight_metrics(path))
+
+    if kind == "degrade":
+        from compute_logic1 import analyze_log
+        return _degrade_result(*analyze_log(path))
+
+    raise ValueError(f"unknown analysis kind: {kind}")
+
+
+def stored_result(kind, key):
+    """kind for the log with content key from the results store, or None."""
+    store = shared_store()
+    if store is None:
+        return None
+    if kind in ("score", "preview"):
+        metrics = store.get("metrics", key)
+        if metrics is None:
+            return None
+        score = metrics["flight_score"]
+        if kind == "score":
+            return score
+        return {"score": score, "ci_low": score, "ci_high": score,
+                "coverage": 1.0, "exact": True}
+    return store.get(kind, key)
+
+
+# ---------------- WORKER-SIDE DECODED LOGS ----------------
+
+class DatasetCache:
+    """LRU of decoded FlightDatasets keyed by content digest, bounded by column bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+
+    def decoded(self, key):
+        ds = self._items.get(key)
+        return ds is not None and ds.decoded
+
+    def get(self, key, ref):
+        ds = self._items.get(key)
+        if ds is None:
+            ds = self._items[key] = FlightDataset(ref, key)
+        self._items.move_to_end(key)
+        return ds
+
+    def trim(self):
+        used = sum(ds.nbytes for ds in self._items.values())
+        while used > self.max_bytes and self._items:
+            _, dropped = self._items.popitem(last=False)
+            used -= dropped.nbytes
+
+
+_datasets = None    # this worker process's DatasetCache
+
+
+def _warm_worker(dataset_bytes=0):
+    global _datasets
+    _datasets = DatasetCache(dataset_bytes)
+    # pay the pymavlink / dialect import once per worker process
+    import compute_flightscore  # noqa: F401
+    import compute_logic1  # noqa: F401
+    from pymavlink import mavutil  # noqa: F401
+
+
+def _worker_run(kind, ref, key, memory_budget_mb):
+    """run_analysis in a service worker, on its decoded copy of the log when one fits."""
+    cache = _datasets
+    if cache is None or cache.max_bytes <= 0 or over_budget(ref, memory_budget_mb):
+        return run_analysis(kind, ref, memory_budget_mb)
+    if kind == "preview" and not cache.decoded(key):
+        # a few sampled chunks are cheaper than a full decode
+        return run_analysis(kind, ref, memory_budget_mb)
+    try:
+        return run_analysis(kind, cache.get(key, ref), memory_budget_mb)
+    finally:
+        cache.trim()
+
+
+# ---------------- RESULT CACHE ----------------
+
+class ResultCache:
+    """LRU cache of encoded results bounded by total bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            val = self._items.get(key)
+            if val is not None:
+                self._items.move_to_end(key)
+            return val
+
+    def put(self, key, val):
+        if len(val) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.used -= len(old)
+            self._items[key] = val
+            self.used += len(val)
+            while self.used > self.max_bytes:
+                _, dropped = self._items.popitem(last=False)
+                self.used -= len(dropped)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.used,
+                    "max_bytes": self.max_bytes}
+
+
+# ---------------- SERVICE ----------------
+
+class AnalysisService:
+    def __init__(self, workers=None, cache_bytes=512 << 20, memory_budget_mb=MEMORY_BUDGET_MB,
+                 max_requests=64, dataset_bytes=1 << 30):
+        self.workers = workers or os.cpu_count() or 1
+        self.dataset_bytes = dataset_bytes
+        self.memory_budget_mb = memory_budget_mb
+        self.admission = threading.BoundedSemaphore(max_requests)
+        self.cache = ResultCache(cache_bytes)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # one single-process pool per worker, so a log can be routed to the
+        # worker holding its decoded columns
+        self.pools = [self._new_pool() for _ in range(self.workers)]
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=1, initializer=_warm_worker,
+                                   initargs=(self.dataset_bytes // self.workers,))
+
+    def _submit(self, kind, path, digest):
+        # caller holds self._lock
+        i = zlib.crc32(digest.encode()) % self.workers
+        pool = self.pools[i]
+        try:
+            return pool, pool.submit(_worker_run, kind, path, digest, self.memory_budget_mb)
+        except BrokenProcessPool:
+            pool = self.pools[i] = self._new_pool()
+            return pool, pool.submit(_worker_run, kind, path, digest, self.memory_budget_mb)
+
+    def _replace(self, pool):
+        with self._lock:
+            if pool in self.pools:
+                self.pools[self.pools.index(pool)] = self._new_pool()
+        pool.shutdown(wait=False)
+
+    def analyze(self, kind, path, digest=None):
+        """
+        Return the encoded JSON result for (kind, log content).
+        digest: content hash already computed by the caller (see
+        log_ingest.spool_upload), which skips re-reading the file.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"unknown analysis kind: {kind}")
+
+        if digest is not None:
+            digest = log_ingest.ref_digest(digest, path)
+        key = (kind, digest or file_digest(path))
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+
+        stored = stored_result(kind, key[1])
+        if stored is not None:
+            body = json.dumps(stored).encode()
+            self.cache.put(key, body)
+            return body
+
+        with self._lock:
+            job = self._inflight.get(key)
+            owner = job is None
+            if owner:
+                job = self._inflight[key] = self._submit(kind, path, key[1])
+        pool, fut = job
+
+        try:
+            body = json.dumps(fut.result()).encode()
+        except BrokenProcessPool:
+            self._replace(pool)
+            raise RuntimeError(f"analysis worker died on {log_ingest.log_name(path)} "
+                               "(out of memory?)") from None
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        if owner:
+            self.cache.put(key, body)
+        return body
+
+    def analyze_upload(self, kind, src, name):
+        """Spool an upload stream and analyse every log in it."""
+        if kind not in KINDS:
+            raise ValueError(f"unknown analysis kind: {kind}")
+        spooled = log_ingest.spool_upload(src, name)
+        if spooled.size == 0:
+            raise ValueError("empty upload")
+        return {
+            "digest": spooled.digest,
+            "logs": [{
+                "name": log_ingest.log_name(ref),
+                "ref": ref,
+                "result": json.loads(self.analyze(kind, ref, spooled.digest)),
+            } for ref in log_ingest.list_logs(spooled.path)],
+        }
+
+    def analyze_batch(self, kind, logs):
+        """
+        Analyse many logs (refs or {"path", "digest"}); zips expand to
+        their members.  Results keep the request order; a failing log gets
+        an "error" entry instead of failing the batch.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"unknown analysis kind: {kind}")
+
+        items = []
+        for item in logs:
+            item = {"path": item} if isinstance(item, str) else item
+            try:
+                refs = log_ingest.list_logs(item["path"])
+            except Exception as ex:     # unreadable archive
+                items.append((item["path"], ex))
+                continue
+            items.extend((ref, item.get("digest")) for ref in refs)
+
+        def one(item):
+            ref, digest = item
+            if isinstance(digest, Exception):
+                return {"path": ref, "error": str(digest)}
+            try:
+                return {"path": ref, "result": json.loads(self.analyze(kind, ref, digest))}
+            except Exception as ex:
+                return {"path": ref, "error": str(ex)}
+
+        # threads only wait on the process pool; twice its size keeps it busy
+        with ThreadPoolExecutor(max_workers=2 * self.workers) as ex:
+            return {"results": list(ex.map(one, items))}
+
+    def shutdown(self):
+        for pool in self.pools:
+            pool.shutdown(cancel_futures=True)
+
+
+class _BodyReader:
+    """read(n) over a request body sent with Content-Length or chunked encoding."""
+
+    def __init__(self, rfile, headers):
+        self.rfile = rfile
+        self.chunked = "chunked" in headers.get("Transfer-Encoding", "").lower()
+        self.left = 0 if self.chunked else int(headers.get("Content-Length", 0))
+        self.done = False
+
+    def read(self, n=-1):
+        if not self.chunked:
+            n = self.left if n < 0 else min(n, self.left)
+            data = self.rfile.read(n) if n else b""
+            self.left -= len(data)
+            return data
+
+        if self.done:
+            return b""
+        if self.left == 0:
+            size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # skip trailers up to the closing blank line
+                while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                self.done = True
+                return b""
+            self.left = size
+        data = self.rfile.read(self.left if n < 0 else min(n, self.left))
+        self.left -= len(data)
+        if self.left == 0:
+            self.rfile.readline()   # CRLF closing the chunk
+        return data
+
+
+def _make_handler(service):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, code, body):
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, json.dumps(service.cache.stats()).encode())
+            else:
+                self._reply(404, b'{"error": "not found"}')
+
+        def _json_body(self):
+            return json.loads(_BodyReader(self.rfile, self.headers).read() or b"{}")
+
+        def _route(self, route, kind):
+            if route == "analyze":
+                req = self._json_body()
+                return service.analyze(kind, req["path"], req.get("digest"))
+            if route == "upload":
+                name = parse_qs(urlsplit(self.path).query).get("name", ["upload.bin"])[0]
+                src = _BodyReader(self.rfile, self.headers)
+                return json.dumps(service.analyze_upload(kind, src, name)).encode()
+            if route == "batch":
+                req = self._json_body()
+                return json.dumps(service.analyze_batch(kind, req["logs"])).encode()
+            return None
+
+        def do_POST(self):
+            route, _, kind = urlsplit(self.path).path.strip("/").partition("/")
+
+            if not service.admission.acquire(blocking=False):
+                self.send_response(503)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            try:
+                body = self._route(route, kind)
+            except (KeyError, ValueError, OSError) as ex:
+                self._reply(400, json.dumps({"error": str(ex)}).encode())
+                return
+            except Exception as ex:
+                self._reply(500, json.dumps({"error": str(ex)}).encode())
+                return
+            finally:
+                service.admission.release()
+
+            if body is None:
+                self._reply(404, b'{"error": "not found"}')
+            else:
+                self._reply(200, body)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def make_server(host="127.0.0.1", port=8765, workers=None, cache_mb=512,
+                memory_budget_mb=MEMORY_BUDGET_MB, max_requests=64, dataset_mb=1024):
+    """
+    (httpd, service) ready for httpd.serve_forever(); port=0 picks a free
+    port (see httpd.server_address), which is handy for local tests.
+    """
+    service = AnalysisService(workers=workers, cache_bytes=cache_mb << 20,
+                              memory_budget_mb=memory_budget_mb, max_requests=max_requests,
+                              dataset_bytes=int(dataset_mb) << 20)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    return httpd, service
+
+
+def serve(host="127.0.0.1", port=8765, workers=None, cache_mb=512,
+          memory_budget_mb=MEMORY_BUDGET_MB, max_requests=64, dataset_mb=1024):
+    httpd, service = make_server(host, port, workers, cache_mb, memory_budget_mb, max_requests,
+                                 dataset_mb)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+# ---------------- CLIENT ----------------
+
+def _abs_ref(ref):
+    path, member = log_ingest.split_ref(ref)
+    path = os.path.abspath(path)
+    return path if member is None else f"{path}{log_ingest.MEMBER_SEP}{member}"
+
+
+def analyze(kind, path, digest=None, url=None, timeout=600, dataset=None):
+    """
+    Run an analysis through the shared daemon, or in-process when no
+    daemon is reachable.  The in-process run uses `dataset` (a
+    FlightDataset of the same log) when given, so analyses of one flight
+    share a single decode.
+    """
+    url = url or DEFAULT_URL
+    req = urllib.request.Request(
+        f"{url}/analyze/{kind}",
+        data=json.dumps({"path": _abs_ref(path), "digest": digest}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read())
+    except urllib.error.HTTPError:
+        raise
+    except (urllib.error.URLError, ConnectionError):
+        if digest is not None:
+            stored = stored_result(kind, log_ingest.ref_digest(digest, path))
+            if stored is not None:
+                return stored
+        return to_jsonable(run_analysis(kind, dataset or path))
+
+
+def _post(url, data, timeout, headers=None):
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read())
+
+
+def upload_analyze(kind, src, name=None, url=None, timeout=600, chunk_bytes=1 << 20):
+    """
+    Stream a log (path or binary file object) to the daemon's upload
+    endpoint with chunked encoding; returns {"digest", "logs": [...]}.
+    No local fallback: this is for clients that do not share a disk.
+    """
+    url = url or DEFAULT_URL
+    own = isinstance(src, (str, os.PathLike))
+    fh = open(src, "rb") if own else src
+    name = name or os.path.basename(getattr(fh, "name", "upload.bin"))
+    try:
+        return _post(f"{url}/upload/{kind}?name={quote(name)}",
+                     iter(lambda: fh.read(chunk_bytes), b""), timeout,
+                     {"Content-Type": "application/octet-stream"})
+    finally:
+        if own:
+            fh.close()
+
+
+def analyze_batch(kind, logs, url=None, timeout=3600):
+    """Analyse many logs (refs or {"path", "digest"}) in one request."""
+    url = url or DEFAULT_URL
+    logs = [_abs_ref(x) if isinstance(x, str) else {**x, "path": _abs_ref(x["path"])}
+            for x in logs]
+    return _post(f"{url}/batch/{kind}", json.dumps({"logs": logs}).encode(), timeout,
+                 {"Content-Type": "application/json"})
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Shared flight-log analysis daemon")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--cache-mb", type=int, default=512)
+    ap.add_argument("--memory-budget-mb", type=float, default=MEMORY_BUDGET_MB,
+                    help="analyse logs estimated to need more than this in streaming mode")
+    ap.add_argument("--max-requests", type=int, default=64,
+                    help="POSTs handled at once before answering 503")
+    ap.add_argument("--dataset-mb", type=int, default=1024,
+                    help="decoded log columns kept across requests, split between workers")
+    args = ap.parse_args()
+    serve(args.host, args.port, args.workers, args.cache_mb, args.memory_budget_mb,
+          args.max_requests, args.dataset_mb)
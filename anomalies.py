@@ -0,0 +1,166 @@
+"""
+Within-flight anomaly detection on rolling windows.
+
+Whole-flight aggregates (gyro_rms, vcc_min, ...) average short events
+away.  The rolling statistics here are O(n) in the number of samples:
+mean / RMS / std come from cumulative sums, and the rolling minimum uses
+the block prefix/suffix (van Herk / Gil-Werman) scheme on strided
+windows, so window length does not affect cost.
+
+All rolling_* functions use trailing windows: out[i] covers
+x[i - w + 1 : i + 1].  The first w - 1 outputs use the partial window.
+"""
+
+import numpy as np
+
+
+# ---------------- ROLLING STATISTICS ----------------
+
+def _window_sums(x, w):
+    c = np.concatenate(([0.0], np.cumsum(x, dtype=float)))
+    hi = np.arange(1, len(x) + 1)
+    lo = np.maximum(hi - w, 0)
+    return c[hi] - c[lo], hi - lo
+
+
+def rolling_mean(x, w):
+    x = np.asarray(x, dtype=float)
+    s, n = _window_sums(x, w)
+    return s / n
+
+
+def rolling_rms(x, w):
+    x = np.asarray(x, dtype=float)
+    s, n = _window_sums(x * x, w)
+    return np.sqrt(s / n)
+
+
+def rolling_std(x, w):
+    # shift by the overall mean so the sum-of-squares form stays accurate
+    x = np.asarray(x, dtype=float)
+    if len(x) == 0:
+        return x
+    x = x - x.mean()
+    s1, n = _window_sums(x, w)
+    s2, _ = _window_sums(x * x, w)
+    var = s2 / n - (s1 / n) ** 2
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def rolling_min(x, w):
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    if n == 0 or w <= 1:
+        return x.copy()
+    w = min(w, n)
+
+    # pad the front so every output has a full window, then split into blocks of w
+    pad = np.full(w - 1, np.inf)
+    y = np.concatenate((pad, x))
+    m = -(-len(y) // w) * w
+    y = np.concatenate((y, np.full(m - len(y), np.inf)))
+    blocks = y.reshape(-1, w)
+
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    start = np.arange(n)            # window start in padded coordinates
+    return np.minimum(suffix[start], prefix[start + w - 1])
+
+
+# ---------------- EVENTS ----------------
+
+def _runs(mask):
+    """(start, end) index pairs of consecutive True runs, end inclusive."""
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return []
+    d = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1) - 1
+    return list(zip(starts, ends))
+
+
+def window_samples(t, seconds):
+    if len(t) < 2:
+        return 1
+    dt = np.median(np.diff(t))
+    return max(1, int(round(seconds / dt))) if dt > 0 else 1
+
+
+def _events(kind, subsystem, t, mask, values, reduce, min_duration=0.0):
+    out = []
+    for a, b in _runs(mask):
+        if t[b] - t[a] < min_duration:
+            continue
+        out.append({
+            "type": kind,
+            "subsystem": subsystem,
+            "start": float(t[a]),
+            "end": float(t[b]),
+            "value": float(reduce(values[a:b + 1])),
+        })
+    return out
+
+
+def vcc_dips(vcc, t, threshold=4.8):
+    vcc = np.asarray(vcc, dtype=float)
+    return _events("vcc_dip", "fc", t, vcc < threshold, vcc, np.min)
+
+
+def vcc_noise(vcc, t, window_s=2.0, max_std=0.1):
+    vcc = np.asarray(vcc, dtype=float)
+    sd = rolling_std(vcc, window_samples(t, window_s))
+    return _events("vcc_noise", "fc", t, sd > max_std, sd, np.max)
+
+
+def vibration_spikes(gyro, t, window_s=1.0, factor=2.0, floor=0.4):
+    """Windows whose rolling gyro RMS exceeds both floor and factor x flight RMS."""
+    gyro = np.asarray(gyro, dtype=float)
+    if len(gyro) == 0:
+        return []
+    rms = rolling_rms(gyro, window_samples(t, window_s))
+    limit = max(floor, factor * np.sqrt(np.mean(gyro ** 2)))
+    return _events("vibration_spike", "propulsion", t, rms > limit, rms, np.max)
+
+
+def motor_saturation(thrust, t, threshold=0.95, min_duration=0.5):
+    thrust = np.asarray(thrust, dtype=float)
+    return _events("motor_saturation", "thrust", t, thrust >= threshold,
+                   thrust, np.max, min_duration)
+
+
+def battery_sag(volt, t, window_s=2.0, drop=1.0):
+    """Short dips where voltage falls `drop` volts below its longer-run mean."""
+    volt = np.asarray(volt, dtype=float)
+    if len(volt) == 0:
+        return []
+    w = window_samples(t, window_s)
+    base = rolling_mean(volt, 5 * w)
+    low = rolling_min(volt, w)
+    return _events("battery_sag", "battery", t, base - low > drop, low, np.min)
+
+
+def detect_events(series):
+    """
+    Time-stamped events from analyze_log series (requires series["time"]).
+    Returns a list of {"type", "subsystem", "start", "end", "value"}
+    sorted by start time; start / end are seconds from log start.
+    """
+    times = series.get("time", {})
+    events = []
+
+    def have(k):
+        return k in times and len(series[k]) > 0
+
+    if have("vcc"):
+        events += vcc_dips(series["vcc"], times["vcc"])
+        events += vcc_noise(series["vcc"], times["vcc"])
+    if have("vibration"):
+        events += vibration_spikes(series["vibration"], times["vibration"])
+    if have("thrust"):
+        events += motor_saturation(series["thrust"], times["thrust"])
+    if have("battery"):
+        events += battery_sag(series["battery"], times["battery"])
+
+    return sorted(events, key=lambda e: e["start"])
@@ -0,0 +1,358 @@
+"""
+Time-based battery discharge model.
+
+Each flight's BAT samples are fitted with
+
+    V(t, I) = v0 + slope * t - r_int * I
+
+(t in seconds from the first sample, I in amps) by Huber-weighted
+iteratively reweighted least squares, so brief glitches and sensor
+spikes do not drag the fit.  r_int captures the voltage sag under load;
+when a log has no current column the sag term is dropped.
+
+fit_discharge_batch() concatenates any number of flights into flat sample
+arrays, builds every flight's 3x3 normal equations with segment sums
+(np.bincount) and solves them at once, so fitting thousands of flights
+is a handful of array passes over the samples, with no padding to the
+longest flight.  DischargeSums accumulates the
+same normal equations block by block for logs analysed in streaming mode.
+
+The pack's cell count is read from the log's parameters rather than
+assumed: MOT_BAT_VOLT_MAX, MOT_BAT_VOLT_MIN or BATT_LOW_VOLT, each
+checked against the peak measured voltage, which is the fallback.
+"""
+
+import numpy as np
+
+CELL_FULL_V = 4.2
+CELL_NOMINAL_V = 3.7
+CELL_CUTOFF_V = 3.5
+
+# parameters that describe the pack, with the per-cell voltage each implies
+CELL_PARAMS = [
+    ("MOT_BAT_VOLT_MAX", CELL_FULL_V),
+    ("MOT_BAT_VOLT_MIN", CELL_CUTOFF_V),
+    ("BATT_LOW_VOLT", CELL_CUTOFF_V),
+]
+
+BATTERY_PARAMS = [name for name, _ in CELL_PARAMS]
+
+
+# ---------------- PACK ----------------
+
+def _peak_voltage(volt):
+    if volt is None:
+        return None
+    volt = np.asarray(volt, dtype=float)
+    volt = volt[np.isfinite(volt)]
+    peak = float(volt.max()) if len(volt) else 0.0
+    return peak if peak > 0 else None
+
+
+def _fits_peak(cells, peak):
+    """Whether a pack of `cells` could have measured `peak` volts."""
+    return peak is None or cells * CELL_CUTOFF_V <= peak <= cells * (CELL_FULL_V + 0.05)
+
+
+def cell_count(params, volt=None):
+    """
+    Series cell count of the pack.
+    Returns (cells, source) where source names the parameter used,
+    "voltage" for the fallback, or None when nothing is known.
+
+    A parameter is only used when the peak measured voltage agrees with
+    it: BATT_LOW_VOLT often keeps its 3S default (10.5 V) on bigger packs.
+    """
+    params = params or {}
+    peak = _peak_voltage(volt)
+    for name, per_cell in CELL_PARAMS:
+        v = params.get(name)
+        if v is not None and v > 0:
+            cells = max(1, int(round(v / per_cell)))
+            if _fits_peak(cells, peak):
+                return cells, name
+
+    if peak is not None:
+        return max(1, int(np.ceil(peak / (CELL_FULL_V + 0.05)))), "voltage"
+
+    return None, None
+
+
+def cutoff_voltage(params, cells):
+    """BATT_LOW_VOLT if it matches the cell count, else the per-cell cutoff."""
+    low = (params or {}).get("BATT_LOW_VOLT")
+    if low is not None and low > 0 and int(round(low / CELL_CUTOFF_V)) == cells:
+        return float(low)
+    return cells * CELL_CUTOFF_V
+
+
+# ---------------- FIT ----------------
+
+def _pack(flights):
+    """
+    Concatenate [(t, v, i), ...] into flat sample arrays T, V, I plus
+    seg (the flight index of every sample); non-finite samples dropped.
+    Returns (T, V, I, seg, n, duration) with n and duration per flight.
+    """
+    F = len(flights)
+    n = np.zeros(F, dtype=np.int64)
+    duration = np.zeros(F)
+    parts = []
+    for k, (t, v, i) in enumerate(flights):
+        t = np.asarray(t, dtype=float)
+        v = np.asarray(v, dtype=float)
+        if len(v) == 0 or len(t) != len(v):
+            continue
+        i = np.asarray(i, dtype=float) if i is not None and len(i) == len(v) \
+            else np.zeros(len(v))
+        m = np.isfinite(t) & np.isfinite(v) & np.isfinite(i)
+        if not m.any():
+            continue
+        t = t[m] - np.min(t[m])
+        parts.append((t, v[m], i[m]))
+        n[k] = len(t)
+        duration[k] = t.max()
+    if not parts:
+        empty = np.zeros(0)
+        return empty, empty, empty, np.zeros(0, dtype=np.int64), n, duration
+    T, V, I = (np.concatenate(x) for x in zip(*parts))
+    seg = np.repeat(np.arange(F), n)
+    return T, V, I, seg, n, duration
+
+
+def _seg_sum(x, seg, F):
+    return np.bincount(seg, weights=x, minlength=F)
+
+
+def _seg_median(x, seg, n):
+    """Median of x within each flight (0 for flights without samples)."""
+    if len(x) == 0:
+        return np.zeros(len(n))
+    s = x[np.lexsort((x, seg))]
+    start = np.concatenate(([0], np.cumsum(n)[:-1]))
+    last = max(len(s) - 1, 0)
+    lo = s[np.minimum(start + np.maximum((n - 1) // 2, 0), last)]
+    hi = s[np.minimum(start + n // 2, last)]
+    return np.where(n > 0, 0.5 * (lo + hi), 0.0)
+
+
+def _solve(sums, ridge):
+    """beta (F, 3) from the normal-equation sums (sw, st, si, stt, sti, sii, sv, stv, siv)."""
+    sw, st, si, stt, sti, sii, sv, stv, siv = sums
+    A = np.stack([
+        np.stack([sw, st, -si], -1),
+        np.stack([st, stt, -sti], -1),
+        np.stack([-si, -sti, sii + ridge], -1),
+    ], -2) + 1e-12 * np.eye(3)
+    b = np.stack([sv, stv, -siv], -1)
+    return np.linalg.solve(A, b[..., None])[..., 0]
+
+
+def fit_discharge_batch(flights, iters=5, huber_k=1.345):
+    """
+    Fit the discharge model to many flights at once.
+
+    flights: list of (t_seconds, volt, curr_or_None)
+    Returns a dict of (F,) arrays: v0, slope (V/s), r_int (ohm),
+    resid_std (V), n (samples used), duration (s).
+    """
+    T, V, I, seg, n, duration = _pack(flights)
+    F = len(flights)
+    W = np.ones(len(V))
+
+    # drop the sag column for flights without current data
+    has_curr = _seg_sum(np.abs(I), seg, F) > 0
+    ridge = np.where(has_curr, 0.0, 1.0)
+
+    def predict(beta):
+        b = beta[seg]
+        return b[:, 0] + b[:, 1] * T - b[:, 2] * I
+
+    beta = np.zeros((F, 3))
+    scale = None
+    for _ in range(iters):
+        # weighted normal equations for [1, t, -I], summed per flight
+        WT, WI = W * T, W * I
+        sums = tuple(_seg_sum(x, seg, F) for x in
+                     (W, WT, WI, WT * T, WT * I, WI * I, W * V, WT * V, WI * V))
+        beta = _solve(sums, ridge)
+
+        resid = V - predict(beta)
+        if scale is None:
+            # robust residual scale (MAD) of the initial least-squares fit
+            scale = _seg_median(np.abs(resid), seg, n) * 1.4826
+            scale = np.maximum(scale, 1e-9)
+        # Huber weights: 1 inside huber_k * scale, k*scale/|r| outside
+        W = np.minimum(1.0, (huber_k * scale[seg]) / np.maximum(np.abs(resid), 1e-12))
+
+    resid = V - predict(beta)
+    dof = np.maximum(n - 3, 1)
+
+    return {
+        "v0": beta[:, 0],
+        "slope": beta[:, 1],
+        "r_int": np.where(has_curr, beta[:, 2], np.nan),
+        "resid_std": np.sqrt(_seg_sum(resid ** 2, seg, F) / dof),
+        "n": n,
+        "duration": duration,
+        "mean_curr": _seg_sum(I, seg, F) / np.maximum(n, 1),
+    }
+
+
+def endurance_batch(fit, cutoff):
+    """
+    Endurance in seconds for fitted flights: time at which the loaded
+    voltage (trend minus sag at the flight's mean current) hits cutoff.
+    Returns (endurance_s, remaining_s); NaN where the fit is not
+    discharging or too short to trust.
+    """
+    cutoff = np.broadcast_to(np.asarray(cutoff, dtype=float), fit["v0"].shape)
+    sag = np.nan_to_num(fit["r_int"]) * fit["mean_curr"]
+    slope = fit["slope"]
+    ok = (slope < 0) & (fit["n"] >= 10)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_end = (cutoff + sag - fit["v0"]) / slope
+    endurance = np.where(ok & (t_end > 0), t_end, np.nan)
+    remaining = endurance - fit["duration"]
+    return endurance, remaining
+
+
+class DischargeSums:
+    """
+    Single-pass fit of the discharge model for logs too large to keep:
+    update() with BAT blocks in log order, then fit() returns the same
+    layout as fit_discharge_batch for one flight.  There is no second
+    pass for the Huber reweighting, so this is the plain least-squares
+    fit; resid_std is the unweighted residual spread.
+    """
+
+    def __init__(self):
+        self.t0 = None
+        self.sums = np.zeros(9)
+        self.svv = 0.0
+        self.duration = 0.0
+        self.curr_seen = False
+
+    def update(self, t, volt, curr=None):
+        t = np.asarray(t, dtype=float)
+        v = np.asarray(volt, dtype=float)
+        if len(v) == 0 or len(t) != len(v):
+            return self
+        i = np.asarray(curr, dtype=float) if curr is not None and len(curr) == len(v) \
+            else np.zeros(len(v))
+        m = np.isfinite(t) & np.isfinite(v) & np.isfinite(i)
+        t, v, i = t[m], v[m], i[m]
+        if len(v) == 0:
+            return self
+        if self.t0 is None:
+            self.t0 = t[0]
+        T = t - self.t0
+
+        self.sums += [len(v), T.sum(), i.sum(), T @ T, T @ i, i @ i, v.sum(), T @ v, i @ v]
+        self.svv += v @ v
+        self.duration = max(self.duration, float(T.max()))
+        self.curr_seen |= bool(np.any(i != 0))
+        return self
+
+    def fit(self):
+        n = self.sums[0]
+        ridge = np.array([0.0 if self.curr_seen else 1.0])
+        beta = _solve(self.sums[:, None], ridge)
+        # residual sum of squares from the sums: v'v - 2 b'X'v + b'X'X b
+        sw, st, si, stt, sti, sii, sv, stv, siv = self.sums
+        xtx = np.array([[sw, st, -si], [st, stt, -sti], [-si, -sti, sii]])
+        xtv = np.array([sv, stv, -siv])
+        b = beta[0]
+        sse = max(self.svv - 2 * b @ xtv + b @ xtx @ b, 0.0)
+
+        return {
+            "v0": beta[:, 0],
+            "slope": beta[:, 1],
+            "r_int": np.where(self.curr_seen, beta[:, 2], np.nan),
+            "resid_std": np.array([np.sqrt(sse / max(n - 3, 1))]),
+            "n": np.array([int(n)]),
+            "duration": np.array([self.duration]),
+            "mean_curr": np.array([self.sums[2] / max(n, 1)]),
+        }
+
+
+def summarize_fit(fit, params=None, volt=None):
+    """
+    Per-flight summary of a one-flight fit (fit_discharge_batch or
+    DischargeSums layout): the fit, cell count, cutoff, nominal voltage,
+    sag under load and endurance / remaining time in seconds.
+    volt (any voltage samples, e.g. the peak) backs up the cell count.
+    """
+    cells, source = cell_count(params, volt)
+    out = {k: float(v[0]) for k, v in fit.items()}
+
+    if cells is None:
+        out.update(cells=None, cell_source=None, v_nominal=None, cutoff=None,
+                   endurance_s=None, remaining_s=None, sag_v=None)
+        return out
+
+    cutoff = cutoff_voltage(params, cells)
+    endurance, remaining = endurance_batch(fit, cutoff)
+    sag = out["r_int"] * out["mean_curr"] if np.isfinite(out["r_int"]) else None
+
+    out.update(
+        cells=cells,
+        cell_source=source,
+        v_nominal=cells * CELL_NOMINAL_V,
+        cutoff=cutoff,
+        sag_v=sag,
+        endurance_s=float(endurance[0]) if np.isfinite(endurance[0]) else None,
+        remaining_s=float(remaining[0]) if np.isfinite(remaining[0]) else None,
+    )
+    return out
+
+
+def fit_flight(t, volt, curr=None, params=None):
+    """Single-flight convenience wrapper; see summarize_fit for the result."""
+    return summarize_fit(fit_discharge_batch([(t, volt, curr)]), params, volt)
+
+
+def fit_flights(flights, params=None):
+    """
+    fit_flight for many (t, volt, curr) sample sets of one pack, e.g.
+    resamples of a flight, with a single batch fit.
+    """
+    fit = fit_discharge_batch(flights)
+    return [summarize_fit({k: v[i:i + 1] for k, v in fit.items()}, params, volt)
+            for i, (_, volt, _) in enumerate(flights)]
+
+
+def fit_fleet(records):
+    """
+    Fit many flights in one call.
+
+    records: iterable of dicts with "t" (s), "volt", optional "curr",
+    "params" and any identifying keys (e.g. "key", "airframe"), which are
+    carried into the result.
+    Returns a DataFrame, one row per flight.
+    """
+    import pandas as pd
+
+    records = list(records)
+    fit = fit_discharge_batch([(r["t"], r["volt"], r.get("curr")) for r in records])
+
+    cells = []
+    cutoff = []
+    for r in records:
+        c, _ = cell_count(r.get("params"), r["volt"])
+        cells.append(c)
+        cutoff.append(cutoff_voltage(r.get("params"), c) if c else np.nan)
+    cutoff = np.array(cutoff, dtype=float)
+
+    endurance, remaining = endurance_batch(fit, cutoff)
+
+    ids = [{k: v for k, v in r.items() if k not in ("t", "volt", "curr", "params")}
+           for r in records]
+    frame = pd.DataFrame(ids, index=range(len(records)))
+    for k, v in fit.items():
+        frame[k] = v
+    frame["cells"] = cells
+    frame["cutoff"] = cutoff
+    frame["endurance_s"] = endurance
+    frame["remaining_s"] = remaining
+    return frame
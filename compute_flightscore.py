@@ -1,5 +1,10 @@
 import numpy as np
-from pymavlink import mavutil
+
+import dataflash
+import log_ingest
+from battery_model import BATTERY_PARAMS, DischargeSums, fit_flight, fit_flights, summarize_fit
+from flight_dataset import FlightDataset
+from online_stats import PeakRSS, QuantileSketch, RunningStats, over_budget
 
 
 # ---------------- SAFE HELPERS ----------------
@@ -28,6 +33,7 @@ def safe_div(a, b, default=0):
 # ---------------- LOG EXTRACTION ----------------
 
 def load_log(bin_path):
+    from pymavlink import mavutil   # slow dialect import, only this path needs it
     return mavutil.mavlink_connection(bin_path)
 
 
@@ -91,6 +97,66 @@ def extract_battery(mlog):
             volt.append(msg.Volt)
     return safe_array(volt)
 
+
+def extract_battery_timed(mlog):
+    """
+    BAT time (s), voltage and current, plus the battery PARMs, in one pass.
+    Returns: t, volt, curr, params
+    """
+    t, volt, curr = [], [], []
+    params = {}
+    mlog.rewind()
+    while True:
+        msg = mlog.recv_match(type=["BAT", "PARM"], blocking=False)
+        if msg is None:
+            break
+        if msg.get_type() == "PARM":
+            if msg.Name in BATTERY_PARAMS:
+                params[msg.Name] = msg.Value
+            continue
+        if hasattr(msg, "Volt"):
+            t.append(getattr(msg, "TimeUS", 0) / 1e6)
+            volt.append(msg.Volt)
+            curr.append(getattr(msg, "Curr", np.nan))
+    return safe_array(t), safe_array(volt), safe_array(curr), params
+
+
+# Message columns the FlightScore needs, for the direct DataFlash decoders
+SCORE_FIELDS = {
+    "CTUN": ["ThO"],
+    "ATT": ["Roll", "Pitch"],
+    "VIBE": ["VibeX", "VibeY", "VibeZ"],
+    "POWR": ["Vcc"],
+    "BAT": ["TimeUS", "Volt", "Curr"],
+    "PARM": ["Name", "Value"],
+}
+
+
+def series_from_columns(cols):
+    """(throttle, roll, pitch, vx, vy, vz, vcc, volt) from decoded columns."""
+    return (
+        cols["CTUN"]["ThO"],
+        cols["ATT"]["Roll"], cols["ATT"]["Pitch"],
+        cols["VIBE"]["VibeX"], cols["VIBE"]["VibeY"], cols["VIBE"]["VibeZ"],
+        cols["POWR"]["Vcc"],
+        cols["BAT"]["Volt"],
+    )
+
+
+def battery_from_columns(cols):
+    """Keyword arguments for battery_metrics (time, current, params)."""
+    parm = cols.get("PARM", {})
+    params = {
+        n: float(v)
+        for n, v in zip(parm.get("Name", []), parm.get("Value", []))
+        if n in BATTERY_PARAMS
+    }
+    return {
+        "bat_time": cols["BAT"]["TimeUS"] / 1e6,
+        "bat_curr": cols["BAT"]["Curr"],
+        "params": params,
+    }
+
 # ---------------- ADVANCED METRICS ----------------
 
 def estimate_endurance(volt, throttle):
@@ -102,9 +168,13 @@ def estimate_endurance(volt, throttle):
         return None, None
 
     volt = np.array(volt)
+    return endurance_from_ends(volt[0], volt[-1], len(volt), np.percentile(volt, 5))
+
 
-    dv = volt[-1] - volt[0]
-    dt = len(volt)
+def endurance_from_ends(first, last, n, v_cutoff):
+    """estimate_endurance from the first / last voltage, count and 5th percentile."""
+    dv = last - first
+    dt = n
 
     if dt <= 0:
         return None, None
@@ -114,8 +184,7 @@ def estimate_endurance(volt, throttle):
     if slope >= 0:
         return None, None
 
-    v_cutoff = np.percentile(volt, 5)
-    remaining_v = volt[-1] - v_cutoff
+    remaining_v = last - v_cutoff
 
     remaining = remaining_v / abs(slope)
     endurance = dt + remaining
@@ -125,38 +194,106 @@ def estimate_endurance(volt, throttle):
 
 # ---------------- BATTERY ----------------
 
-def battery_metrics(volt, throttle):
+# legacy normaliser when only sample counts are known, and the reference
+# flight time used once BAT timestamps are available: 20 minutes, about
+# the full-pack hover endurance of the 6S multirotors the score targets,
+# so a predicted endurance of 1200 s or more scores 100
+ENDURANCE_REF_SAMPLES = 2000
+ENDURANCE_REF_S = 1200.0
+
+
+def discharge_samples(volt, bat_time=None, bat_curr=None):
+    """(t, volt, curr) for battery_model if the BAT timestamps line up, else None."""
+    if bat_time is None or len(bat_time) != len(volt):
+        return None
+    curr = bat_curr if bat_curr is not None and len(bat_curr) == len(volt) else None
+    return bat_time, volt, curr
+
+
+def battery_metrics(volt, throttle, bat_time=None, bat_curr=None, params=None, model=None):
+    """
+    Battery metrics.  With BAT timestamps (bat_time, seconds) the
+    discharge is fitted by battery_model and endurance is in seconds;
+    without them the old sample-count estimate is used.  Pass the
+    flight's fit_flight result as `model` if it is already fitted.
+    """
     if len(volt) == 0:
+        return battery_result(None, None)
+
+    volt = np.array(volt)
+
+    samples = discharge_samples(volt, bat_time, bat_curr)
+    if samples is not None:
+        model = model or fit_flight(*samples, params)
+        legacy = (None, None)
+    else:
+        model = None
+        legacy = estimate_endurance(volt, throttle)
+
+    return battery_result(float(np.mean(volt)), float(np.min(volt)), model, legacy)
+
+
+def battery_result(avg_v, min_v, model=None, legacy=(None, None)):
+    """
+    battery_metrics output from the mean / min voltage and either a
+    battery_model summary (time-based) or the legacy (endurance,
+    remaining) estimate in samples.  avg_v None means no BAT data.
+    """
+    if avg_v is None:
         return {
             "avg_voltage": None,
             "min_voltage": None,
             "voltage_sag_pct": None,
             "battery_health": None,
-            "endurance_est": None
+            "endurance_est": None,
+            "remaining_est": None,
+            "endurance_unit": None,
+            "cells": None,
+            "discharge_rate": None,
+            "internal_resistance": None,
+            "load_sag_v": None,
         }
 
-    volt = np.array(volt)
-
-    avg_v = float(np.mean(volt))
-    min_v = float(np.min(volt))
-
-    v_nom = 22.2  # 6S nominal
-    sag_pct = (v_nom - min_v) / v_nom * 100
+    if model is not None:
+        v_nom = model["v_nominal"]
+        endurance = model["endurance_s"]
+        remaining = model["remaining_s"]
+        unit = "s"
+        ref = ENDURANCE_REF_S
+        extra = {
+            "cells": model["cells"],
+            "discharge_rate": model["slope"],
+            "internal_resistance": model["r_int"] if np.isfinite(model["r_int"]) else None,
+            "load_sag_v": model["sag_v"],
+        }
+    else:
+        v_nom = 22.2  # 6S nominal
+        endurance, remaining = legacy
+        unit = "samples"
+        ref = ENDURANCE_REF_SAMPLES
+        extra = {
+            "cells": None,
+            "discharge_rate": None,
+            "internal_resistance": None,
+            "load_sag_v": None,
+        }
 
-    endurance, remaining = estimate_endurance(volt, throttle)
+    sag_pct = (v_nom - min_v) / v_nom * 100 if v_nom else None
 
     if endurance is not None:
-        health = np.clip(endurance / 2000 * 100, 0, 100)
+        health = float(np.clip(endurance / ref * 100, 0, 100))
     else:
         health = None
 
     return {
         "avg_voltage": avg_v,
         "min_voltage": min_v,
-        "voltage_sag_pct": float(sag_pct),
+        "voltage_sag_pct": float(sag_pct) if sag_pct is not None else None,
         "battery_health": health,
         "endurance_est": endurance,
-        "remaining_est": remaining
+        "remaining_est": remaining,
+        "endurance_unit": unit,
+        **extra,
     }
 
 
@@ -180,20 +317,21 @@ def vibration_metrics(vx, vy, vz):
 
     rms = float(np.sqrt(np.mean(vx**2 + vy**2 + vz**2)))
 
-    if rms < 10:
-        sev = "LOW"
-    elif rms < 20:
-        sev = "MODERATE"
-    else:
-        sev = "HIGH"
-
     return {
         "max_vibe": max_v,
         "rms_vibe": rms,
-        "vibe_severity": sev
+        "vibe_severity": vibe_severity(rms)
     }
 
 
+def vibe_severity(rms):
+    if rms < 10:
+        return "LOW"
+    if rms < 20:
+        return "MODERATE"
+    return "HIGH"
+
+
 # ---------------- STABILITY ----------------
 
 def stability_metrics(roll, pitch):
@@ -269,15 +407,18 @@ def energy_metrics(volt):
 
 # ---------------- SCORES (NORMALIZED 0–100) ----------------
 
-def stability_score(roll, pitch, throttle):
+def stability_score(roll, pitch, throttle, hover=None):
     if len(throttle) == 0:
         return 0
 
-    hover = safe_hover(throttle)
-
     thr_var = np.std(throttle) if len(throttle) > 0 else 0
     att_var = np.sqrt(np.std(roll)**2 + np.std(pitch)**2) if len(roll) > 0 else 0
 
+    return stability_from_stats(thr_var, att_var, safe_hover(throttle) if hover is None else hover)
+
+
+def stability_from_stats(thr_var, att_var, hover):
+    """stability_score from throttle std, combined roll / pitch std and hover."""
     att_norm = safe_div(att_var, 6)
     thr_norm = safe_div(thr_var, hover) / 0.12
 
@@ -286,21 +427,27 @@ def stability_score(roll, pitch, throttle):
     return float(np.clip(score, 0, 100))
 
 
-def control_authority_score(throttle):
+def control_authority_score(throttle, hover=None):
     if len(throttle) == 0:
         return 0
 
-    hover = safe_hover(throttle)
+    return control_from_hover(safe_hover(throttle) if hover is None else hover)
+
+
+def control_from_hover(hover):
     margin = 1 - hover
     score = safe_div(margin, 0.6) * 100
     return float(np.clip(score, 0, 100))
 
 
-def propulsion_efficiency_score(throttle):
+def propulsion_efficiency_score(throttle, hover=None):
     if len(throttle) == 0:
         return 0
 
-    hover = safe_hover(throttle)
+    return efficiency_from_hover(safe_hover(throttle) if hover is None else hover)
+
+
+def efficiency_from_hover(hover):
     score = (1 - abs(hover - 0.4) / 0.4) * 100
     return float(np.clip(score, 0, 100))
 
@@ -331,54 +478,64 @@ def energy_efficiency_score(volt_drop, hover):
     return float(np.clip(score, 0, 100))
 
 
-def endurance_score(endurance_est):
+def endurance_score(endurance_est, unit="samples"):
     if endurance_est is None:
         return 50
 
-    score = endurance_est / 2000 * 100
+    ref = ENDURANCE_REF_S if unit == "s" else ENDURANCE_REF_SAMPLES
+    score = endurance_est / ref * 100
     return float(np.clip(score, 0, 100))
 
 
 # ---------------- FINAL FLIGHTSCORE ----------------
 
-def compute_flight_score(bin_path):
+SCORE_WEIGHTS = {
+    "stability": 0.20,
+    "control": 0.20,
+    "efficiency": 0.20,
+    "smoothness": 0.15,
+    "electrical": 0.10,
+    "energy": 0.10,
+    "endurance": 0.05,
+}
 
-    mlog = load_log(bin_path)
 
-    throttle = extract_ctun_throttle(mlog)
-    roll, pitch = extract_attitude(mlog)
-    vx, vy, vz = extract_vibe_xyz(mlog)
-    vcc = extract_vcc(mlog)
-    volt = extract_battery(mlog)
+def flight_score_components(throttle, roll, pitch, vx, vy, vz, vcc, volt,
+                            sample_scale=1.0, **battery):
+    """
+    The seven 0–100 component scores from already-extracted series.
+    sample_scale rescales sample-count based quantities (endurance) when
+    the series are a subsample of the log; `battery` is passed on to
+    battery_metrics (bat_time, bat_curr, params).
+    """
 
     # --- metrics ---
-    bat = battery_metrics(volt, throttle)
+    bat = battery_metrics(volt, throttle, **battery)
     vib = vibration_metrics(vx, vy, vz)
-    stab = stability_metrics(roll, pitch)
     ctrl = control_metrics(throttle)
     elec = electrical_metrics(vcc)
     eng = energy_metrics(volt)
 
     hover = ctrl["hover_throttle"]
 
+    endurance = bat["endurance_est"]
+    if endurance is not None and bat["endurance_unit"] == "samples":
+        endurance *= sample_scale
+
     # --- scores ---
-    s1 = stability_score(roll, pitch, throttle)
-    s2 = control_authority_score(throttle)
-    s3 = propulsion_efficiency_score(throttle)
-    s4 = mechanical_smoothness_score(vib["rms_vibe"], hover)
-    s5 = electrical_score(elec["vcc_std"])
-    s6 = energy_efficiency_score(eng["volt_drop"], hover)
-    s7 = endurance_score(bat["endurance_est"])
-
-    final = (
-        0.20 * s1 +
-        0.20 * s2 +
-        0.20 * s3 +
-        0.15 * s4 +
-        0.10 * s5 +
-        0.10 * s6 +
-        0.05 * s7
-    )
+    return {
+        "stability": stability_score(roll, pitch, throttle, hover),
+        "control": control_authority_score(throttle, hover),
+        "efficiency": propulsion_efficiency_score(throttle, hover),
+        "smoothness": mechanical_smoothness_score(vib["rms_vibe"], hover),
+        "electrical": electrical_score(elec["vcc_std"]),
+        "energy": energy_efficiency_score(eng["volt_drop"], hover),
+        "endurance": endurance_score(endurance, bat["endurance_unit"]),
+    }
+
+
+def combine_scores(components):
+    final = sum(SCORE_WEIGHTS[k] * components[k] for k in SCORE_WEIGHTS)
 
     if np.isnan(final):
         return 0.0
@@ -386,9 +543,19 @@ def compute_flight_score(bin_path):
     return float(np.clip(final, 0, 100))
 
 
-# ---------------- FULL METRICS OUTPUT ----------------
+def flight_score_from_series(throttle, roll, pitch, vx, vy, vz, vcc, volt,
+                             sample_scale=1.0, **battery):
+    """Weighted FlightScore from already-extracted series."""
+    return combine_scores(flight_score_components(
+        throttle, roll, pitch, vx, vy, vz, vcc, volt,
+        sample_scale=sample_scale, **battery))
+
 
-def compute_flight_metrics(bin_path):
+def compute_flight_score(bin_path):
+    if not isinstance(bin_path, FlightDataset):
+        bin_path, _ = _readable(bin_path)
+    if isinstance(bin_path, FlightDataset):
+        return compute_flight_score_from_columns(bin_path.columns)
 
     mlog = load_log(bin_path)
 
@@ -396,16 +563,134 @@ def compute_flight_metrics(bin_path):
     roll, pitch = extract_attitude(mlog)
     vx, vy, vz = extract_vibe_xyz(mlog)
     vcc = extract_vcc(mlog)
-    volt = extract_battery(mlog)
+    bat_time, volt, bat_curr, params = extract_battery_timed(mlog)
+    battery = {"bat_time": bat_time, "bat_curr": bat_curr, "params": params}
+
+    return flight_score_from_series(throttle, roll, pitch, vx, vy, vz, vcc, volt, **battery)
+
+
+def compute_flight_score_from_columns(cols):
+    return flight_score_from_series(*series_from_columns(cols), **battery_from_columns(cols))
+
+
+# ---------------- PREVIEW (SAMPLED) FLIGHTSCORE ----------------
+
+# Components the chunk bootstrap cannot bound: vcc_std is driven by short
+# events (a brownout dip lasts a few hundred ms) that the sampled chunks
+# can miss entirely, so every resample agrees on a score the full log
+# does not have.  The CI is widened by their whole weighted range.
+PREVIEW_UNBOUNDED = ("electrical",)
+
+
+def _preview_columns(chunks, idx):
+    return {
+        name: {c: np.concatenate([chunks[i][name][c] for i in idx]) for c in fields}
+        for name, fields in SCORE_FIELDS.items()
+    }
+
+
+def _preview_components(samples, sample_scale):
+    """
+    Component scores for each resample's columns.  The battery fits of
+    all resamples share one battery_model batch.
+    """
+    series = [series_from_columns(cols) for cols in samples]
+    battery = [battery_from_columns(cols) for cols in samples]
+    discharge = [discharge_samples(s[7], b["bat_time"], b["bat_curr"])
+                 for s, b in zip(series, battery)]
+
+    fitted = [i for i, d in enumerate(discharge) if d is not None and len(d[0])]
+    if fitted:
+        params = battery[fitted[0]]["params"]
+        for i, model in zip(fitted, fit_flights([discharge[i] for i in fitted], params)):
+            battery[i]["model"] = model
+
+    return [flight_score_components(*s, sample_scale=sample_scale, **b)
+            for s, b in zip(series, battery)]
+
+
+def compute_flight_score_preview(bin_path, n_chunks=32, chunk_bytes=32 * 1024,
+                                 n_boot=200, ci=0.95, seed=0):
+    """
+    Approximate FlightScore from evenly spaced byte chunks of the .bin.
+
+    Each chunk is decoded on its own, resynchronising on the first valid
+    message header, so only n_chunks * chunk_bytes of the file is decoded;
+    the FMT definitions come from the log head.  The confidence interval
+    is a bootstrap over chunks (resampled chunks are kept in file order,
+    since the voltage terms depend on it), widened by the full range of
+    the PREVIEW_UNBOUNDED components, which are listed in "unbounded".
+
+    Returns: {"score", "ci_low", "ci_high", "coverage", "exact", "unbounded"}
+    """
+    buf = dataflash.open_log_buffer(bin_path)
+    size = len(buf)
+    formats = dataflash.read_head_formats(buf, SCORE_FIELDS)
+
+    if size <= n_chunks * chunk_bytes:
+        starts = np.array([0])
+        chunk_bytes = size
+    else:
+        starts = np.linspace(0, size - chunk_bytes, n_chunks).astype(np.int64)
+
+    chunks = [
+        dataflash.decode_region(buf, int(s), int(s) + chunk_bytes, formats, SCORE_FIELDS)
+        for s in starts
+    ]
+
+    coverage = safe_div(len(starts) * chunk_bytes, size, default=1.0)
+    exact = coverage >= 1.0
+    sample_scale = 1.0 / coverage
+
+    k = len(chunks)
+    idx = [np.arange(k)]
+    if k > 1:
+        rng = np.random.default_rng(seed)
+        idx += [np.sort(rng.integers(0, k, k)) for _ in range(n_boot)]
+
+    comps = _preview_components([_preview_columns(chunks, i) for i in idx], sample_scale)
+    score = combine_scores(comps[0])
+
+    if k > 1:
+        boot = [combine_scores(c) for c in comps[1:]]
+        alpha = (1 - ci) / 2 * 100
+        lo, hi = np.percentile(boot, [alpha, 100 - alpha])
+    else:
+        lo = hi = score
+
+    unbounded = [] if exact else list(PREVIEW_UNBOUNDED)
+    below = sum(SCORE_WEIGHTS[c] * comps[0][c] for c in unbounded)
+    above = sum(SCORE_WEIGHTS[c] * (100 - comps[0][c]) for c in unbounded)
+
+    return {
+        "score": score,
+        "ci_low": float(np.clip(min(lo, score) - below, 0, 100)),
+        "ci_high": float(np.clip(max(hi, score) + above, 0, 100)),
+        "coverage": float(min(coverage, 1.0)),
+        "exact": exact,
+        "unbounded": unbounded,
+    }
+
+
+# ---------------- FULL METRICS OUTPUT ----------------
+
+def flight_metrics_from_series(throttle, roll, pitch, vx, vy, vz, vcc, volt, **battery):
 
-    bat = battery_metrics(volt, throttle)
+    bat = battery_metrics(volt, throttle, **battery)
     vib = vibration_metrics(vx, vy, vz)
     stab = stability_metrics(roll, pitch)
     ctrl = control_metrics(throttle)
     elec = electrical_metrics(vcc)
     eng = energy_metrics(volt)
 
-    final = compute_flight_score(bin_path)
+    comps = flight_score_components(throttle, roll, pitch, vx, vy, vz, vcc, volt, **battery)
+
+    return assemble_metrics(bat, vib, stab, ctrl, elec, eng, comps)
+
+
+def assemble_metrics(bat, vib, stab, ctrl, elec, eng, comps):
+    """The flat metrics dict shown by the pages, from the per-area dicts."""
+    final = combine_scores(comps)
 
     return {
         # ---- Battery ----
@@ -415,6 +700,11 @@ def compute_flight_metrics(bin_path):
         "battery_health": bat["battery_health"],
         "endurance_est": bat["endurance_est"],
         "remaining_est": bat["remaining_est"],
+        "endurance_unit": bat["endurance_unit"],
+        "cells": bat["cells"],
+        "discharge_rate": bat["discharge_rate"],
+        "internal_resistance": bat["internal_resistance"],
+        "load_sag_v": bat["load_sag_v"],
 
         # ---- Vibration ----
         "max_vibe": vib["max_vibe"],
@@ -437,6 +727,199 @@ def compute_flight_metrics(bin_path):
         # ---- Energy ----
         "volt_drop": eng["volt_drop"],
 
+        # ---- Component scores ----
+        **comps,
+
         # ---- Final ----
         "flight_score": final
-    }
\ No newline at end of file
+    }
+
+
+def _readable(bin_path):
+    """
+    (bin_path, its LogHealth) if pymavlink can read it cleanly, else
+    (FlightDataset, None).  pymavlink crawls through damaged regions byte
+    by byte (or raises part-way), so damaged, truncated and compressed
+    logs go through the resynchronising decoder, which skips bad bytes
+    in linear time.
+    """
+    health = log_ingest.scan_health(bin_path)
+    if health is not None and health.clean:
+        return bin_path, health
+    return FlightDataset(bin_path), None
+
+
+def compute_flight_metrics(bin_path, memory_budget_mb=None):
+    """
+    Full metrics for a log path or FlightDataset.  With memory_budget_mb,
+    a log whose in-memory analysis is estimated to exceed the budget
+    (online_stats.over_budget) is analysed in streaming mode instead,
+    unless it is a dataset that is already decoded.  The result also
+    records "analysis_mode" ("arrays" / "streaming"), the peak resident
+    memory during the call ("peak_rss_mb") and its rise over the start
+    ("peak_rss_delta_mb"), and the data completeness of the log
+    (dataflash.LogHealth.as_dict: "data_complete", "completeness",
+    "skipped_bytes", "truncated", "damaged_regions").
+    """
+    dataset = bin_path if isinstance(bin_path, FlightDataset) else None
+    if dataset is not None:
+        bin_path = dataset.ref
+    streaming = not (dataset and dataset.decoded) and over_budget(bin_path, memory_budget_mb)
+    health = None
+    if dataset is None and not streaming:
+        source, health = _readable(bin_path)
+        if isinstance(source, FlightDataset):
+            dataset = source
+
+    with PeakRSS() as mem:
+        if streaming:
+            out = compute_flight_metrics_streaming(bin_path)
+        elif dataset is not None:
+            out = compute_flight_metrics_from_columns(dataset.columns)
+            health = dataset.health
+        else:
+            mlog = load_log(bin_path)
+
+            throttle = extract_ctun_throttle(mlog)
+            roll, pitch = extract_attitude(mlog)
+            vx, vy, vz = extract_vibe_xyz(mlog)
+            vcc = extract_vcc(mlog)
+            bat_time, volt, bat_curr, params = extract_battery_timed(mlog)
+            battery = {"bat_time": bat_time, "bat_curr": bat_curr, "params": params}
+
+            out = flight_metrics_from_series(throttle, roll, pitch, vx, vy, vz, vcc, volt,
+                                             **battery)
+
+    if health is not None:
+        out.update(health.as_dict())
+    out["analysis_mode"] = "streaming" if streaming else "arrays"
+    out["peak_rss_mb"] = mem.peak_mb
+    out["peak_rss_delta_mb"] = mem.delta_mb
+    return out
+
+
+def compute_flight_metrics_from_columns(cols):
+    """Full metrics from columns decoded by dataflash / log_ingest."""
+    return flight_metrics_from_series(*series_from_columns(cols), **battery_from_columns(cols))
+
+
+# ---------------- STREAMING (MEMORY-BUDGETED) METRICS ----------------
+
+class FlightAccumulator:
+    """
+    Online state for the FlightScore metrics.  update() takes decoded
+    column blocks in SCORE_FIELDS layout; metrics() returns the same dict
+    as flight_metrics_from_series without any series having been kept.
+    """
+
+    def __init__(self):
+        self.throttle = RunningStats()
+        self.throttle_q = QuantileSketch(rel_acc=0.002)
+        self.saturated = 0
+        self.roll = RunningStats()
+        self.pitch = RunningStats()
+        self.vibe_sq = RunningStats()   # vx² + vy² + vz² per sample
+        self.vibe_peak = 0.0
+        self.vcc = RunningStats()
+        self.volt = RunningStats()
+        self.volt_q = QuantileSketch(rel_acc=0.002)
+        self.discharge = DischargeSums()
+        self.bat_timed = True
+        self.params = {}
+
+    def update(self, cols):
+        thr = cols["CTUN"]["ThO"]
+        self.throttle.update(thr)
+        self.throttle_q.update(thr)
+        self.saturated += int(np.sum(thr > 0.9))
+
+        self.roll.update(cols["ATT"]["Roll"])
+        self.pitch.update(cols["ATT"]["Pitch"])
+
+        vibe = cols["VIBE"]
+        vx, vy, vz = vibe["VibeX"], vibe["VibeY"], vibe["VibeZ"]
+        if len(vx):
+            self.vibe_sq.update(vx**2 + vy**2 + vz**2)
+            self.vibe_peak = max(self.vibe_peak, float(np.max(np.abs([vx, vy, vz]))))
+
+        self.vcc.update(cols["POWR"]["Vcc"])
+
+        bat = cols["BAT"]
+        volt = bat["Volt"]
+        if len(volt):
+            self.volt.update(volt)
+            self.volt_q.update(volt)
+            if len(bat["TimeUS"]) == len(volt):
+                self.discharge.update(bat["TimeUS"] / 1e6, volt, bat["Curr"])
+            else:
+                self.bat_timed = False
+
+        self.params.update(battery_from_columns(cols)["params"])
+        return self
+
+    def metrics(self):
+        thr, volt = self.throttle, self.volt
+
+        hover = self.throttle_q.quantile(0.5) if thr.n else 0.4
+        hover = hover if hover > 0 else 0.4  # as safe_hover
+
+        if volt.n == 0:
+            bat = battery_result(None, None)
+        elif self.bat_timed:
+            model = summarize_fit(self.discharge.fit(), self.params, np.array([volt.max]))
+            bat = battery_result(volt.mean, volt.min, model)
+        else:
+            legacy = (endurance_from_ends(volt.first, volt.last, volt.n, self.volt_q.quantile(0.05))
+                      if volt.n >= 2 else (None, None))
+            bat = battery_result(volt.mean, volt.min, None, legacy)
+
+        if self.vibe_sq.n:
+            rms = float(np.sqrt(self.vibe_sq.mean))
+            vib = {"max_vibe": self.vibe_peak, "rms_vibe": rms, "vibe_severity": vibe_severity(rms)}
+        else:
+            vib = {"max_vibe": None, "rms_vibe": None, "vibe_severity": None}
+
+        if self.roll.n:
+            stab = {"roll_var": float(self.roll.var), "pitch_var": float(self.pitch.var)}
+        else:
+            stab = {"roll_var": None, "pitch_var": None}
+
+        if thr.n:
+            ctrl = {"avg_throttle": thr.mean, "peak_throttle": thr.max,
+                    "motor_sat_pct": self.saturated / thr.n * 100, "hover_throttle": hover}
+        else:
+            ctrl = {"avg_throttle": None, "peak_throttle": None,
+                    "motor_sat_pct": None, "hover_throttle": 0.4}
+
+        elec = {"vcc_std": self.vcc.std if self.vcc.n else None}
+        eng = {"volt_drop": volt.first - volt.last if volt.n >= 2 else None}
+
+        att_var = np.sqrt(self.roll.var + self.pitch.var) if self.roll.n else 0
+        comps = {
+            "stability": stability_from_stats(thr.std, att_var, hover) if thr.n else 0,
+            "control": control_from_hover(hover) if thr.n else 0,
+            "efficiency": efficiency_from_hover(hover) if thr.n else 0,
+            "smoothness": mechanical_smoothness_score(vib["rms_vibe"], hover),
+            "electrical": electrical_score(elec["vcc_std"]),
+            "energy": energy_efficiency_score(eng["volt_drop"], hover),
+            "endurance": endurance_score(bat["endurance_est"], bat["endurance_unit"]),
+        }
+
+        return assemble_metrics(bat, vib, stab, ctrl, elec, eng, comps)
+
+
+def compute_flight_metrics_streaming(ref, chunk_bytes=1 << 20):
+    """
+    compute_flight_metrics in bounded memory for any log_ingest ref: the
+    log is decoded one block at a time into a FlightAccumulator.  Medians
+    and percentiles come from quantile sketches (within 0.2%) and the
+    battery model is the single-pass least-squares fit, so results can
+    differ slightly from the array path.
+    """
+    acc = FlightAccumulator()
+    dec = log_ingest.log_decoder(ref, SCORE_FIELDS)
+    for cols in log_ingest.iter_log_blocks(ref, SCORE_FIELDS, chunk_bytes, decoder=dec):
+        acc.update(cols)
+    out = acc.metrics()
+    out.update(dec.health().as_dict())
+    return out
\ No newline at end of file
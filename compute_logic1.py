@@ -5,11 +5,59 @@ Created on Tue Feb 17 14:56:14 2026
 @author: Adwait
 """
 
-from pymavlink import mavutil
+import json
+
 import numpy as np
 
+import log_ingest
+from flight_dataset import FlightDataset
+from online_stats import Decimator, PeakRSS, RunningStats, over_budget
+
+
+def analyze_log(logfile, memory_budget_mb=None):
+    """
+    Degradation metrics and plot series for a log path or FlightDataset.
+
+    With memory_budget_mb, a log whose in-memory analysis is estimated to
+    exceed the budget (online_stats.over_budget) goes through
+    analyze_log_streaming instead, unless it is an already decoded
+    dataset.  metrics also records "analysis_mode", "peak_rss_mb" and
+    "peak_rss_delta_mb" for the call, and the log's data completeness
+    (see compute_flightscore.compute_flight_metrics).
+    """
+    dataset = logfile if isinstance(logfile, FlightDataset) else None
+    if dataset is not None:
+        logfile = dataset.ref
+    streaming = not (dataset and dataset.decoded) and over_budget(logfile, memory_budget_mb)
+
+    health = None
+    if dataset is None and not streaming:
+        # damaged or compressed logs: resynchronising decoder, not pymavlink
+        health = log_ingest.scan_health(logfile)
+        if health is None or not health.clean:
+            dataset = FlightDataset(logfile)
+
+    with PeakRSS() as mem:
+        if streaming:
+            metrics, series = analyze_log_streaming(logfile)
+        elif dataset is not None:
+            metrics, series = analyze_columns(dataset.columns)
+            health = dataset.health
+        else:
+            metrics, series = _analyze_log_arrays(logfile)
+
+    if health is not None:
+        metrics.update(health.as_dict())
+
+    metrics["analysis_mode"] = "streaming" if streaming else "arrays"
+    metrics["peak_rss_mb"] = mem.peak_mb
+    metrics["peak_rss_delta_mb"] = mem.delta_mb
+    return metrics, series
+
+
+def _analyze_log_arrays(logfile):
+    from pymavlink import mavutil   # slow dialect import, only this path needs it
 
-def analyze_log(logfile):
     mav = mavutil.mavlink_connection(logfile)
 
     imu_g = []
@@ -20,6 +68,8 @@ def analyze_log(logfile):
     vcc = []
     mcu_temp = []
     hover_throttle = []
+    times = {"vibration": [], "motors": [], "thrust": [], "battery": [], "vcc": []}
+    arm_us = None
 
     while True:
         msg = mav.recv_match(blocking=False)
@@ -31,21 +81,26 @@ def analyze_log(logfile):
         if t == "IMU":
             gmag = np.sqrt(msg.GyrX**2 + msg.GyrY**2 + msg.GyrZ**2)
             imu_g.append(gmag)
+            times["vibration"].append(_time_us(msg))
 
         elif t == "RCOU":
             motor_outputs.append([msg.C1, msg.C2, msg.C3, msg.C4])
+            times["motors"].append(_time_us(msg))
 
         elif t == "MOTB":
             thr_out.append(msg.ThrOut)
             if hasattr(msg, "ThLimit"):
                 th_limit.append(msg.ThLimit)
+                times["thrust"].append(_time_us(msg))
 
         elif t == "BAT":
             bat_volt.append(msg.Volt)
+            times["battery"].append(_time_us(msg))
 
         elif t == "POWR":
             if hasattr(msg, "Vcc"):
                 vcc.append(msg.Vcc)
+                times["vcc"].append(_time_us(msg))
 
         elif t == "MCU":
             if hasattr(msg, "MTemp"):
@@ -55,6 +110,102 @@ def analyze_log(logfile):
             if hasattr(msg, "ThH"):
                 hover_throttle.append(msg.ThH)
 
+        elif t == "ARM":
+            if arm_us is None and getattr(msg, "ArmState", 0) == 1:
+                arm_us = _time_us(msg)
+
+        elif t == "EV":
+            if arm_us is None and getattr(msg, "Id", None) == EV_ARMED:
+                arm_us = _time_us(msg)
+
+    return degradation_from_series(imu_g, motor_outputs, th_limit, bat_volt,
+                                   vcc, mcu_temp, hover_throttle, times, arm_us)
+
+
+def _time_us(msg):
+    t = getattr(msg, "TimeUS", None)
+    if t is None:
+        t = getattr(msg, "TimeMS", 0) * 1000
+    return t
+
+
+# EV message id logged when the vehicle arms
+EV_ARMED = 10
+
+# Message columns analyze_log reads, for the direct DataFlash decoders
+DEGRADE_FIELDS = {
+    "IMU": ["TimeUS", "GyrX", "GyrY", "GyrZ"],
+    "RCOU": ["TimeUS", "C1", "C2", "C3", "C4"],
+    "MOTB": ["TimeUS", "ThrOut", "ThLimit"],
+    "BAT": ["TimeUS", "Volt"],
+    "POWR": ["TimeUS", "Vcc"],
+    "MCU": ["MTemp"],
+    "CTUN": ["ThH"],
+    "ARM": ["TimeUS", "ArmState"],
+    "EV": ["TimeUS", "Id"],
+}
+
+
+def first_arm_us(arm, ev):
+    """TimeUS of the first arming in ARM / EV columns, or None if never armed."""
+    found = []
+    for cols, field, value in ((arm, "ArmState", 1), (ev, "Id", EV_ARMED)):
+        hits = np.flatnonzero(np.asarray(cols.get(field, [])) == value)
+        times = cols.get("TimeUS", [])
+        if len(hits) and len(times) == len(cols[field]):
+            found.append(float(times[hits[0]]))
+    return min(found) if found else None
+
+
+def analyze_columns(cols):
+    """analyze_log equivalent over columns decoded by dataflash / log_ingest."""
+    imu = cols["IMU"]
+    imu_g = np.sqrt(imu["GyrX"]**2 + imu["GyrY"]**2 + imu["GyrZ"]**2)
+
+    rc = cols["RCOU"]
+    if all(len(rc[c]) for c in ("C1", "C2", "C3", "C4")):
+        motor_outputs = np.column_stack([rc["C1"], rc["C2"], rc["C3"], rc["C4"]])
+    else:
+        motor_outputs = np.array([])
+
+    return degradation_from_series(
+        imu_g,
+        motor_outputs,
+        cols["MOTB"]["ThLimit"],
+        cols["BAT"]["Volt"],
+        cols["POWR"]["Vcc"],
+        cols["MCU"]["MTemp"],
+        cols["CTUN"]["ThH"],
+        times={
+            "vibration": imu["TimeUS"],
+            "motors": rc["TimeUS"],
+            "thrust": cols["MOTB"]["TimeUS"],
+            "battery": cols["BAT"]["TimeUS"],
+            "vcc": cols["POWR"]["TimeUS"],
+        },
+        arm_us=first_arm_us(cols.get("ARM", {}), cols.get("EV", {})),
+    )
+
+
+def _log_start(times):
+    starts = [t[0] for t in (times or {}).values() if len(t)]
+    return min(starts) if starts else 0
+
+
+def _relative_times(series, times):
+    """Per-series timestamps in seconds from the first sample of the log."""
+    if not times:
+        return {}
+    t0 = _log_start(times)
+    return {
+        k: (np.asarray(t, dtype=float) - t0) / 1e6
+        for k, t in times.items()
+        if len(t) == len(series[k])
+    }
+
+
+def degradation_from_series(imu_g, motor_outputs, th_limit, bat_volt, vcc,
+                            mcu_temp, hover_throttle, times=None, arm_us=None):
     # convert arrays
     imu_g = np.array(imu_g)
     motor_outputs = np.array(motor_outputs)
@@ -77,136 +228,318 @@ def analyze_log(logfile):
         "vibration": imu_g,
         "motors": motor_outputs,
     }
+    series["time"] = _relative_times(series, times)
+    series["arm_time"] = _arm_time(arm_us, times)
+    # TimeUS of time 0, for time-range reads (log_ingest.decode_log)
+    series["start_us"] = _log_start(times) if times else None
 
     return metrics, series
 
-def assess_subsystems(metrics):
-    subsystems = {}
 
-    # Thrust
-    th = metrics["th_limit_max"]
-    if th >= 0.95:
-        subsystems["thrust"] = {
-            "health": 0.3,
-            "issues": ["Sustained thrust saturation"],
-            "interp": "Drone operating near thrust limit",
-            "rec": "Reduce payload or increase propulsion thrust",
-        }
-    elif th >= 0.8:
-        subsystems["thrust"] = {
-            "health": 0.6,
-            "issues": ["High thrust usage"],
-            "interp": "Limited thrust margin",
-            "rec": "Monitor payload and mission profile",
-        }
-    else:
-        subsystems["thrust"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "Adequate thrust margin",
-            "rec": "No action required",
-        }
+def _arm_time(arm_us, times):
+    """Arming time in the series' time base (s from log start), None if unknown."""
+    if arm_us is None or not times:
+        return None
+    return (arm_us - _log_start(times)) / 1e6
 
-    # Battery
-    v = metrics["bat_volt_mean"]
-    if v < 20:
-        subsystems["battery"] = {
-            "health": 0.4,
-            "issues": ["Low battery voltage"],
-            "interp": "Significant voltage sag",
-            "rec": "Replace or inspect battery",
-        }
-    else:
-        subsystems["battery"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "Normal discharge profile",
-            "rec": "Battery healthy",
-        }
 
-    # FC Power
-    vcc = metrics["vcc_min"]
-    if vcc < 4.8:
-        subsystems["fc"] = {
-            "health": 0.3,
-            "issues": ["FC voltage instability"],
-            "interp": "Risk of brownout",
-            "rec": "Check power module and wiring",
-        }
-    else:
-        subsystems["fc"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "Stable FC supply",
-            "rec": "No action required",
-        }
+# ---------------- STREAMING (MEMORY-BUDGETED) ANALYSIS ----------------
 
-    # Propulsion vibration
-    vib = metrics["gyro_rms"]
-    if vib > 0.4:
-        subsystems["propulsion"] = {
-            "health": 0.4,
-            "issues": ["High vibration"],
-            "interp": "Propulsion imbalance",
-            "rec": "Balance props and inspect motors",
-        }
-    else:
-        subsystems["propulsion"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "Low vibration levels",
-            "rec": "Propulsion healthy",
-        }
+class DegradeAccumulator:
+    """
+    Online state for degradation_from_series.  update() takes decoded
+    column blocks in DEGRADE_FIELDS layout; the metrics are exact and the
+    plot series are evenly decimated to at most max_points each.
+    """
 
-    # Motor balance
-    mb = metrics["motor_imbalance"]
-    if mb > 80:
-        subsystems["motor"] = {
-            "health": 0.4,
-            "issues": ["Motor imbalance"],
-            "interp": "Uneven thrust distribution",
-            "rec": "Inspect motors and frame alignment",
-        }
-    else:
-        subsystems["motor"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "Balanced motor outputs",
-            "rec": "No action required",
-        }
+    def __init__(self, max_points=5000):
+        self.gyro_sq = RunningStats()
+        self.motors = RunningStats()
+        self.th_limit = RunningStats()
+        self.bat_volt = RunningStats()
+        self.vcc = RunningStats()
+        self.mcu_temp = RunningStats()
+        self.hover = RunningStats()
+        self.series = {k: Decimator(max_points)
+                       for k in ("thrust", "battery", "vcc", "vibration", "motors")}
+        self.arm_us = None
 
-    # Efficiency
-    ht = metrics["hover_throttle"]
-    if ht > 0.45:
-        subsystems["efficiency"] = {
-            "health": 0.4,
-            "issues": ["Low thrust efficiency"],
-            "interp": "High hover throttle",
-            "rec": "Increase prop size or motor thrust",
-        }
-    else:
-        subsystems["efficiency"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "High thrust reserve",
-            "rec": "Propulsion sizing adequate",
-        }
+    def _keep(self, key, values, t):
+        self.series[key].update(values, t if len(t) == len(values) else None)
+
+    def update(self, cols):
+        imu = cols["IMU"]
+        imu_g = np.sqrt(imu["GyrX"]**2 + imu["GyrY"]**2 + imu["GyrZ"]**2)
+        self.gyro_sq.update(imu_g**2)
+        self._keep("vibration", imu_g, imu["TimeUS"])
 
-    # Thermal
-    temp = metrics["mcu_temp_mean"]
-    if temp > 75:
-        subsystems["thermal"] = {
-            "health": 0.4,
-            "issues": ["High MCU temperature"],
-            "interp": "Thermal stress risk",
-            "rec": "Improve cooling or airflow",
+        rc = cols["RCOU"]
+        if all(len(rc[c]) for c in ("C1", "C2", "C3", "C4")):
+            out = np.column_stack([rc["C1"], rc["C2"], rc["C3"], rc["C4"]])
+            self.motors.update(out)
+            self._keep("motors", out, rc["TimeUS"])
+
+        motb = cols["MOTB"]
+        self.th_limit.update(motb["ThLimit"])
+        self._keep("thrust", motb["ThLimit"], motb["TimeUS"])
+
+        bat = cols["BAT"]
+        self.bat_volt.update(bat["Volt"])
+        self._keep("battery", bat["Volt"], bat["TimeUS"])
+
+        powr = cols["POWR"]
+        self.vcc.update(powr["Vcc"])
+        self._keep("vcc", powr["Vcc"], powr["TimeUS"])
+
+        self.mcu_temp.update(cols["MCU"]["MTemp"])
+        self.hover.update(cols["CTUN"]["ThH"])
+
+        if self.arm_us is None:
+            self.arm_us = first_arm_us(cols.get("ARM", {}), cols.get("EV", {}))
+        return self
+
+    def result(self):
+        # NaN for message types the log lacks, as the array code gives
+        metrics = {
+            "gyro_rms": np.sqrt(self.gyro_sq.mean) if self.gyro_sq.n else np.nan,
+            "motor_imbalance": self.motors.std,
+            "th_limit_max": self.th_limit.max if self.th_limit.n else np.nan,
+            "bat_volt_min": self.bat_volt.min if self.bat_volt.n else np.nan,
+            "bat_volt_mean": self.bat_volt.mean if self.bat_volt.n else np.nan,
+            "vcc_min": self.vcc.min if self.vcc.n else np.nan,
+            "mcu_temp_mean": self.mcu_temp.mean if self.mcu_temp.n else np.nan,
+            "hover_throttle": self.hover.mean if self.hover.n else np.nan,
         }
-    else:
-        subsystems["thermal"] = {
-            "health": 1.0,
-            "issues": [],
-            "interp": "Normal FC temperature",
-            "rec": "No action required",
+
+        series = {k: d.values() for k, d in self.series.items()}
+        # the decimators always keep each series' first sample, so the
+        # log start used by _relative_times is unchanged
+        times = {k: d.times() for k, d in self.series.items()}
+        series["time"] = _relative_times(series, times)
+        series["arm_time"] = _arm_time(self.arm_us, times)
+        series["start_us"] = _log_start(times)
+        return metrics, series
+
+
+def analyze_log_streaming(logfile, max_points=5000, chunk_bytes=1 << 20):
+    """
+    analyze_log in bounded memory for any log_ingest ref.  The metrics
+    match the array path; series are decimated for plotting, so events
+    found on them (anomalies.detect_events) are approximate.
+    """
+    acc = DegradeAccumulator(max_points)
+    dec = log_ingest.log_decoder(logfile, DEGRADE_FIELDS)
+    for cols in log_ingest.iter_log_blocks(logfile, DEGRADE_FIELDS, chunk_bytes, decoder=dec):
+        acc.update(cols)
+    metrics, series = acc.result()
+    metrics.update(dec.health().as_dict())
+    return metrics, series
+
+# ---------------- SUBSYSTEM RULES ----------------
+# One entry per subsystem. Levels are checked in order and the first
+# whose comparison holds wins; "ok" applies when none do (including NaN
+# metrics). Thresholds can be overridden per airframe without code
+# changes, see load_overrides().
+
+SUBSYSTEM_RULES = [
+    {
+        "subsystem": "thrust",
+        "metric": "th_limit_max",
+        "levels": [
+            {"op": ">=", "threshold": 0.95, "health": 0.3,
+             "issues": ["Sustained thrust saturation"],
+             "interp": "Drone operating near thrust limit",
+             "rec": "Reduce payload or increase propulsion thrust"},
+            {"op": ">=", "threshold": 0.8, "health": 0.6,
+             "issues": ["High thrust usage"],
+             "interp": "Limited thrust margin",
+             "rec": "Monitor payload and mission profile"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "Adequate thrust margin",
+               "rec": "No action required"},
+    },
+    {
+        "subsystem": "battery",
+        "metric": "bat_volt_mean",
+        "levels": [
+            {"op": "<", "threshold": 20, "health": 0.4,
+             "issues": ["Low battery voltage"],
+             "interp": "Significant voltage sag",
+             "rec": "Replace or inspect battery"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "Normal discharge profile",
+               "rec": "Battery healthy"},
+    },
+    {
+        "subsystem": "fc",
+        "metric": "vcc_min",
+        "levels": [
+            {"op": "<", "threshold": 4.8, "health": 0.3,
+             "issues": ["FC voltage instability"],
+             "interp": "Risk of brownout",
+             "rec": "Check power module and wiring"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "Stable FC supply",
+               "rec": "No action required"},
+    },
+    {
+        "subsystem": "propulsion",
+        "metric": "gyro_rms",
+        "levels": [
+            {"op": ">", "threshold": 0.4, "health": 0.4,
+             "issues": ["High vibration"],
+             "interp": "Propulsion imbalance",
+             "rec": "Balance props and inspect motors"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "Low vibration levels",
+               "rec": "Propulsion healthy"},
+    },
+    {
+        "subsystem": "motor",
+        "metric": "motor_imbalance",
+        "levels": [
+            {"op": ">", "threshold": 80, "health": 0.4,
+             "issues": ["Motor imbalance"],
+             "interp": "Uneven thrust distribution",
+             "rec": "Inspect motors and frame alignment"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "Balanced motor outputs",
+               "rec": "No action required"},
+    },
+    {
+        "subsystem": "efficiency",
+        "metric": "hover_throttle",
+        "levels": [
+            {"op": ">", "threshold": 0.45, "health": 0.4,
+             "issues": ["Low thrust efficiency"],
+             "interp": "High hover throttle",
+             "rec": "Increase prop size or motor thrust"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "High thrust reserve",
+               "rec": "Propulsion sizing adequate"},
+    },
+    {
+        "subsystem": "thermal",
+        "metric": "mcu_temp_mean",
+        "levels": [
+            {"op": ">", "threshold": 75, "health": 0.4,
+             "issues": ["High MCU temperature"],
+             "interp": "Thermal stress risk",
+             "rec": "Improve cooling or airflow"},
+        ],
+        "ok": {"health": 1.0, "issues": [],
+               "interp": "Normal FC temperature",
+               "rec": "No action required"},
+    },
+]
+
+_OPS = {
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "<=": np.less_equal,
+    "<": np.less,
+}
+
+
+def load_overrides(path):
+    """
+    Per-airframe threshold overrides from a JSON file:
+        {"<airframe>": {"<subsystem>": [threshold per level, ...]}}
+    """
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _thresholds(rule, k, airframes, overrides, n):
+    base = rule["levels"][k]["threshold"]
+    thr = np.full(n, float(base))
+    if not overrides or airframes is None:
+        return thr
+    per_af = {af: subs[rule["subsystem"]][k]
+              for af, subs in overrides.items()
+              if rule["subsystem"] in subs and len(subs[rule["subsystem"]]) > k}
+    if per_af:
+        import pandas as pd
+        mapped = pd.Series(airframes).map(per_af).to_numpy(dtype=float)
+        thr = np.where(np.isnan(mapped), thr, mapped)
+    return thr
+
+
+def rule_levels(columns, rules=SUBSYSTEM_RULES, airframes=None, overrides=None):
+    """
+    Level index per subsystem for every flight, in one array pass per level.
+    columns: mapping metric name -> array (a DataFrame works).
+    Returns {subsystem: int array}; len(levels) means "ok".
+    """
+    out = {}
+    n = None
+    for rule in rules:
+        vals = np.asarray(columns[rule["metric"]], dtype=float)
+        n = len(vals)
+        conds = [
+            _OPS[lvl["op"]](vals, _thresholds(rule, k, airframes, overrides, n))
+            for k, lvl in enumerate(rule["levels"])
+        ]
+        out[rule["subsystem"]] = np.select(conds, np.arange(len(conds)),
+                                           default=len(conds))
+    return out
+
+
+def evaluate_rules(frame, rules=SUBSYSTEM_RULES, overrides=None, airframe_col="airframe"):
+    """
+    Vectorised assess_subsystems + overall_bottleneck over many flights.
+
+    frame: DataFrame with one row per flight and the analyze_log metric
+    columns (plus optional airframe_col for overrides).
+    Returns a DataFrame with <subsystem>_health, <subsystem>_rec per
+    subsystem and the bottleneck / bottleneck_rec of each flight.
+    """
+    import pandas as pd
+
+    airframes = frame[airframe_col].to_numpy() if airframe_col in frame else None
+    levels = rule_levels(frame, rules, airframes, overrides)
+
+    out = pd.DataFrame(index=frame.index)
+    healths = []
+    recs = []
+    for rule in rules:
+        table = rule["levels"] + [rule["ok"]]
+        idx = levels[rule["subsystem"]]
+        health = np.array([lvl["health"] for lvl in table])[idx]
+        rec = np.array([lvl["rec"] for lvl in table], dtype=object)[idx]
+        out[f"{rule['subsystem']}_health"] = health
+        out[f"{rule['subsystem']}_rec"] = rec
+        healths.append(health)
+        recs.append(rec)
+
+    # argmin keeps the first subsystem on ties, like overall_bottleneck
+    worst = np.argmin(np.vstack(healths), axis=0)
+    names = np.array([r["subsystem"] for r in rules], dtype=object)
+    out["bottleneck"] = names[worst]
+    out["bottleneck_rec"] = np.vstack(recs)[worst, np.arange(len(frame))]
+    return out
+
+
+def assess_subsystems(metrics, airframe=None, overrides=None):
+    columns = {k: [v] for k, v in metrics.items()}
+    airframes = None if airframe is None else np.array([airframe], dtype=object)
+    levels = rule_levels(columns, SUBSYSTEM_RULES, airframes, overrides)
+
+    subsystems = {}
+    for rule in SUBSYSTEM_RULES:
+        k = int(levels[rule["subsystem"]][0])
+        lvl = rule["levels"][k] if k < len(rule["levels"]) else rule["ok"]
+        subsystems[rule["subsystem"]] = {
+            "health": lvl["health"],
+            "issues": list(lvl["issues"]),
+            "interp": lvl["interp"],
+            "rec": lvl["rec"],
         }
 
     return subsystems
@@ -0,0 +1,558 @@
+import mmap
+import struct
+from collections import namedtuple
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+
+# ---------------- DATAFLASH FRAMING ----------------
+#
+# Every DataFlash message is  A3 95 <type> <payload>, where the payload
+# layout of each type is declared by an FMT (type 128) message.  The
+# helpers below decode selected regions of a .bin directly, which lets
+# callers look at parts of a log without walking it from the start.
+
+HEAD = b"\xa3\x95"
+FMT_TYPE = 128
+FMT_STRUCT = struct.Struct("<BB4s16s64s")
+
+# FMT format character -> (struct code, multiplier), as in
+# pymavlink.DFReader.FORMAT_TO_STRUCT; kept here so decoding a log does
+# not import pymavlink (and its MAVLink dialect) at all
+FORMAT_TO_STRUCT = {
+    "a": ("64s", None), "b": ("b", None), "B": ("B", None), "g": ("e", None),
+    "h": ("h", None), "H": ("H", None), "i": ("i", None), "I": ("I", None),
+    "f": ("f", None), "n": ("4s", None), "N": ("16s", None), "Z": ("64s", None),
+    "c": ("h", 0.01), "C": ("H", 0.01), "e": ("i", 0.01), "E": ("I", 0.01),
+    "L": ("i", 1e-7), "d": ("d", None), "M": ("b", None), "q": ("q", None),
+    "Q": ("Q", None),
+}
+
+
+class LogFormat:
+    def __init__(self, msg_type, name, length, fmt, columns):
+        self.msg_type = msg_type
+        self.name = name
+        self.length = length
+        self.columns = columns
+        self.codes = [FORMAT_TO_STRUCT[c][0] for c in fmt]
+        self.struct = struct.Struct("<" + "".join(self.codes))
+        self.mults = [FORMAT_TO_STRUCT[c][1] for c in fmt]
+
+    @cached_property
+    def dtype(self):
+        """numpy record of a whole message (header included); field i is f{i}."""
+        fields = [("head", "V3")]
+        for i, code in enumerate(self.codes):
+            fields.append((f"f{i}", _NUMPY_CODES.get(code) or "S" + code[:-1]))
+        return np.dtype(fields)
+
+
+@lru_cache(maxsize=1024)
+def parse_format(msg_type, length, name, fmt, cols):
+    """
+    LogFormat of one FMT message's raw fields, or None if it cannot be
+    decoded.  Cached: logs from the same firmware repeat the same FMT
+    block, so each struct and numpy dtype is compiled once per process,
+    not once per log.
+    """
+    try:
+        lf = LogFormat(msg_type, _cstr(name), length, _cstr(fmt), tuple(_cstr(cols).split(",")))
+    except KeyError:
+        return None
+    return lf if lf.struct.size + 3 == length else None
+
+
+# struct code -> numpy type; "<n>s" strings become S<n>
+_NUMPY_CODES = {
+    "b": "i1", "B": "u1", "h": "<i2", "H": "<u2", "i": "<i4", "I": "<u4",
+    "q": "<i8", "Q": "<u8", "e": "<f2", "f": "<f4", "d": "<f8",
+}
+
+
+def _cstr(raw):
+    return raw.split(b"\0", 1)[0].decode("ascii", errors="ignore")
+
+
+def _column(values):
+    # string fields (n / N / Z formats) stay as str objects
+    if values and isinstance(values[0], bytes):
+        return np.array([_cstr(v) for v in values], dtype=object)
+    return np.array(values, dtype=float)
+
+
+def open_log_buffer(bin_path):
+    """Memory-map a log file read-only (empty files map to b"")."""
+    with open(bin_path, "rb") as fh:
+        try:
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""
+
+
+# ArduPilot writes the FMT of every built-in message type at log start
+HEAD_FORMAT_BYTES = 1 << 20
+
+
+def read_formats(buf):
+    """
+    Collect every FMT definition in the buffer.
+    FMT messages are found with a plain byte search, so late FMTs
+    (written just before a type is first used) are picked up too.
+    """
+    formats = {}
+    pat = HEAD + bytes([FMT_TYPE])
+    pos = buf.find(pat)
+    while pos != -1:
+        body = buf[pos + 3:pos + 3 + FMT_STRUCT.size]
+        if len(body) == FMT_STRUCT.size:
+            lf = parse_format(*FMT_STRUCT.unpack(body))
+            if lf is not None:
+                formats[lf.msg_type] = lf
+        pos = buf.find(pat, pos + 1)
+    return formats
+
+
+def read_head_formats(buf, names=(), head_bytes=HEAD_FORMAT_BYTES):
+    """
+    read_formats over the first head_bytes of a log only.  The whole
+    buffer is searched after all if a type in `names` is not defined
+    there (a late FMT, written just before the type's first message).
+    """
+    formats = read_formats(buf[:head_bytes])
+    if not {lf.name for lf in formats.values()}.issuperset(names):
+        formats = read_formats(buf)
+    return formats
+
+
+def _valid_at(buf, pos, formats, end):
+    if buf[pos:pos + 2] != HEAD:
+        return False
+    fmt = formats.get(buf[pos + 2]) if pos + 2 < len(buf) else None
+    if fmt is None:
+        return False
+    nxt = pos + fmt.length
+    # the message must be followed by another header (or the region end)
+    return nxt >= end or buf[nxt:nxt + 2] == HEAD
+
+
+def resync(buf, pos, formats, end=None):
+    """Return the offset of the next plausible message header at or after pos."""
+    end = len(buf) if end is None else end
+    while True:
+        pos = buf.find(HEAD, pos, end)
+        if pos == -1:
+            return None
+        if _valid_at(buf, pos, formats, end):
+            return pos
+        pos += 1
+
+
+# ---------------- DAMAGE SCAN ----------------
+#
+# Logs cut off by a power loss or with corrupt blocks.  A message counts
+# as intact when its type is known and the next header (or the end of
+# the file) follows it; every byte outside intact messages is damage.
+
+# damaged regions listed in results; the byte total covers all of them
+MAX_REPORTED_REGIONS = 20
+
+
+class LogHealth(namedtuple("LogHealth", "size skipped_bytes damaged truncated")):
+    """
+    size: bytes examined; damaged: [(start, end)] byte ranges skipped;
+    truncated: the log ends inside a message.
+    """
+
+    @classmethod
+    def from_regions(cls, size, damaged):
+        skipped = sum(e - s for s, e in damaged)
+        truncated = bool(damaged) and damaged[-1][1] >= size
+        return cls(size, skipped, damaged, truncated)
+
+    @property
+    def completeness(self):
+        return 1.0 - self.skipped_bytes / self.size if self.size else 0.0
+
+    @property
+    def clean(self):
+        return self.skipped_bytes == 0 and self.size > 0
+
+    def as_dict(self):
+        """Fields merged into analysis results (JSON-able)."""
+        return {
+            "data_complete": self.clean,
+            "completeness": self.completeness,
+            "skipped_bytes": self.skipped_bytes,
+            "truncated": self.truncated,
+            "damaged_regions": [[int(s), int(e)]
+                                for s, e in self.damaged[:MAX_REPORTED_REGIONS]],
+        }
+
+
+def scan_log(buf, formats=None, block_bytes=16 << 20):
+    """
+    Find the damaged regions of a whole log with vectorised searches:
+    every A3 95 header candidate is located with numpy (block by block,
+    bounding the temporaries), each candidate's end is looked up from its
+    type's length, and a candidate is intact when another candidate or
+    the end of the log starts exactly there.  Time is linear in the log
+    size whatever the damage.  Returns a LogHealth.
+    """
+    formats = read_formats(buf) if formats is None else formats
+    n = len(buf)
+    if n == 0:
+        return LogHealth(0, 0, [], False)
+
+    lengths = np.zeros(256, dtype=np.int64)
+    for t, lf in formats.items():
+        lengths[t] = lf.length
+
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    found = []
+    for s in range(0, n - 2, block_bytes):
+        blk = raw[s:min(s + block_bytes + 1, n)]
+        found.append(np.flatnonzero((blk[:-1] == 0xA3) & (blk[1:] == 0x95)) + s)
+    heads = np.concatenate(found) if found else np.array([], dtype=np.int64)
+    pos = heads[heads + 2 < n]
+
+    ends = pos + lengths[raw[pos + 2]]
+    i = np.minimum(np.searchsorted(heads, ends), max(len(heads) - 1, 0))
+    intact = (ends > pos) & ((ends == n) | ((ends < n) & (heads[i] == ends)))
+    starts, ends = pos[intact], ends[intact]
+
+    # gaps between intact messages (overlaps absorbed by the running max)
+    covered = np.maximum.accumulate(ends) if len(ends) else ends
+    gap_lo = np.concatenate(([0], covered))
+    gap_hi = np.concatenate((starts, [n]))
+    gap = gap_hi > gap_lo
+    damaged = list(zip(gap_lo[gap].tolist(), gap_hi[gap].tolist()))
+    return LogHealth.from_regions(n, damaged)
+
+
+def region_offsets(buf, start, end, formats, types):
+    """
+    {msg_type: start offsets} of the messages of `types` beginning in
+    buf[start:end], found with array operations instead of a walk from
+    message to message.  A header counts, as in resync(), only when the
+    next header follows the message (or the buffer ends there).
+    """
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    n = len(raw)
+    hi = min(end, n - 2)
+    out = {t: np.array([], dtype=np.int64) for t in types}
+    if hi <= start:
+        return out
+
+    pos = start + np.flatnonzero((raw[start:hi] == 0xA3) & (raw[start + 1:hi + 1] == 0x95))
+    kind = raw[pos + 2]
+    for t in types:
+        cand = pos[kind == t]
+        nxt = cand + formats[t].length
+        cand, nxt = cand[nxt <= n], nxt[nxt <= n]
+        ok = np.ones(len(cand), dtype=bool)
+        inner = nxt + 1 < n
+        ok[inner] = (raw[nxt[inner]] == 0xA3) & (raw[nxt[inner] + 1] == 0x95)
+        out[t] = cand[ok]
+    return out
+
+
+def decode_region(buf, start, end, formats, wanted):
+    """
+    Decode the messages in buf[start:end] whose names appear in `wanted`.
+
+    wanted: {"CTUN": ["ThO"], "ATT": ["Roll", "Pitch"], ...}
+    Returns {name: {column: np.ndarray}}; missing columns come back empty.
+    """
+    by_name = {f.name: f for f in formats.values()}
+    types = [by_name[name].msg_type for name in wanted if name in by_name]
+    offsets = region_offsets(buf, start, end, formats, types)
+
+    out = {}
+    for name, cols in wanted.items():
+        lf = by_name.get(name)
+        if lf is None:
+            out[name] = {c: _column([]) for c in cols}
+        else:
+            out[name] = decode_records(buf, offsets[lf.msg_type], lf, cols)
+    return out
+
+
+class StreamDecoder:
+    """
+    Incremental DataFlash decoder: feed() it bytes as they arrive and call
+    finish() for the columns.  Only one partial message is carried between
+    feeds, so the source can be a network transfer or a decompressor.
+
+    A message is only taken when the next header follows it, so damaged
+    regions are skipped (resynchronising with a byte search) instead of
+    decoded as garbage; health() reports what was skipped.
+    """
+
+    def __init__(self, wanted):
+        self.wanted = wanted
+        self.formats = {}
+        self._picks = {}
+        self._out = {name: {c: [] for c in cols} for name, cols in wanted.items()}
+        self._tail = b""
+        self._base = 0          # stream offset of _tail[0]
+        self._bad_from = None   # stream offset where the current damage began
+        self._damaged = []
+        self._flushed = False
+
+    def _add_format(self, lf):
+        self.formats[lf.msg_type] = lf
+        cols = self.wanted.get(lf.name)
+        if cols is not None:
+            self._picks[lf.msg_type] = [(c, lf.columns.index(c)) for c in cols if c in lf.columns]
+
+    def _good_from(self, at):
+        if self._bad_from is not None:
+            self._damaged.append((self._bad_from, at))
+            self._bad_from = None
+
+    def feed(self, block):
+        self._consume(self._tail + block if self._tail else block, final=False)
+
+    def flush(self):
+        """End of stream: decode the last message, count any cut-off bytes."""
+        if not self._flushed:
+            self._flushed = True
+            self._consume(self._tail, final=True)
+
+    def _consume(self, data, final):
+        n = len(data)
+        pos = 0
+        base = self._base
+        formats = self.formats
+        picks = self._picks
+
+        while n - pos >= 3:
+            if data[pos] != 0xA3 or data[pos + 1] != 0x95:
+                if self._bad_from is None:
+                    self._bad_from = base + pos
+                nxt = data.find(HEAD, pos + 1)
+                pos = nxt if nxt != -1 else n - 1
+                continue
+
+            msg_type = data[pos + 2]
+
+            if msg_type == FMT_TYPE:
+                if n - pos < 3 + FMT_STRUCT.size:
+                    break
+                lf = parse_format(*FMT_STRUCT.unpack_from(data, pos + 3))
+                if lf is not None:
+                    self._add_format(lf)
+                self._good_from(base + pos)
+                pos += 3 + FMT_STRUCT.size
+                continue
+
+            lf = formats.get(msg_type)
+            end = pos + lf.length if lf is not None else 0
+            if lf is not None and end + 2 > n and not (final and end <= n):
+                break
+            if lf is None or (end + 2 <= n and (data[end] != 0xA3 or data[end + 1] != 0x95)):
+                # unknown type, or not followed by a header: damaged
+                if self._bad_from is None:
+                    self._bad_from = base + pos
+                pos += 1
+                continue
+
+            self._good_from(base + pos)
+            idx = picks.get(msg_type)
+            if idx:
+                vals = lf.struct.unpack_from(data, pos + 3)
+                dest = self._out[lf.name]
+                for c, i in idx:
+                    m = lf.mults[i]
+                    dest[c].append(vals[i] * m if m is not None else vals[i])
+            pos = end
+
+        if final and pos < n and self._bad_from is None:
+            self._bad_from = base + pos     # cut off mid-message
+        self._tail = bytes(data[pos:])
+        self._base = base + pos
+
+    def health(self):
+        """LogHealth of everything fed so far (call after finish() / flush())."""
+        size = self._base + len(self._tail)
+        damaged = list(self._damaged)
+        if self._bad_from is not None:
+            damaged.append((self._bad_from, size))
+        return LogHealth.from_regions(size, damaged)
+
+    def finish(self):
+        self.flush()
+        return self._columns()
+
+    def _columns(self):
+        return {name: {c: _column(v) for c, v in cols.items()}
+                for name, cols in self._out.items()}
+
+    def drain(self):
+        """Columns decoded since the last drain(); they are not kept."""
+        cols = self._columns()
+        self._out = {name: {c: [] for c in cs} for name, cs in self.wanted.items()}
+        return cols
+
+
+def decode_stream(fh, wanted, chunk_bytes=1 << 20, decoder=None):
+    """
+    Decode a DataFlash byte stream read sequentially from a file object.
+    Returns the same {name: {column: np.ndarray}} layout as decode_region.
+    Pass a StreamDecoder as `decoder` to read its health() afterwards.
+    """
+    dec = decoder or StreamDecoder(wanted)
+    for block in iter(lambda: fh.read(chunk_bytes), b""):
+        dec.feed(block)
+    return dec.finish()
+
+
+class FormatScanner:
+    """Collect FMT definitions from a byte stream without decoding messages."""
+
+    def __init__(self):
+        self.formats = {}
+        self._tail = b""
+
+    def feed(self, block):
+        data = self._tail + bytes(block)
+        self.formats.update(read_formats(data))
+        self._tail = data[-(2 + FMT_STRUCT.size):]
+
+
+# ---------------- MESSAGE INDEX ----------------
+#
+# One pass over a log records where every message starts, by type, and
+# the TimeUS of the first timed message in each CHECKPOINT_BYTES of the
+# file.  A time-range query maps the window to a byte range through the
+# checkpoints and unpacks only the wanted messages inside it, so zooming
+# into a minute of a long log reads that minute and nothing else.
+
+CHECKPOINT_BYTES = 64 * 1024
+
+
+class MessageIndex:
+    """
+    offsets: {msg_type: sorted np.ndarray of message start offsets}
+    cp_offset / cp_time: checkpoint offsets and the TimeUS found there.
+    """
+
+    def __init__(self, offsets, cp_offset, cp_time):
+        self.offsets = offsets
+        self.cp_offset = np.asarray(cp_offset, dtype=np.int64)
+        self.cp_time = np.asarray(cp_time, dtype=float)
+        self._formats = None
+
+    @property
+    def start_us(self):
+        return float(self.cp_time[0]) if len(self.cp_time) else None
+
+    def formats(self, buf):
+        """The log's formats, parsed from the indexed FMT messages only."""
+        if self._formats is None:
+            size = 3 + FMT_STRUCT.size
+            self._formats = read_formats(
+                b"".join(buf[o:o + size] for o in self.offsets.get(FMT_TYPE, [])))
+        return self._formats
+
+    def byte_range(self, t0_us, t1_us, size):
+        """[start, end) of the log holding every message timed in [t0_us, t1_us]."""
+        if not len(self.cp_time):
+            return 0, size
+        # messages of different types are logged slightly out of time
+        # order, so the range is widened by one checkpoint on each side
+        t = np.maximum.accumulate(self.cp_time)
+        i = np.searchsorted(t, t0_us, side="left") - 2
+        j = np.searchsorted(t, t1_us, side="right") + 1
+        start = int(self.cp_offset[i]) if i >= 0 else 0
+        end = int(self.cp_offset[j]) if j < len(t) else size
+        return start, end
+
+    def select(self, msg_type, start, end):
+        offs = self.offsets.get(msg_type)
+        if offs is None:
+            return np.array([], dtype=np.int64)
+        a, b = np.searchsorted(offs, [start, end])
+        return offs[a:b]
+
+
+def build_index(buf, formats=None):
+    """Walk the whole log once and return its MessageIndex."""
+    formats = read_formats(buf) if formats is None else formats
+    timed = {t: lf.columns.index("TimeUS") for t, lf in formats.items()
+             if "TimeUS" in lf.columns}
+    n = len(buf)
+    found = {}
+    cp_offset, cp_time = [], []
+    next_cp = 0
+
+    pos = resync(buf, 0, formats)
+    while pos is not None and pos < n - 2:
+        lf = formats.get(buf[pos + 2])
+        if lf is None or buf[pos] != 0xA3 or buf[pos + 1] != 0x95:
+            pos = resync(buf, pos + 1, formats)
+            continue
+        if pos + lf.length > n:
+            break
+        offs = found.get(lf.msg_type)
+        if offs is None:
+            offs = found[lf.msg_type] = []
+        offs.append(pos)
+        if pos >= next_cp and lf.msg_type in timed:
+            cp_offset.append(pos)
+            cp_time.append(lf.struct.unpack_from(buf, pos + 3)[timed[lf.msg_type]])
+            next_cp = pos + CHECKPOINT_BYTES
+        pos += lf.length
+
+    width = np.uint32 if n < 2**32 else np.int64
+    offsets = {t: np.array(v, dtype=width) for t, v in found.items()}
+    return MessageIndex(offsets, cp_offset, cp_time)
+
+
+def decode_records(buf, offsets, lf, cols, time_range=None):
+    """
+    Unpack the lf messages starting at `offsets` into {column: np.ndarray},
+    all at once through lf.dtype.  time_range=(t0_us, t1_us) keeps only
+    messages timed inside it (untimed types are kept whole).
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    recs = raw[offsets[:, None] + np.arange(lf.length)].view(lf.dtype).ravel()
+
+    if time_range is not None and "TimeUS" in lf.columns:
+        t = recs[f"f{lf.columns.index('TimeUS')}"]
+        recs = recs[(t >= time_range[0]) & (t <= time_range[1])]
+
+    out = {}
+    for c in cols:
+        if c not in lf.columns:
+            out[c] = _column([])
+            continue
+        i = lf.columns.index(c)
+        v = recs[f"f{i}"]
+        if v.dtype.kind == "S":
+            out[c] = _column(v.tolist())
+        else:
+            v = v.astype(float)
+            out[c] = v * lf.mults[i] if lf.mults[i] is not None else v
+    return out
+
+
+def decode_time_range(buf, index, wanted, t0_us, t1_us):
+    """
+    decode_region for a time window: the columns in `wanted` of messages
+    timed in [t0_us, t1_us], read through the log's MessageIndex.
+    """
+    by_name = {lf.name: lf for lf in index.formats(buf).values()}
+    start, end = index.byte_range(t0_us, t1_us, len(buf))
+    out = {}
+    for name, cols in wanted.items():
+        lf = by_name.get(name)
+        if lf is None:
+            out[name] = {c: _column([]) for c in cols}
+        else:
+            out[name] = decode_records(buf, index.select(lf.msg_type, start, end), lf, cols,
+                                       (t0_us, t1_us))
+    return out
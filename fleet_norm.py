@@ -0,0 +1,237 @@
+"""
+Fleet-relative scoring.
+
+The component scores in compute_flightscore divide by fixed constants
+(att_var / 6, rms_vibe / hover / 60, vcc_std / 0.15, ...), which mean
+different things on different airframes.  FleetSketches keeps, per
+airframe class, one mergeable QuantileSketch (online_stats) of the raw
+quantity behind each component, and scores a flight by where it falls
+in its class: 100 = better than every flight seen, 50 = fleet median.
+
+    python fleet_norm.py build --db fleet.sqlite -o fleet.json
+    python fleet_norm.py merge site_a.json site_b.json -o fleet.json
+    python fleet_norm.py score fleet.json flight.bin
+
+Only bucket counts are kept, never the flights themselves, so sketches
+built by different processes or machines merge exactly (merge / the
+merge command) and the file stays small however large the fleet.
+watch_folder.py folds each newly scored log into FLEET_SKETCHES.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from compute_flightscore import SCORE_WEIGHTS, safe_div
+from online_stats import QuantileSketch
+
+FLEET_SKETCHES = os.environ.get(
+    "FLIGHT_FLEET_SKETCHES", os.path.join(tempfile.gettempdir(), "fleet_sketches.json"))
+
+# flights of a class needed before its percentiles are shown
+MIN_FLEET = 20
+
+
+def _finite(v):
+    return v is not None and np.isfinite(v)
+
+
+def _att(m):
+    return np.sqrt(m["roll_var"] + m["pitch_var"]) if _finite(m.get("roll_var")) else None
+
+
+def _per_hover(key):
+    def f(m):
+        hover = m.get("hover_throttle")
+        return safe_div(m[key], hover, default=None) if _finite(m.get(key)) and hover else None
+    return f
+
+
+def _hover_offset(m):
+    hover = m.get("hover_throttle")
+    return abs(hover - 0.4) if _finite(hover) else None
+
+
+def _endurance(m):
+    # sample-count estimates depend on log rate, only seconds compare
+    return m["endurance_est"] if m.get("endurance_unit") == "s" else None
+
+
+# component -> (raw quantity from the metrics dict, higher is better)
+FLEET_FEATURES = {
+    "stability": (_att, False),
+    "control": (lambda m: m.get("hover_throttle"), False),
+    "efficiency": (_hover_offset, False),
+    "smoothness": (_per_hover("rms_vibe"), False),
+    "electrical": (lambda m: m.get("vcc_std"), False),
+    "energy": (_per_hover("volt_drop"), False),
+    "endurance": (_endurance, True),
+}
+
+
+def airframe_class(metrics):
+    """Default class of a flight: its pack's series cell count."""
+    cells = metrics.get("cells")
+    return f"{int(cells)}S" if _finite(cells) else "unknown"
+
+
+def feature_values(metrics):
+    """{component: raw value} for the components the metrics support."""
+    out = {}
+    for comp, (fn, _) in FLEET_FEATURES.items():
+        try:
+            v = fn(metrics)
+        except (KeyError, TypeError):
+            v = None
+        if _finite(v):
+            out[comp] = float(v)
+    return out
+
+
+class FleetSketches:
+    """
+    {airframe class: {component: QuantileSketch}} plus flight counts.
+    add() folds in one flight's metrics, merge() another FleetSketches;
+    percentiles() / fleet_scores() place a flight against its class.
+    """
+
+    def __init__(self, rel_acc=0.01):
+        self.rel_acc = rel_acc
+        self.sketches = {}
+        self.flights = {}
+
+    def _class(self, airframe):
+        if airframe not in self.sketches:
+            self.sketches[airframe] = {c: QuantileSketch(self.rel_acc) for c in FLEET_FEATURES}
+            self.flights[airframe] = 0
+        return self.sketches[airframe]
+
+    def add(self, metrics, airframe=None):
+        airframe = airframe or airframe_class(metrics)
+        sk = self._class(airframe)
+        for comp, v in feature_values(metrics).items():
+            sk[comp].update([v])
+        self.flights[airframe] += 1
+        return self
+
+    def merge(self, other):
+        for airframe, theirs in other.sketches.items():
+            mine = self._class(airframe)
+            for comp, sk in theirs.items():
+                mine[comp].merge(sk)
+            self.flights[airframe] += other.flights[airframe]
+        return self
+
+    def count(self, airframe):
+        return self.flights.get(airframe, 0)
+
+    def percentiles(self, metrics, airframe=None):
+        """{component: 0..100 share of the class this flight beats (ties half)}."""
+        airframe = airframe or airframe_class(metrics)
+        sk = self.sketches.get(airframe, {})
+        values = feature_values(metrics)
+        out = {}
+        for comp, (_, higher_better) in FLEET_FEATURES.items():
+            if comp not in values or comp not in sk or sk[comp].count == 0:
+                out[comp] = None
+                continue
+            below = sk[comp].rank(values[comp])
+            out[comp] = 100 * (below if higher_better else 1 - below)
+        return out
+
+    def fleet_scores(self, metrics, airframe=None):
+        """
+        Component percentiles plus "fleet_score", their SCORE_WEIGHTS
+        average over the components with a percentile.
+        """
+        pct = self.percentiles(metrics, airframe)
+        have = {k: v for k, v in pct.items() if v is not None}
+        weight = sum(SCORE_WEIGHTS[k] for k in have)
+        pct["fleet_score"] = (sum(SCORE_WEIGHTS[k] * v for k, v in have.items()) / weight
+                              if weight else None)
+        return pct
+
+    # ---- serialisation ----
+
+    def to_dict(self):
+        return {
+            "rel_acc": self.rel_acc,
+            "classes": {
+                af: {"flights": self.flights[af],
+                     "sketches": {c: sk.to_dict() for c, sk in comps.items()}}
+                for af, comps in self.sketches.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        fleet = cls(d["rel_acc"])
+        for af, body in d["classes"].items():
+            fleet.sketches[af] = {c: QuantileSketch.from_dict(s)
+                                  for c, s in body["sketches"].items()}
+            fleet.flights[af] = body["flights"]
+        return fleet
+
+    def save(self, path=None):
+        path = path or FLEET_SKETCHES
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".part")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self.to_dict(), fh)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=None):
+        """Sketches stored at path, or an empty fleet if there are none."""
+        path = path or FLEET_SKETCHES
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as fh:
+            return cls.from_dict(json.load(fh))
+
+
+# ---------------- CLI ----------------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Fleet-relative flight scoring")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="sketch every metrics result in a results store")
+    b.add_argument("--db", default=None)
+    b.add_argument("-o", "--out", default=FLEET_SKETCHES)
+
+    m = sub.add_parser("merge", help="merge sketch files")
+    m.add_argument("inputs", nargs="+")
+    m.add_argument("-o", "--out", default=FLEET_SKETCHES)
+
+    s = sub.add_parser("score", help="fleet percentiles of a log")
+    s.add_argument("sketches")
+    s.add_argument("log")
+    s.add_argument("--airframe", default=None)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        from results_store import ResultsStore
+        store = ResultsStore(args.db)
+        fleet = FleetSketches()
+        for _, _, _, metrics in store.entries("metrics"):
+            fleet.add(metrics)
+        fleet.save(args.out)
+        print(json.dumps(fleet.flights))
+    elif args.cmd == "merge":
+        fleet = FleetSketches()
+        for path in args.inputs:
+            fleet.merge(FleetSketches.load(path))
+        fleet.save(args.out)
+        print(json.dumps(fleet.flights))
+    else:
+        from analysis_service import analyze
+        metrics = analyze("metrics", args.log)
+        fleet = FleetSketches.load(args.sketches)
+        print(json.dumps(fleet.fleet_scores(metrics, args.airframe), indent=2))
+
+
+if __name__ == "__main__":
+    main()
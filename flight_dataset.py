@@ -0,0 +1,82 @@
+"""
+One decoded flight, shared by the FlightScore and FlightDegrade analyses.
+
+A FlightDataset decodes its log once, on first use, into the columns of
+every message type either analysis reads (log_ingest.default_fields:
+SCORE_FIELDS and DEGRADE_FIELDS merged).  compute_flight_score,
+compute_flight_metrics and analyze_log all accept one in place of a
+path, so scoring a flight and then opening its degradation report
+costs a single decode.
+
+The pages keep datasets in st.session_state through session_dataset(),
+so a log scored on FileScore is not decoded again on FlightDegrade.
+"""
+
+from collections import OrderedDict
+
+import log_ingest
+
+# decoded flights kept per session; older ones are dropped (and simply
+# decoded again if revisited)
+SESSION_DATASETS = 4
+
+
+class FlightDataset:
+    def __init__(self, ref, digest=None):
+        self.ref = ref
+        self.digest = digest
+        self._cols = None
+        self._health = None
+
+    @property
+    def name(self):
+        return log_ingest.log_name(self.ref)
+
+    @property
+    def decoded(self):
+        return self._cols is not None
+
+    @property
+    def columns(self):
+        """{message: {column: np.ndarray}} for every field the app reads."""
+        if self._cols is None:
+            fields = log_ingest.default_fields()
+            dec = log_ingest.log_decoder(self.ref, fields)
+            self._cols = log_ingest.decode_log(self.ref, fields, decoder=dec)
+            self._health = dec.health()
+        return self._cols
+
+    @property
+    def health(self):
+        """dataflash.LogHealth of the decode: skipped bytes and damaged regions."""
+        self.columns
+        return self._health
+
+    @property
+    def nbytes(self):
+        if self._cols is None:
+            return 0
+        return sum(v.nbytes for cols in self._cols.values() for v in cols.values())
+
+    def __repr__(self):
+        state = "decoded" if self.decoded else "not decoded"
+        return f"FlightDataset({self.ref!r}, {state})"
+
+
+def session_dataset(state, key, ref, digest=None):
+    """
+    The FlightDataset for key in a session state mapping, created on
+    first request.  At most SESSION_DATASETS are held, least recently
+    used dropped first.
+    """
+    shelf = state.get("flight_datasets")
+    if shelf is None:
+        shelf = state["flight_datasets"] = OrderedDict()
+
+    ds = shelf.get(key)
+    if ds is None or ds.ref != ref:
+        ds = shelf[key] = FlightDataset(ref, digest)
+    shelf.move_to_end(key)
+    while len(shelf) > SESSION_DATASETS:
+        shelf.popitem(last=False)
+    return ds
@@ -0,0 +1,225 @@
+"""
+Concurrent-session load test for the Streamlit pages.
+
+    python loadtest.py --sessions 8 --concurrency 4 --logs 3 --samples 3000
+    python loadtest.py ... --baseline loadtest_baseline.json --update-baseline
+    python loadtest.py ... --baseline loadtest_baseline.json --tolerance 0.25
+
+Each simulated session drives a page through streamlit.testing's AppTest,
+the way a browser session would: FileScore sessions upload synthetic logs,
+wait for the ranking and open Details; FlightDegrade sessions upload one
+log and render the subsystem report.  AppTest keeps a process-wide
+runtime, so each session runs in its own worker process; they share
+work only through the spool directory and the analysis daemon, if one
+is running (see analysis_service.py).
+
+Reported: per-step latency percentiles, peak RSS per session (max and
+sum over sessions) and growth of the temp directory.  With
+--baseline the run fails (exit 1) when a p50/p95 latency is more than
+--tolerance slower than the stored one.
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+PAGES = {
+    "filescore": os.path.join(ROOT, "pages", "1_FileScore.py"),
+    "degrade": os.path.join(ROOT, "pages", "FlightDegrade.py"),
+}
+
+
+# ---------------- MEASUREMENT ----------------
+
+def dir_bytes(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, f))
+            except OSError:
+                pass
+    return total
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    a = np.array(values)
+    return {
+        "n": int(len(a)),
+        "p50": float(np.percentile(a, 50)),
+        "p95": float(np.percentile(a, 95)),
+        "p99": float(np.percentile(a, 99)),
+        "max": float(a.max()),
+    }
+
+
+# ---------------- SESSIONS ----------------
+
+def _timed(timings, step, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    timings.setdefault(step, []).append(time.perf_counter() - t0)
+    return out
+
+
+def _check(at, page):
+    if len(at.exception):
+        raise RuntimeError(f"{page}: {at.exception[0].value}")
+
+
+def filescore_session(logs, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    at = AppTest.from_file(PAGES["filescore"], default_timeout=timeout)
+    _timed(timings, "filescore.open", at.run)
+
+    up = at.file_uploader[0]
+    for name, data in logs:
+        up.upload(name, data)
+    _timed(timings, "filescore.upload_rank", up.run)
+    _check(at, "filescore")
+
+    details = [b for b in at.button if b.label == "Details"]
+    if details:
+        _timed(timings, "filescore.details", details[0].click().run)
+        _check(at, "filescore")
+    return timings
+
+
+def degrade_session(logs, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    timings = {}
+    at = AppTest.from_file(PAGES["degrade"], default_timeout=timeout)
+    _timed(timings, "degrade.open", at.run)
+
+    name, data = logs[0]
+    _timed(timings, "degrade.upload_analyze", at.file_uploader[0].upload(name, data).run)
+    _check(at, "degrade")
+    return timings
+
+
+# ---------------- RUN ----------------
+
+def make_logs(n_logs, n_samples, seed):
+    from synthetic_log import log_bytes
+    return [(f"synthetic_{seed}_{k}.bin", log_bytes(n_samples, seed=seed * 1000 + k))
+            for k in range(n_logs)]
+
+
+def _session(k, n_logs, n_samples, timeout, unique):
+    sys.path.insert(0, ROOT)
+    logs = make_logs(n_logs, n_samples, seed=k + 1 if unique else 0)
+    if k % 2 == 0:
+        timings = filescore_session(logs, timeout)
+    else:
+        timings = degrade_session(logs, timeout)
+    return timings, peak_rss_mb()
+
+
+def run(sessions=8, concurrency=4, n_logs=3, n_samples=3000, timeout=300, unique=False):
+    """
+    Run `sessions` page sessions, alternating FileScore / FlightDegrade,
+    at most `concurrency` at a time.
+    unique=True gives every session its own logs (no cache sharing).
+    """
+    tmp = tempfile.gettempdir()
+    disk0 = dir_bytes(tmp)
+    t0 = time.perf_counter()
+
+    # one fresh process per session: AppTest's runtime is process-global
+    with ProcessPoolExecutor(max_workers=concurrency, max_tasks_per_child=1,
+                             mp_context=mp.get_context("spawn")) as ex:
+        futs = [ex.submit(_session, k, n_logs, n_samples, timeout, unique)
+                for k in range(sessions)]
+        results = [f.result() for f in futs]
+
+    wall = time.perf_counter() - t0
+    steps = {}
+    rss = []
+    for timings, peak in results:
+        rss.append(peak)
+        for step, vals in timings.items():
+            steps.setdefault(step, []).extend(vals)
+
+    return {
+        "config": {"sessions": sessions, "concurrency": concurrency, "logs": n_logs,
+                   "samples": n_samples, "unique": unique},
+        "wall_s": wall,
+        "latency_s": {step: percentiles(v) for step, v in sorted(steps.items())},
+        "peak_rss_mb": {"max_session": max(rss), "sum_sessions": sum(rss)},
+        "temp_growth_mb": (dir_bytes(tmp) - disk0) / 2**20,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Regressions beyond tolerance (fraction) against a stored report."""
+    failures = []
+    for step, cur in report["latency_s"].items():
+        ref = baseline.get("latency_s", {}).get(step)
+        if not ref:
+            continue
+        for q in ("p50", "p95"):
+            if ref.get(q) and cur[q] > ref[q] * (1 + tolerance):
+                failures.append(f"{step} {q}: {cur[q]:.3f}s vs baseline {ref[q]:.3f}s")
+    return failures
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--logs", type=int, default=3, help="logs uploaded per FileScore session")
+    ap.add_argument("--samples", type=int, default=3000, help="50 Hz samples per synthetic log")
+    ap.add_argument("--unique", action="store_true", help="distinct logs per session")
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--baseline", help="baseline JSON to compare against / update")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="allowed slowdown vs baseline, as a fraction")
+    ap.add_argument("--out", help="write the report JSON here")
+    args = ap.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    report = run(args.sessions, args.concurrency, args.logs, args.samples,
+                 args.timeout, args.unique)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as fh:
+            fh.write(text)
+        return 0
+
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            failures = compare(report, json.load(fh), args.tolerance)
+        if failures:
+            print("REGRESSION:", *failures, sep="\n  ", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""
+Ingestion of raw and compressed flight logs.
+
+Accepts .bin, .bin.gz, .bz2, .xz, .zst and .zip archives holding one or
+more .bin logs.  Compressed logs are decompressed as a stream straight
+into dataflash.decode_stream, so the decompressed file never exists on
+disk or in memory as a whole.
+
+Ground-station telemetry (.tlog, plain or compressed) is accepted the
+same way: log_decoder() hands it to tlog.TlogDecoder, which yields the
+DataFlash columns the analyses read.
+
+A log is addressed by a "ref": a plain path, or "archive.zip::member.bin"
+for one member of a zip.
+
+Uploads are spooled to a content-addressed directory in fixed-size
+chunks (spool_upload), hashing and optionally decoding as they go.
+
+decode_log(ref, wanted, time_range=...) reads one time window; raw .bin
+logs get a message index on first use, so later windows seek straight to
+the right part of the file.  The index is saved in INDEX_DIR under the
+log's content digest, never next to the user's log, so copies of a log
+share it.
+"""
+
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import tempfile
+import zipfile
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+
+import dataflash
+import tlog
+
+MEMBER_SEP = "::"
+
+UPLOAD_TYPES = ["bin", "tlog", "gz", "bz2", "xz", "zst", "zstd", "zip"]
+
+TLOG_SUFFIX = ".tlog"
+
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".xz", ".zst", ".zstd", ".zip")
+
+
+# ---------------- REFS ----------------
+
+def split_ref(ref):
+    path, _, member = str(ref).partition(MEMBER_SEP)
+    return path, member or None
+
+
+def is_compressed(ref):
+    path, member = split_ref(ref)
+    return member is not None or path.lower().endswith(COMPRESSED_SUFFIXES)
+
+
+def is_tlog(ref):
+    """MAVLink telemetry rather than DataFlash (compressed or not)."""
+    path, member = split_ref(ref)
+    low = (member or path).lower()
+    for suf in COMPRESSED_SUFFIXES:
+        if low.endswith(suf):
+            low = low[:-len(suf)]
+            break
+    return low.endswith(TLOG_SUFFIX)
+
+
+def is_raw_dataflash(ref):
+    """A plain .bin on disk: memory-mappable, indexable, readable by pymavlink."""
+    return not is_compressed(ref) and not is_tlog(ref)
+
+
+def list_logs(path):
+    """Refs for every log held in path (one for anything but a zip)."""
+    if not path.lower().endswith(".zip"):
+        return [path]
+    with zipfile.ZipFile(path) as zf:
+        members = [m.filename for m in zf.infolist()
+                   if not m.is_dir() and m.filename.lower().endswith((".bin", TLOG_SUFFIX))]
+    return [f"{path}{MEMBER_SEP}{m}" for m in sorted(members)]
+
+
+def log_suffix(name):
+    low = name.lower()
+    for suf in COMPRESSED_SUFFIXES:
+        if low.endswith(suf):
+            # x.tlog.gz keeps its .tlog, so the spooled copy is still telemetry
+            return TLOG_SUFFIX + suf if low[:-len(suf)].endswith(TLOG_SUFFIX) else suf
+    return os.path.splitext(name)[1] or ".bin"
+
+
+def ref_digest(digest, ref):
+    """Cache key for one log: content digest plus zip member, if any."""
+    member = split_ref(ref)[1]
+    return digest if member is None else f"{digest}{MEMBER_SEP}{member}"
+
+
+def log_name(ref):
+    path, member = split_ref(ref)
+    return os.path.basename(member or path)
+
+
+# ---------------- STREAMS ----------------
+
+def _zstd_reader(fh):
+    try:
+        import zstandard
+    except ImportError as ex:
+        raise ImportError("reading .zst logs requires the 'zstandard' package") from ex
+    return zstandard.ZstdDecompressor().stream_reader(fh)
+
+
+@contextmanager
+def open_log_stream(ref):
+    """Binary file object yielding the decompressed DataFlash bytes of ref."""
+    path, member = split_ref(ref)
+    low = path.lower()
+
+    if low.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            if member is None:
+                logs = list_logs(path)
+                if not logs:
+                    raise ValueError(f"no .bin logs in {path}")
+                member = split_ref(logs[0])[1]
+            with zf.open(member) as fh:
+                yield fh
+        return
+
+    if low.endswith(".gz"):
+        with gzip.open(path, "rb") as fh:
+            yield fh
+    elif low.endswith(".bz2"):
+        with bz2.open(path, "rb") as fh:
+            yield fh
+    elif low.endswith(".xz"):
+        with lzma.open(path, "rb") as fh:
+            yield fh
+    elif low.endswith((".zst", ".zstd")):
+        with open(path, "rb") as raw, _zstd_reader(raw) as fh:
+            yield fh
+    else:
+        with open(path, "rb") as fh:
+            yield fh
+
+
+# ---------------- DECODE ----------------
+
+def merge_fields(*field_maps):
+    merged = {}
+    for fm in field_maps:
+        for name, cols in fm.items():
+            dest = merged.setdefault(name, [])
+            dest.extend(c for c in cols if c not in dest)
+    return merged
+
+
+def default_fields():
+    from compute_flightscore import SCORE_FIELDS
+    from compute_logic1 import DEGRADE_FIELDS
+    return merge_fields(SCORE_FIELDS, DEGRADE_FIELDS)
+
+
+def log_decoder(ref, wanted):
+    """Incremental decoder for ref: tlog.TlogDecoder or dataflash.StreamDecoder."""
+    if is_tlog(ref):
+        return tlog.TlogDecoder(wanted)
+    return dataflash.StreamDecoder(wanted)
+
+
+def decode_log(ref, wanted=None, time_range=None, decoder=None):
+    """
+    Stream-decode the columns in `wanted` (default: everything the app uses).
+    time_range=(t0_us, t1_us) keeps only messages whose TimeUS is inside;
+    a raw .bin is then read through its index instead of from the start.
+    Pass a log_decoder() as `decoder` to read its health() after.
+    """
+    wanted = wanted or default_fields()
+    if time_range is not None:
+        return _decode_range(ref, wanted, *time_range)
+    with open_log_stream(ref) as fh:
+        return dataflash.decode_stream(fh, wanted, decoder=decoder or log_decoder(ref, wanted))
+
+
+def iter_log_blocks(ref, wanted=None, chunk_bytes=1 << 20, decoder=None):
+    """
+    Yield the columns of ref one read block at a time, in the layout of
+    decode_log; nothing is accumulated, so memory stays at one block.
+    """
+    wanted = wanted or default_fields()
+    dec = decoder or log_decoder(ref, wanted)
+    with open_log_stream(ref) as fh:
+        for block in iter(lambda: fh.read(chunk_bytes), b""):
+            dec.feed(block)
+            yield dec.drain()
+    dec.flush()
+    yield dec.drain()
+
+
+def scan_health(ref):
+    """
+    dataflash.scan_log of a raw .bin (vectorised, no decoding); None for
+    compressed and telemetry refs, whose health comes from the stream
+    decoder instead.
+    """
+    if not is_raw_dataflash(ref):
+        return None
+    return dataflash.scan_log(dataflash.open_log_buffer(ref))
+
+
+# ---------------- TIME-RANGE QUERIES ----------------
+
+INDEX_DIR = os.path.join(tempfile.gettempdir(), "flight_logs", "index")
+INDEX_SUFFIX = ".idx.npz"
+INDEX_VERSION = 2
+
+
+def file_sha256(path, chunk_bytes=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_bytes), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def index_path(digest, index_dir=None):
+    """Saved MessageIndex of the log with this content digest."""
+    return os.path.join(index_dir or INDEX_DIR, digest + INDEX_SUFFIX)
+
+
+def _read_sidecar(side, stamp):
+    try:
+        arrays = np.load(side)
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+    with arrays:
+        if "stamp" not in arrays or not np.array_equal(arrays["stamp"], stamp):
+            return None
+        offsets = {int(k[4:]): arrays[k] for k in arrays.files if k.startswith("off_")}
+        return dataflash.MessageIndex(offsets, arrays["cp_offset"], arrays["cp_time"])
+
+
+def _write_sidecar(side, stamp, index):
+    arrays = {f"off_{t}": v for t, v in index.offsets.items()}
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(side) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            np.savez(fh, stamp=stamp, cp_offset=index.cp_offset, cp_time=index.cp_time,
+                     **arrays)
+        os.replace(tmp, side)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+@lru_cache(maxsize=16)
+def _index(path, size, mtime_ns):
+    stamp = np.array([INDEX_VERSION, size], dtype=np.int64)
+    side = index_path(file_sha256(path))
+    index = _read_sidecar(side, stamp)
+    if index is None:
+        index = dataflash.build_index(dataflash.open_log_buffer(path))
+        try:
+            os.makedirs(os.path.dirname(side), exist_ok=True)
+            _write_sidecar(side, stamp, index)
+        except OSError:
+            pass    # unwritable index directory: the index lives in memory only
+    return index
+
+
+def load_index(path):
+    """
+    MessageIndex of a raw .bin: the saved one for its content digest if
+    there is one, otherwise built with one pass and saved in INDEX_DIR.
+    Cached per (path, size, mtime), so the log is hashed once per change.
+    """
+    st = os.stat(path)
+    return _index(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def _decode_range(ref, wanted, t0_us, t1_us):
+    if is_raw_dataflash(ref):
+        buf = dataflash.open_log_buffer(ref)
+        return dataflash.decode_time_range(buf, load_index(ref), wanted, t0_us, t1_us)
+
+    # compressed data and telemetry have no index: decode it all and trim
+    timed = merge_fields(wanted, {name: ["TimeUS"] for name in wanted})
+    cols = decode_log(ref, timed)
+    out = {}
+    for name, fields in wanted.items():
+        t = cols[name]["TimeUS"]
+        keep = (t >= t0_us) & (t <= t1_us) if len(t) else slice(None)
+        out[name] = {c: cols[name][c][keep] if len(cols[name][c]) else cols[name][c]
+                     for c in fields}
+    return out
+
+
+# ---------------- UPLOAD SPOOLING ----------------
+
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), "flight_logs")
+
+SpooledLog = namedtuple("SpooledLog", "path digest size formats")
+
+
+def _incremental_decompressor(name):
+    """decompress(bytes) -> bytes for name, None for raw logs, False if not streamable."""
+    low = name.lower()
+    if low.endswith(".zip"):
+        return False
+    if low.endswith(".gz"):
+        return zlib.decompressobj(wbits=31).decompress
+    if low.endswith(".bz2"):
+        return bz2.BZ2Decompressor().decompress
+    if low.endswith(".xz"):
+        return lzma.LZMADecompressor().decompress
+    if low.endswith((".zst", ".zstd")):
+        try:
+            import zstandard
+        except ImportError:
+            return False
+        return zstandard.ZstdDecompressor().decompressobj().decompress
+    return None
+
+
+def spool_upload(src, name, spool_dir=None, chunk_bytes=1 << 20, decoder=None):
+    """
+    Copy an upload (any object with read(n)) to the spool in chunks.
+
+    The SHA-256 is computed during the copy and names the spooled file,
+    so a log uploaded twice is stored once.  FMT records of a DataFlash log
+    are parsed as the bytes pass through (a .tlog has none, so its formats
+    come back empty); pass a log_decoder() as `decoder` to decode columns
+    during the transfer as well (not possible for .zip).
+
+    Returns SpooledLog(path, digest, size, formats).
+    """
+    spool_dir = spool_dir or SPOOL_DIR
+    os.makedirs(spool_dir, exist_ok=True)
+
+    if hasattr(src, "seek"):
+        src.seek(0)
+
+    unpack = _incremental_decompressor(name)
+    # FMT records only exist in DataFlash; telemetry is just decoded
+    streamable = unpack is not False
+    scanner = dataflash.FormatScanner() if streamable and not is_tlog(name) else None
+
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=spool_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for block in iter(lambda: src.read(chunk_bytes), b""):
+                out.write(block)
+                h.update(block)
+                size += len(block)
+                if streamable and (scanner is not None or decoder is not None):
+                    raw = unpack(block) if unpack else block
+                    if scanner is not None:
+                        scanner.feed(raw)
+                    if decoder is not None:
+                        decoder.feed(raw)
+
+        digest = h.hexdigest()
+        path = os.path.join(spool_dir, digest + log_suffix(name))
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    formats = scanner.formats if scanner is not None else {}
+    return SpooledLog(path, digest, size, formats)
@@ -0,0 +1,362 @@
+"""
+Online accumulators for analysing logs without holding them in memory.
+
+Every accumulator takes numpy blocks through update() and can be
+combined with merge(), so a log can be summarised block by block as it
+is decoded (or in parallel pieces) in memory independent of its length:
+
+    RunningStats    count / mean / variance (Welford, Chan et al. merge),
+                    min / max, first / last value
+    QuantileSketch  log-bucketed quantiles with bounded relative error
+                    (DDSketch); median hover throttle, 5th-pct voltage,
+                    fleet percentiles (fleet_norm)
+    Decimator       an evenly strided subsample of at most max_points,
+                    for plots of logs too large to keep
+
+minmax_decimate() thins an in-memory series to a point budget for plots.
+
+PeakRSS and over_budget() support the memory-budgeted entry points in
+compute_flightscore and compute_logic1.
+"""
+
+import os
+import threading
+import zipfile
+
+import numpy as np
+
+
+# ---------------- ACCUMULATORS ----------------
+
+class RunningStats:
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.first = None
+        self.last = None
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float).ravel()
+        if len(x) == 0:
+            return self
+        if self.first is None:
+            self.first = float(x[0])
+        self.last = float(x[-1])
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+
+        n, mean = len(x), float(x.mean())
+        m2 = float(((x - mean) ** 2).sum())
+        return self._combine(n, mean, m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        return self
+
+    def merge(self, other):
+        """Fold in another RunningStats that covers data after this one's."""
+        if other.n == 0:
+            return self
+        if self.first is None:
+            self.first = other.first
+        self.last = other.last
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self._combine(other.n, other.mean, other.m2)
+
+    @property
+    def var(self):
+        # population variance, as np.var
+        return self.m2 / self.n if self.n else np.nan
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.var)) if self.n else np.nan
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative accuracy `rel_acc`: a value
+    v > 0 lands in bucket ceil(log_gamma(v)), gamma = (1 + a) / (1 - a),
+    so any reported quantile is within rel_acc of a true sample value.
+    Negative values use a mirrored store; |v| < min_value counts as zero.
+    """
+
+    def __init__(self, rel_acc=0.01, min_value=1e-9):
+        self.rel_acc = rel_acc
+        self.min_value = min_value
+        self.gamma = (1 + rel_acc) / (1 - rel_acc)
+        self._log_gamma = np.log(self.gamma)
+        self.pos = {}
+        self.neg = {}
+        self.zero = 0
+        self.count = 0
+        self._cum = None
+
+    def _key(self, v):
+        return int(np.ceil(np.log(v) / self._log_gamma))
+
+    def _add(self, store, values):
+        keys, counts = np.unique(np.ceil(np.log(values) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            store[k] = store.get(k, 0) + c
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float).ravel()
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            return self
+        self._cum = None
+        self.count += len(x)
+        big = np.abs(x) >= self.min_value
+        self.zero += int((~big).sum())
+        if (x > 0).any():
+            self._add(self.pos, x[big & (x > 0)])
+        if (x < 0).any():
+            self._add(self.neg, -x[big & (x < 0)])
+        return self
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different accuracy")
+        self._cum = None
+        for mine, theirs in ((self.pos, other.pos), (self.neg, other.neg)):
+            for k, c in theirs.items():
+                mine[k] = mine.get(k, 0) + c
+        self.zero += other.zero
+        self.count += other.count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), NaN when empty."""
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for k in sorted(self.neg, reverse=True):
+            seen += self.neg[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.pos):
+            seen += self.pos[k]
+            if seen > rank:
+                return self._value(k)
+        return self._value(max(self.pos)) if self.pos else 0.0
+
+    def _upto(self, which, key):
+        """Values in the pos / neg store with bucket key <= key."""
+        if self._cum is None:
+            self._cum = {}
+            for name, store in (("pos", self.pos), ("neg", self.neg)):
+                lo = min(store) if store else 0
+                dense = np.zeros(max(store) - lo + 1 if store else 0)
+                for k, c in store.items():
+                    dense[k - lo] = c
+                self._cum[name] = (lo, np.cumsum(dense))
+        lo, cum = self._cum[which]
+        i = key - lo
+        if i < 0 or not len(cum):
+            return 0.0
+        return cum[min(i, len(cum) - 1)]
+
+    def rank(self, x):
+        """
+        Fraction of the values seen that are below x (0..1), values in
+        x's own bucket (equal to the sketch's accuracy) counting half;
+        NaN when empty.  Cumulative counts are built once per change, so
+        each call after that is a bucket lookup.
+        """
+        if self.count == 0 or not np.isfinite(x):
+            return np.nan
+        n_neg = self._upto("neg", np.iinfo(np.int64).max)
+        if abs(x) < self.min_value:
+            below, ties = n_neg, self.zero
+        elif x > 0:
+            k = self._key(x)
+            below = n_neg + self.zero + self._upto("pos", k - 1)
+            ties = self._upto("pos", k) - self._upto("pos", k - 1)
+        else:
+            k = self._key(-x)
+            below = n_neg - self._upto("neg", k)
+            ties = self._upto("neg", k) - self._upto("neg", k - 1)
+        return float((below + ties / 2) / self.count)
+
+    def to_dict(self):
+        """JSON-able state, for merging sketches built in other processes."""
+        return {
+            "rel_acc": self.rel_acc,
+            "min_value": self.min_value,
+            "pos": {str(k): c for k, c in self.pos.items()},
+            "neg": {str(k): c for k, c in self.neg.items()},
+            "zero": self.zero,
+            "count": self.count,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        sk = cls(d["rel_acc"], d["min_value"])
+        sk.pos = {int(k): c for k, c in d["pos"].items()}
+        sk.neg = {int(k): c for k, c in d["neg"].items()}
+        sk.zero = d["zero"]
+        sk.count = d["count"]
+        return sk
+
+
+class Decimator:
+    """
+    Keep every stride-th sample (and its timestamp), doubling the stride
+    whenever more than max_points are held, so the kept points stay
+    evenly spread over however much data has been seen.
+    """
+
+    def __init__(self, max_points=5000):
+        self.max_points = max_points
+        self.stride = 1
+        self.seen = 0
+        self._values = []
+        self._times = []
+        self._held = 0
+
+    def update(self, x, t=None):
+        x = np.asarray(x)
+        n = len(x)
+        if n == 0:
+            return self
+        idx = np.flatnonzero((self.seen + np.arange(n)) % self.stride == 0)
+        self.seen += n
+        self._values.append(x[idx])
+        self._times.append(np.asarray(t)[idx] if t is not None else np.array([]))
+        self._held += len(idx)
+
+        while self._held > self.max_points:
+            values, times = self.values(), self.times()
+            self._values, self._times = [values[::2]], [times[::2]]
+            self._held = len(self._values[0])
+            self.stride *= 2
+        return self
+
+    def values(self):
+        return np.concatenate(self._values) if self._values else np.array([])
+
+    def times(self):
+        return np.concatenate(self._times) if self._times else np.array([])
+
+
+def minmax_decimate(t, x, max_points):
+    """
+    Reduce (t, x) to at most max_points samples for plotting: the series
+    is cut into max_points / 2 equal-count buckets and each keeps its
+    minimum and maximum sample, in time order, so dips and spikes
+    survive where a plain stride would skip them.
+    """
+    t = np.asarray(t, dtype=float)
+    x = np.asarray(x, dtype=float)
+    ok = np.isfinite(x)
+    if not ok.all():
+        t, x = t[ok], x[ok]
+    n = len(x)
+    if n <= max_points:
+        return t, x
+
+    buckets = max(max_points // 2, 1)
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((x, bucket))          # by bucket, then value
+    edges = np.searchsorted(bucket, np.arange(buckets + 1))
+    keep = np.unique(np.concatenate((order[edges[:-1]], order[edges[1:] - 1])))
+    return t[keep], x[keep]
+
+
+# ---------------- MEMORY ----------------
+
+# peak RSS of the array code paths is roughly this many times the size
+# of the decoded log (python message objects and float lists; measured
+# 4x for FlightScore metrics, 8x for analyze_log).  Compressed logs other
+# than zip members, whose size is recorded, are assumed to expand by
+# COMPRESSION_RATIO.
+ARRAY_MODE_EXPANSION = 8
+COMPRESSION_RATIO = 5
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        # no procfs: the process-lifetime peak is the best available
+        import resource
+    except ImportError:
+        return np.nan
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakRSS:
+    """
+    Context manager sampling this process's resident memory from a
+    background thread.  After the block: start_mb, peak_mb and
+    delta_mb (peak above the starting RSS).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = self.peak_mb = _rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = _rss_mb()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, _rss_mb())
+        return False
+
+    @property
+    def delta_mb(self):
+        return max(self.peak_mb - self.start_mb, 0.0)
+
+
+def estimate_analysis_mb(ref):
+    """Rough peak memory (MB) of analysing ref with the array code paths."""
+    import log_ingest
+
+    path, member = log_ingest.split_ref(ref)
+    if member is not None:
+        with zipfile.ZipFile(path) as zf:
+            size = zf.getinfo(member).file_size
+    else:
+        size = os.path.getsize(path)
+        if log_ingest.is_compressed(ref):
+            size *= COMPRESSION_RATIO
+    return size * ARRAY_MODE_EXPANSION / 2**20
+
+
+def over_budget(ref, memory_budget_mb):
+    """True when ref should be analysed in streaming mode."""
+    if memory_budget_mb is None:
+        return False
+    return estimate_analysis_mb(ref) > memory_budget_mb
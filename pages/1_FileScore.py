@@ -1,25 +1,24 @@
 import streamlit as st
-import tempfile
-from compute_flightscore import compute_flight_score, compute_flight_metrics
+from analysis_service import analyze
+from fleet_norm import MIN_FLEET, FleetSketches, airframe_class
+from flight_dataset import session_dataset
+from log_ingest import UPLOAD_TYPES, list_logs, log_name, ref_digest, spool_upload
+from ranking import SUBSYSTEMS, Ranking
 
 st.set_page_config(layout="wide")
 
-# ---------------- STATE INIT ----------------
-if "selected_log" not in st.session_state:
-    st.session_state.selected_log = None
-
-
 # =========================================================
 # DETAILS VIEW
 # =========================================================
 # ---------- DETAILS PANEL ----------
 if "selected_flight" in st.session_state:
     sel = st.session_state.selected_flight
-    metrics = compute_flight_metrics(sel["path"])
+    # decoded flights are shared with FlightDegrade through the session
+    ds = session_dataset(st.session_state, sel["key"], sel["path"], sel.get("digest"))
+    metrics = analyze("metrics", sel["path"], digest=sel.get("digest"), dataset=ds)
 
-    import os
     st.divider()
-    st.subheader(f"Flight Details — {os.path.basename(sel['path'])}")
+    st.subheader(f"Flight Details — {sel['name']}")
 
     col1, col2, col3 = st.columns(3)
 
@@ -43,6 +42,26 @@ if "selected_flight" in st.session_state:
 
     st.divider()
     st.metric("Flight Score", f"{metrics['flight_score']:.1f}")
+    if metrics.get("peak_rss_mb") is not None:
+        st.caption(f"Analysed in {metrics['analysis_mode']} mode, "
+                   f"peak memory {metrics['peak_rss_mb']:.0f} MB")
+    if metrics.get("data_complete") is False:
+        st.warning(f"Damaged log: {100 * metrics['completeness']:.1f}% of the data was readable, "
+                   f"{metrics['skipped_bytes']:,} bytes in {len(metrics['damaged_regions'])} "
+                   f"region(s) skipped" + (", log truncated" if metrics["truncated"] else "")
+                   + ". Results cover the readable part only.")
+
+    # ---------- FLEET PERCENTILES ----------
+    # against flights of the same airframe class (see fleet_norm.py)
+    fleet = FleetSketches.load()
+    airframe = airframe_class(metrics)
+    if fleet.count(airframe) >= MIN_FLEET:
+        pct = fleet.fleet_scores(metrics, airframe)
+        st.markdown(f"**Fleet Percentiles** — {airframe}, {fleet.count(airframe)} flights")
+        pcols = st.columns(len(SUBSYSTEMS) + 1)
+        pcols[0].metric("Fleet Score", f"{pct['fleet_score']:.0f}" if pct["fleet_score"] is not None else "N/A")
+        for col, k in zip(pcols[1:], SUBSYSTEMS):
+            col.metric(k.title(), f"{pct[k]:.0f}" if pct[k] is not None else "N/A")
 
 # =========================================================
 # RANKING VIEW
@@ -51,38 +70,126 @@ if "selected_flight" in st.session_state:
 st.title("✈️ Flight Score Comparison")
 
 uploaded = st.file_uploader(
-    "Upload flight logs (.bin)",
-    type=["bin"],
+    "Upload flight logs (.bin, .tlog, .bin.gz, .zst, .zip)",
+    type=UPLOAD_TYPES,
     accept_multiple_files=True
 )
 
 if not uploaded:
     st.stop()
 
-flights = []
+# ---------------- PREVIEW PASS ----------------
+# Sampled scores first so a big batch can be triaged immediately;
+# exact full-decode scores replace them below as they finish.
+# Uploads already handled this session (by upload id) are skipped, so
+# adding a log to a batch spools, scores and ranks only that log.
+if "scored" not in st.session_state:
+    st.session_state.scored = {}
+if "flight_history" not in st.session_state:
+    st.session_state.flight_history = {}
+if "ranking" not in st.session_state:
+    st.session_state.ranking = Ranking()
+    st.session_state.uploads = {}       # upload id -> row keys
+    st.session_state.pending = set()    # keys still on a preview score
 
-for f in uploaded:
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".bin")
-    tmp.write(f.read())
+PAGE_SIZE = 25
 
-    score = compute_flight_score(tmp.name)
+ranking = st.session_state.ranking
+uploads = st.session_state.uploads
+pending = st.session_state.pending
 
-    flights.append({
-        "name": f.name,
-        "path": tmp.name,
-        "score": score
-    })
+current = set()
 
-flights.sort(key=lambda x: x["score"], reverse=True)
+for f in uploaded:
+    upload_id = getattr(f, "file_id", None) or (f.name, f.size)
+    current.add(upload_id)
+    if upload_id in uploads:
+        continue
+
+    # chunked copy to the spool, hashed on the way; compressed uploads
+    # stay compressed on disk and are decoded as a stream
+    spooled = spool_upload(f, f.name)
+    refs = list_logs(spooled.path)
+    keys = []
+
+    for ref in refs:
+        name = f.name if len(refs) == 1 else f"{f.name}/{log_name(ref)}"
+        key = ref_digest(spooled.digest, ref)
+        row = {"key": key, "name": name, "path": ref, "digest": spooled.digest}
+        st.session_state.flight_history[key] = {"name": name, "path": ref, "digest": spooled.digest}
+        keys.append(key)
+
+        if key in ranking:
+            continue
+
+        done = st.session_state.scored.get(key)
+        if done is not None:
+            ranking.add({**row, **done, "exact": True})
+            continue
+
+        pre = analyze("preview", ref, digest=spooled.digest)
+        ranking.add({**row, "score": pre["score"], "exact": False,
+                     "ci": f"{pre['ci_low']:.0f}–{pre['ci_high']:.0f}"})
+        pending.add(key)
+
+    uploads[upload_id] = keys
+
+# logs removed from the uploader leave the ranking
+for upload_id in [u for u in uploads if u not in current]:
+    for key in uploads.pop(upload_id):
+        if not any(key in keys for keys in uploads.values()):
+            ranking.discard(key)
+            pending.discard(key)
 
 st.subheader("Ranking")
 
-for i, f in enumerate(flights, 1):
-    c1, c2, c3 = st.columns([4,1,1])
-
-    c1.write(f"**{i}. {f['name']}**")
-    c2.metric("Score", f"{f['score']:.1f}")
-
-    if c3.button("Details", key=f"{f['name']}_{i}"):
-        st.session_state.selected_log = f["path"]
+if pending:
+    todo = [ranking.rows[k] for k in pending]
+    progress = st.progress(0.0, text="Computing exact scores…")
+    preview = st.empty()
+    preview.dataframe(ranking.page(0, PAGE_SIZE)[0], use_container_width=True)
+
+    for j, f in enumerate(todo, 1):
+        ds = session_dataset(st.session_state, f["key"], f["path"], f["digest"])
+        m = analyze("metrics", f["path"], digest=f["digest"], dataset=ds)
+        done = {"score": m["flight_score"], "complete": m.get("data_complete", True),
+                **{k: m[k] for k in SUBSYSTEMS}}
+        st.session_state.scored[f["key"]] = done
+        ranking.add({**f, **done, "exact": True, "ci": None})
+        pending.discard(f["key"])
+
+        progress.progress(j / len(todo), text=f"Computing exact scores… {j}/{len(todo)}")
+        preview.dataframe(ranking.page(0, PAGE_SIZE)[0], use_container_width=True)
+
+    progress.empty()
+    preview.empty()
+
+# ---------------- FILTERS ----------------
+fc1, fc2, fc3 = st.columns([2, 2, 1])
+
+score_range = fc1.slider("Score range", 0.0, 100.0, (0.0, 100.0))
+weakest = fc2.selectbox("Weakest subsystem", ["Any", *SUBSYSTEMS])
+weakest = None if weakest == "Any" else weakest
+
+n_match = len(ranking.matching(score_range, weakest))
+n_pages = max(1, -(-n_match // PAGE_SIZE))
+page = fc3.number_input("Page", 1, n_pages, 1) - 1
+
+page_frame, _ = ranking.page(page, PAGE_SIZE, score_range, weakest)
+
+st.caption(f"{n_match} of {len(ranking)} flights match")
+st.dataframe(page_frame, use_container_width=True, hide_index=True)
+
+# ---------------- DETAILS PICKER ----------------
+if len(page_frame):
+    by_key = ranking.rows
+    d1, d2 = st.columns([4, 1])
+    pick = d1.selectbox(
+        "Flight",
+        list(page_frame.index),
+        format_func=lambda k: f"{page_frame.at[k, 'rank']}. {page_frame.at[k, 'name']}",
+        key="details_pick"
+    )
+    if d2.button("Details", key=f"details_{pick}"):
+        st.session_state.selected_flight = by_key[pick]
         st.rerun()
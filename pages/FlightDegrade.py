@@ -6,16 +6,20 @@ Created on Wed Feb 18 11:25:30 2026
 """
 
 import streamlit as st
-import plotly.graph_objects as go
 import numpy as np
-import tempfile
 import sys
 import os
 
-# ensure pages folder is in path
-sys.path.append(os.path.dirname(__file__))
+# ensure pages folder is in path (once: the script reruns on every interaction)
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.append(os.path.dirname(__file__))
 
-from compute_logic1 import analyze_log, assess_subsystems, overall_bottleneck
+from analysis_service import analyze
+from anomalies import rolling_rms, window_samples
+from flight_dataset import session_dataset
+from log_ingest import (UPLOAD_TYPES, decode_log, list_logs, log_name, ref_digest,
+                        spool_upload)
+from online_stats import minmax_decimate
 
 
 # ---------------- PAGE CONFIG ----------------
@@ -41,15 +45,59 @@ st.caption("Post-Flight Degradation & Subsystem Health Analysis")
 
 
 # ---------------- FILE UPLOAD ----------------
-st.markdown("### Upload Flight Log (.BIN)")
-uploaded_file = st.file_uploader("Upload ArduPilot BIN file", type=["bin"])
+st.markdown("### Upload Flight Logs (.BIN)")
+uploaded_files = st.file_uploader(
+    "Upload ArduPilot BIN files or telemetry .tlog (or .bin.gz / .zst / .zip)",
+    type=UPLOAD_TYPES,
+    accept_multiple_files=True
+)
+
+# every log seen this session (FileScore batches too), for the comparison
+if "flight_history" not in st.session_state:
+    st.session_state.flight_history = {}
+history = st.session_state.flight_history
+# upload id -> its log keys: an upload is spooled and hashed once, not on
+# every rerun (the spooled path and digest stay in flight_history)
+if "degrade_uploads" not in st.session_state:
+    st.session_state.degrade_uploads = {}
+uploads = st.session_state.degrade_uploads
+
+uploaded_keys = []
+current = set()
+for f in uploaded_files or []:
+    upload_id = getattr(f, "file_id", None) or (f.name, f.size)
+    current.add(upload_id)
+    if upload_id not in uploads:
+        spooled = spool_upload(f, f.name)
+        refs = list_logs(spooled.path)
+        keys = []
+        for ref in refs:
+            key = ref_digest(spooled.digest, ref)
+            name = f.name if len(refs) == 1 else f"{f.name}/{log_name(ref)}"
+            history[key] = {"name": name, "path": ref, "digest": spooled.digest}
+            keys.append(key)
+        uploads[upload_id] = keys
+    uploaded_keys.extend(uploads[upload_id])
+
+for upload_id in [u for u in uploads if u not in current]:
+    del uploads[upload_id]
+
+if uploaded_files and not uploaded_keys:
+    st.error("No .bin or .tlog logs found in the upload.")
 
 log_path = None
+log_digest = None
+log_key = None
 
-if uploaded_file is not None:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".bin") as tmp:
-        tmp.write(uploaded_file.getbuffer())
-        log_path = tmp.name
+if uploaded_keys:
+    if len(uploaded_keys) > 1:
+        pick = st.selectbox("Flight to analyse", uploaded_keys,
+                            format_func=lambda k: history[k]["name"])
+    else:
+        pick = uploaded_keys[0]
+    log_key = pick
+    log_path = history[pick]["path"]
+    log_digest = history[pick]["digest"]
 
 
 # ---------------- ANALYSIS ----------------
@@ -58,11 +106,17 @@ series = None
 subs = None
 bottleneck = None
 solution = None
+events = []
 
 if log_path:
-    metrics, series = analyze_log(log_path)
-    subs = assess_subsystems(metrics)
-    bottleneck, solution = overall_bottleneck(subs)
+    # the same decoded flight FileScore used, if it was scored this session
+    ds = session_dataset(st.session_state, log_key, log_path, log_digest)
+    result = analyze("degrade", log_path, digest=log_digest, dataset=ds)
+    metrics = result["metrics"]
+    series = result["series"]
+    subs = result["subsystems"]
+    bottleneck, solution = result["bottleneck"]
+    events = result.get("events", [])
 
 
 # ---------------- CARD FUNCTION ----------------
@@ -94,19 +148,87 @@ def subsystem_card(title, fig, data):
     st.markdown("---")
 
 
+# ---------------- EVENT OVERLAYS ----------------
+EVENT_LABELS = {
+    "vcc_dip": "Vcc dip",
+    "vcc_noise": "Vcc noise",
+    "vibration_spike": "Vibration spike",
+    "motor_saturation": "Saturation",
+    "battery_sag": "Voltage sag",
+}
+
+
+def time_axis(key):
+    """Seconds from log start for a series, or None to plot by sample."""
+    t = series.get("time", {}).get(key)
+    return np.array(t) if t is not None and len(t) else None
+
+
+ZOOM_POINTS = 4000
+ZOOM_FIELDS = {
+    "IMU": ["TimeUS", "GyrX", "GyrY", "GyrZ"],
+    "BAT": ["TimeUS", "Volt"],
+    "POWR": ["TimeUS", "Vcc"],
+    "MOTB": ["TimeUS", "ThLimit"],
+}
+# (message, y label, column)
+ZOOM_TRACES = [
+    ("IMU", "Gyro Vibration Magnitude", None),
+    ("BAT", "Battery Voltage (V)", "Volt"),
+    ("POWR", "FC Voltage (V)", "Vcc"),
+    ("MOTB", "Thrust Fraction", "ThLimit"),
+]
+ZOOM_SUBSYSTEMS = {"IMU": "propulsion", "BAT": "battery", "POWR": "fc", "MOTB": "thrust"}
+
+
+def overlay_events(fig, subsystem, timed):
+    if not timed:
+        return
+    for ev in events:
+        if ev["subsystem"] != subsystem:
+            continue
+        fig.add_vrect(
+            x0=ev["start"],
+            x1=max(ev["end"], ev["start"] + 0.2),
+            fillcolor="red",
+            opacity=0.15,
+            line_width=0,
+            annotation_text=EVENT_LABELS.get(ev["type"], ev["type"]),
+            annotation_position="top left",
+            annotation_font_size=10
+        )
+
+
+# plotly is only imported once there is something to plot
+if subs is not None or len(history) > 1:
+    import plotly.graph_objects as go
+
+
 # ---------------- SUBSYSTEM SECTION ----------------
 if subs is not None:
 
     st.header("Subsystem Health")
 
+    if metrics.get("peak_rss_mb") is not None:
+        note = " (plots decimated)" if metrics.get("analysis_mode") == "streaming" else ""
+        st.caption(f"Analysed in {metrics['analysis_mode']} mode{note}, "
+                   f"peak memory {metrics['peak_rss_mb']:.0f} MB")
+    if metrics.get("data_complete") is False:
+        st.warning(f"Damaged log: {100 * metrics['completeness']:.1f}% of the data was readable, "
+                   f"{metrics['skipped_bytes']:,} bytes in {len(metrics['damaged_regions'])} "
+                   f"region(s) skipped" + (", log truncated" if metrics["truncated"] else "")
+                   + ". Results cover the readable part only.")
+
     # ---------- THRUST ----------
     if len(series["thrust"]) > 0:
         thrust = np.array(series["thrust"])
+        t_thrust = time_axis("thrust")
 
         fig_thrust = go.Figure()
         fig_thrust.add_hrect(y0=0.95, y1=1.0, fillcolor="red", opacity=0.15, line_width=0)
 
         fig_thrust.add_trace(go.Scatter(
+            x=t_thrust,
             y=thrust,
             mode="lines",
             name="Thrust",
@@ -127,7 +249,8 @@ if subs is not None:
         )
 
         fig_thrust.update_yaxes(range=[0, 1], title="Thrust Fraction")
-        fig_thrust.update_xaxes(title="Time")
+        fig_thrust.update_xaxes(title="Time (s)" if t_thrust is not None else "Time")
+        overlay_events(fig_thrust, "thrust", t_thrust is not None)
         fig_thrust.update_layout(margin=dict(l=20, r=20, t=30, b=20))
 
         subsystem_card("Thrust Margin", fig_thrust, subs["thrust"])
@@ -135,11 +258,13 @@ if subs is not None:
     # ---------- BATTERY ----------
     if len(series["battery"]) > 0:
         batt = np.array(series["battery"])
+        t_batt = time_axis("battery")
 
         fig_batt = go.Figure()
         fig_batt.add_hrect(y0=22, y1=25, fillcolor="green", opacity=0.08, line_width=0)
 
         fig_batt.add_trace(go.Scatter(
+            x=t_batt,
             y=batt,
             mode="lines",
             line=dict(color="#1f77b4", width=2),
@@ -160,7 +285,8 @@ if subs is not None:
         )
 
         fig_batt.update_yaxes(range=[18, 25], title="Voltage (V)")
-        fig_batt.update_xaxes(title="Time")
+        fig_batt.update_xaxes(title="Time (s)" if t_batt is not None else "Time")
+        overlay_events(fig_batt, "battery", t_batt is not None)
         fig_batt.update_layout(margin=dict(l=20, r=20, t=30, b=20))
 
         subsystem_card("Battery", fig_batt, subs["battery"])
@@ -168,11 +294,13 @@ if subs is not None:
     # ---------- FC POWER ----------
     if len(series["vcc"]) > 0:
         vcc = np.array(series["vcc"])
+        t_vcc = time_axis("vcc")
 
         fig_vcc = go.Figure()
         fig_vcc.add_hrect(y0=5.0, y1=5.3, fillcolor="green", opacity=0.10, line_width=0)
 
         fig_vcc.add_trace(go.Scatter(
+            x=t_vcc,
             y=vcc,
             mode="lines",
             line=dict(color="#1f77b4", width=2),
@@ -193,7 +321,8 @@ if subs is not None:
         )
 
         fig_vcc.update_yaxes(range=[4.7, 5.4], title="FC Voltage (V)")
-        fig_vcc.update_xaxes(title="Time")
+        fig_vcc.update_xaxes(title="Time (s)" if t_vcc is not None else "Time")
+        overlay_events(fig_vcc, "fc", t_vcc is not None)
         fig_vcc.update_layout(margin=dict(l=20, r=20, t=30, b=20))
 
         subsystem_card("FC Power", fig_vcc, subs["fc"])
@@ -267,12 +396,168 @@ if subs is not None:
 
         subsystem_card("Motor Balance", fig_motor, subs["motor"])
 
+    # ---------- WITHIN-FLIGHT EVENTS ----------
+    st.header("Within-Flight Events")
+
+    t_vib = time_axis("vibration")
+    if t_vib is not None:
+        vib = np.array(series["vibration"])
+        roll_rms = rolling_rms(vib, window_samples(t_vib, 1.0))
+
+        fig_ev = go.Figure()
+        fig_ev.add_trace(go.Scatter(
+            x=t_vib,
+            y=roll_rms,
+            mode="lines",
+            line=dict(color="#1f77b4", width=2),
+            name="Gyro RMS (1 s)"
+        ))
+        overlay_events(fig_ev, "propulsion", True)
+        fig_ev.update_yaxes(title="Rolling Gyro RMS")
+        fig_ev.update_xaxes(title="Time (s)")
+        fig_ev.update_layout(margin=dict(l=20, r=20, t=30, b=20))
+        st.plotly_chart(fig_ev, use_container_width=True, height=300)
+
+    if events:
+        st.dataframe(
+            [{
+                "Event": EVENT_LABELS.get(ev["type"], ev["type"]),
+                "Subsystem": ev["subsystem"],
+                "Start (s)": round(ev["start"], 2),
+                "End (s)": round(ev["end"], 2),
+                "Value": round(ev["value"], 3),
+            } for ev in events],
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.write("No short-duration events detected.")
+
+    # ---------- ZOOM ----------
+    # full-rate samples of one window, read through the log's message
+    # index (built on first use), not from the decimated series above
+    start_us = series.get("start_us")
+    if start_us is not None and st.checkbox("Zoom into a time window"):
+        centres = {f"{EVENT_LABELS.get(ev['type'], ev['type'])} at {ev['start']:.1f} s":
+                   (ev["start"] + ev["end"]) / 2 for ev in events}
+        zc1, zc2 = st.columns(2)
+        with zc1:
+            around = st.selectbox("Centre on", list(centres) + ["Custom time"])
+            if around == "Custom time":
+                centre = st.number_input("Centre (s)", min_value=0.0, value=0.0, step=1.0)
+            else:
+                centre = centres[around]
+        with zc2:
+            width = st.slider("Window (s)", 2, 120, 30)
+
+        t0 = max(centre - width / 2, 0.0)
+        window = (start_us + t0 * 1e6, start_us + (t0 + width) * 1e6)
+        with st.spinner("Reading window..."):
+            zoom = decode_log(log_path, ZOOM_FIELDS, time_range=window)
+
+        zcols = st.columns(2)
+        for i, (name, label, column) in enumerate(ZOOM_TRACES):
+            cols = zoom[name]
+            if not len(cols["TimeUS"]):
+                continue
+            if name == "IMU":
+                y = np.sqrt(cols["GyrX"]**2 + cols["GyrY"]**2 + cols["GyrZ"]**2)
+            else:
+                y = cols[column]
+            x, y = minmax_decimate((cols["TimeUS"] - start_us) / 1e6, y, ZOOM_POINTS)
+            fig = go.Figure(go.Scatter(x=x, y=y, mode="lines", line=dict(width=1.5)))
+            overlay_events(fig, ZOOM_SUBSYSTEMS[name], True)
+            fig.update_xaxes(title="Time (s)", range=[t0, t0 + width])
+            fig.update_yaxes(title=label)
+            fig.update_layout(margin=dict(l=20, r=20, t=30, b=20))
+            with zcols[i % 2]:
+                st.plotly_chart(fig, use_container_width=True, height=300)
+
     # ---------- OVERALL ----------
     st.header("Overall System Diagnosis")
     st.write(f"**Primary Bottleneck:** {bottleneck}")
     st.write(f"**Recommended Action:** {solution}")
 
 
+# ---------------- MULTI-FLIGHT COMPARISON ----------------
+# Traces come from the cached degrade results, aligned on arming and
+# thinned so all overlaid flights share one point budget per plot.
+OVERLAY_POINTS = 4000
+MAX_OVERLAY = 10
+OVERLAY_TRACES = [
+    ("battery", "Battery Voltage (V)"),
+    ("vcc", "FC Voltage (V)"),
+    ("thrust", "Thrust Fraction"),
+    ("vibration", "Rolling Gyro RMS (1 s)"),
+]
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def overlay_traces(path, digest):
+    """Traces of one flight in seconds from arming, at most OVERLAY_POINTS each."""
+    s = analyze("degrade", path, digest=digest)["series"]
+    times = s.get("time", {})
+    arm = s.get("arm_time")
+
+    traces = {}
+    for key, _ in OVERLAY_TRACES:
+        t = times.get(key)
+        if t is None or not len(t):
+            continue
+        t = np.array(t)
+        y = np.array(s[key], dtype=float)
+        if key == "vibration":
+            y = rolling_rms(y, window_samples(t, 1.0))
+        traces[key] = minmax_decimate(t - (arm or 0.0), y, OVERLAY_POINTS)
+    return traces, arm is not None
+
+
+if len(history) > 1:
+    st.header("Multi-Flight Comparison")
+
+    keys = list(history)
+    default = uploaded_keys if len(uploaded_keys) > 1 else keys[-2:]
+    chosen = st.multiselect(
+        "Flights to overlay",
+        keys,
+        default=default[:MAX_OVERLAY],
+        format_func=lambda k: history[k]["name"],
+        max_selections=MAX_OVERLAY
+    )
+
+    if chosen:
+        budget = OVERLAY_POINTS // len(chosen)
+        flights = {k: overlay_traces(history[k]["path"], history[k]["digest"]) for k in chosen}
+
+        unarmed = [history[k]["name"] for k, (_, armed) in flights.items() if not armed]
+        if unarmed:
+            st.caption("No arming record, aligned on log start: " + ", ".join(unarmed))
+
+        cols = st.columns(2)
+        for i, (key, label) in enumerate(OVERLAY_TRACES):
+            fig = go.Figure()
+            for k in chosen:
+                trace = flights[k][0].get(key)
+                if trace is None:
+                    continue
+                x, y = minmax_decimate(*trace, budget)
+                fig.add_trace(go.Scatter(
+                    x=x,
+                    y=y,
+                    mode="lines",
+                    line=dict(width=1.5),
+                    name=history[k]["name"]
+                ))
+            fig.update_xaxes(title="Time from arming (s)")
+            fig.update_yaxes(title=label)
+            fig.update_layout(
+                margin=dict(l=20, r=20, t=30, b=20),
+                legend=dict(orientation="h", y=-0.25)
+            )
+            with cols[i % 2]:
+                st.plotly_chart(fig, use_container_width=True, height=320)
+
+
 # ---------------- BACK ----------------
 st.divider()
 if st.button("⬅ Back to Home"):
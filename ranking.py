@@ -0,0 +1,108 @@
+"""
+Flight ranking for large batches.
+
+Rows are plain dicts ({"key", "name", "score", "ci", "exact", "complete",
+<component scores>}) keyed by log content hash; "ci" is the preview's
+confidence interval, shown until the exact score replaces it.
+
+Ranking keeps a growing batch sorted across reruns: new or rescored
+flights are inserted with bisect, so adding m flights to a ranked batch
+never re-sorts the rest, and only the page being shown is turned into a
+DataFrame rather than one widget per flight.
+"""
+
+from bisect import bisect_left, bisect_right
+
+from compute_flightscore import SCORE_WEIGHTS
+
+SUBSYSTEMS = list(SCORE_WEIGHTS)
+
+COLUMNS = ["rank", "name", "score", "ci", "weakest", "exact", "complete", *SUBSYSTEMS]
+
+
+def weakest_subsystem(row):
+    comps = [(row[k], k) for k in SUBSYSTEMS if row.get(k) is not None]
+    return min(comps)[1] if comps else None
+
+
+def _page_frame(best, start):
+    import pandas as pd     # not needed until there is a page to show
+    return pd.DataFrame(
+        [{
+            "rank": start + i + 1,
+            "name": r["name"],
+            "score": r["score"],
+            "ci": r.get("ci"),
+            "weakest": weakest_subsystem(r),
+            "exact": r.get("exact", True),
+            "complete": r.get("complete", True),
+            **{k: r.get(k) for k in SUBSYSTEMS},
+        } for i, r in enumerate(best)],
+        index=pd.Index([r["key"] for r in best], name="key"),
+        columns=COLUMNS,
+    )
+
+
+class Ranking:
+    """
+    Rows kept in rank order (score descending, key ascending on ties)
+    as they arrive.  add() replaces a row with the same key, e.g. when
+    an exact score supersedes the preview.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = {}
+        self._order = []    # (-score, key), ascending = best first
+        self._neg = []      # -score alone, for score-range bisects
+        for r in rows:
+            self.add(r)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def _remove(self, key):
+        old = self.rows.pop(key, None)
+        if old is not None:
+            i = bisect_left(self._order, (-old["score"], key))
+            del self._order[i]
+            del self._neg[i]
+
+    def add(self, row):
+        key = row["key"]
+        self._remove(key)
+        self.rows[key] = row
+        item = (-row["score"], key)
+        i = bisect_left(self._order, item)
+        self._order.insert(i, item)
+        self._neg.insert(i, item[0])
+
+    def discard(self, key):
+        self._remove(key)
+
+    def ordered(self):
+        """Rows best first."""
+        return [self.rows[k] for _, k in self._order]
+
+    def matching(self, score_range=None, weakest=None):
+        """Keys passing the filters, best first; the score range is two bisects."""
+        lo, hi = 0, len(self._order)
+        if score_range is not None:
+            lo = bisect_left(self._neg, -score_range[1])
+            hi = bisect_right(self._neg, -score_range[0])
+        keys = [k for _, k in self._order[lo:hi]]
+        if weakest is not None:
+            keys = [k for k in keys if weakest_subsystem(self.rows[k]) == weakest]
+        return keys
+
+    def page(self, page=0, page_size=25, score_range=None, weakest=None):
+        """
+        One page of the filtered ranking as a DataFrame.
+        Returns (frame, n_matching); the frame's index is the row key.
+        """
+        keys = self.matching(score_range, weakest)
+        start = page * page_size
+        best = [self.rows[k] for k in keys[start:start + page_size]]
+        return _page_frame(best, start), len(keys)
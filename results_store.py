@@ -0,0 +1,142 @@
+"""
+Persistent store of finished analyses, keyed by log content hash.
+
+A single SQLite file (FLIGHT_RESULTS_DB, default flight_results.sqlite
+in the temp directory) holds
+
+    results  (key, kind) -> JSON result, plus the log's name and ref
+    files    path, size, mtime -> content digest, so unchanged files are
+             not re-hashed after a restart
+    failures (key, kind) -> failed attempts and the last error, so a log
+             that keeps crashing its worker is given up on
+
+watch_folder.py fills it in the background (spool_batch.py merge loads
+multi-node batch results into it); analysis_service answers
+from it before computing anything, so logs the daemon has seen are
+ready the moment a page asks for them.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+DEFAULT_DB = os.environ.get(
+    "FLIGHT_RESULTS_DB", os.path.join(tempfile.gettempdir(), "flight_results.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    ref TEXT,
+    body TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (key, kind)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (key, kind)
+);
+"""
+
+
+class ResultsStore:
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_DB
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    # ---------------- RESULTS ----------------
+
+    def get(self, kind, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM results WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, kind, key, result, name=None, ref=None):
+        body = json.dumps(result)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, name, ref, body, time.time()))
+
+    def kinds(self, key):
+        """Analysis kinds already stored for key."""
+        with self._lock:
+            rows = self._conn.execute("SELECT kind FROM results WHERE key = ?", (key,)).fetchall()
+        return {r[0] for r in rows}
+
+    def entries(self, kind):
+        """[(key, name, ref, result)] for every stored result of kind."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, name, ref, body FROM results WHERE kind = ? ORDER BY created",
+                (kind,)).fetchall()
+        return [(k, n, r, json.loads(b)) for k, n, r, b in rows]
+
+    # ---------------- FAILURES ----------------
+
+    def record_failure(self, kind, key, error, name=None):
+        """Count one failed attempt at kind for key; returns the attempts so far."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO failures VALUES (?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT (key, kind) DO UPDATE SET attempts = attempts + 1, "
+                "error = excluded.error, name = excluded.name, updated = excluded.updated",
+                (key, kind, name, str(error), time.time()))
+            row = self._conn.execute(
+                "SELECT attempts FROM failures WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+        return row[0]
+
+    def attempts(self, kind, key):
+        """Failed attempts recorded for kind of key."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM failures WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+        return row[0] if row else 0
+
+    # ---------------- FILES ----------------
+
+    def file_digest(self, path, size, mtime):
+        """Digest recorded for path if it still has this size and mtime."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM files WHERE path = ? AND size = ? AND mtime = ?",
+                (path, size, mtime)).fetchone()
+        return row[0] if row else None
+
+    def remember_file(self, path, size, mtime, digest):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (path, size, mtime, digest))
+
+
+_shared = None
+
+
+def shared_store():
+    """The process-wide store on DEFAULT_DB, or None if nothing was stored yet."""
+    global _shared
+    if _shared is None and os.path.exists(DEFAULT_DB):
+        _shared = ResultsStore(DEFAULT_DB)
+    return _shared
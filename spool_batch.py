@@ -0,0 +1,400 @@
+"""
+Multi-node batch scoring over a shared spool directory.
+
+    python spool_batch.py enqueue /mnt/batch /mnt/archive/2025 /mnt/archive/2026
+    python spool_batch.py work /mnt/batch              # on every node, any number
+    python spool_batch.py status /mnt/batch
+    python spool_batch.py merge /mnt/batch --db fleet.sqlite --fleet batch_fleet.json
+
+    python spool_batch.py local /tmp/batch --nodes 4   # N local processes as nodes
+
+The queue is nothing but directories on a filesystem every node mounts
+(rename must be atomic on it, as on local disks and NFS):
+
+    jobs/<id>             waiting; JSON {"ref", "attempts", "errors"}
+    claimed/<id>@<worker> taken by a worker, mtime is its heartbeat
+    done/<id>             finished
+    failed/<id>           gave up after --max-attempts
+    shards/<worker>.jsonl results, one JSON line per (log, analysis kind)
+
+A worker claims a job by renaming it into claimed/, so exactly one
+worker gets it, and touches the claim while it runs.  Claims whose
+heartbeat is older than --stale seconds belong to a crashed or cut-off
+worker: any worker renames them back into jobs/.  A job that fails, or
+whose worker keeps dying on it, is retried until it has been attempted
+--max-attempts times.  Each worker appends only to its own shard, so no
+two nodes ever write the same file; merge loads every shard into a
+results store (where analysis_service and fleet_norm find the results)
+and can sketch the batch for fleet_norm.
+
+Refs are absolute paths and must resolve to the same log on every node.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+
+import log_ingest
+from analysis_service import MEMORY_BUDGET_MB, file_digest, run_analysis, to_jsonable
+
+log = logging.getLogger("spool_batch")
+
+# analyses run for every log: compute_flight_metrics and analyze_log
+BATCH_KINDS = ("metrics", "degrade")
+
+LOG_SUFFIXES = (".bin", log_ingest.TLOG_SUFFIX) + log_ingest.COMPRESSED_SUFFIXES
+
+STATES = ("jobs", "claimed", "done", "failed", "shards")
+
+
+# ---------------- QUEUE LAYOUT ----------------
+
+def _dirs(root):
+    dirs = {s: os.path.join(root, s) for s in STATES}
+    for d in dirs.values():
+        os.makedirs(d, exist_ok=True)
+    return dirs
+
+
+def job_id(ref):
+    return hashlib.sha1(ref.encode()).hexdigest()[:20]
+
+
+def _names(path):
+    # dotfiles are half-written jobs / claims, never visible as entries
+    return [n for n in os.listdir(path) if not n.startswith(".")]
+
+
+def _write_json(path, obj):
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    with open(tmp, "w") as fh:
+        json.dump(obj, fh)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _logs_under(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for dirpath, _, files in os.walk(path):
+        for f in sorted(files):
+            if f.lower().endswith(LOG_SUFFIXES):
+                yield os.path.join(dirpath, f)
+
+
+def enqueue(root, paths):
+    """Queue every log under paths not already queued; returns the count added."""
+    dirs = _dirs(root)
+    known = set()
+    for state in ("jobs", "done", "failed"):
+        known.update(_names(dirs[state]))
+    known.update(n.split("@", 1)[0] for n in _names(dirs["claimed"]))
+
+    added = 0
+    for path in paths:
+        for f in _logs_under(os.path.abspath(path)):
+            try:
+                refs = log_ingest.list_logs(f)
+            except Exception as ex:     # unreadable archive
+                log.warning("skipping %s: %s", f, ex)
+                continue
+            for ref in refs:
+                jid = job_id(ref)
+                if jid in known:
+                    continue
+                _write_json(os.path.join(dirs["jobs"], jid),
+                            {"ref": ref, "attempts": 0, "errors": []})
+                known.add(jid)
+                added += 1
+    return added
+
+
+def status(root):
+    dirs = _dirs(root)
+    counts = {s: len(_names(dirs[s])) for s in STATES if s != "shards"}
+    counts["workers"] = sorted(n[:-len(".jsonl")] for n in _names(dirs["shards"]))
+    return counts
+
+
+def reap_stale(root, stale_s):
+    """Requeue claims whose heartbeat is older than stale_s; returns how many."""
+    dirs = _dirs(root)
+    now = time.time()
+    reaped = 0
+    for name in _names(dirs["claimed"]):
+        path = os.path.join(dirs["claimed"], name)
+        try:
+            st = os.stat(path)
+            # the claiming rename bumps ctime before the first heartbeat
+            if now - max(st.st_mtime, st.st_ctime) < stale_s:
+                continue
+            # whichever worker renames first wins; the others see it gone
+            os.rename(path, os.path.join(dirs["jobs"], name.split("@", 1)[0]))
+        except FileNotFoundError:
+            continue
+        log.warning("requeued stale claim %s", name)
+        reaped += 1
+    return reaped
+
+
+# ---------------- WORKER ----------------
+
+@lru_cache(maxsize=64)
+def _content_digest(path, size, mtime_ns):
+    # zip members share one archive hash
+    return file_digest(path)
+
+
+def log_key(ref):
+    path, _ = log_ingest.split_ref(ref)
+    st = os.stat(path)
+    return log_ingest.ref_digest(_content_digest(path, st.st_size, st.st_mtime_ns), ref)
+
+
+class _Heartbeat:
+    """Touches a claim file every interval seconds until stopped."""
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:   # reaped: the job is someone else's now
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class Worker:
+    def __init__(self, root, worker_id=None, stale_s=600.0, max_attempts=3,
+                 memory_budget_mb=MEMORY_BUDGET_MB):
+        self.root = root
+        self.dirs = _dirs(root)
+        wid = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.worker_id = wid.replace("@", "_").replace(os.sep, "_")
+        self.stale_s = stale_s
+        self.max_attempts = max_attempts
+        self.memory_budget_mb = memory_budget_mb
+        self.shard = os.path.join(self.dirs["shards"], f"{self.worker_id}.jsonl")
+        self.processed = 0
+
+    # ---- queue ----
+
+    def claim(self):
+        """(job id, claim path) of a newly claimed job, or None if none is left."""
+        for jid in sorted(_names(self.dirs["jobs"])):
+            claim = os.path.join(self.dirs["claimed"], f"{jid}@{self.worker_id}")
+            try:
+                os.rename(os.path.join(self.dirs["jobs"], jid), claim)
+            except FileNotFoundError:
+                continue    # another worker took it
+            os.utime(claim)
+            return jid, claim
+        return None
+
+    def _settle(self, jid, claim, job, state):
+        # take the claim out of the reaper's sight first, so a claim that
+        # was already requeued is not recreated by rewriting it
+        private = os.path.join(self.dirs["claimed"], "." + os.path.basename(claim))
+        try:
+            os.rename(claim, private)
+        except FileNotFoundError:
+            # reaped while we worked; the results are in the shard anyway
+            log.warning("claim on %s was lost", jid)
+            return
+        _write_json(private, job)
+        os.rename(private, os.path.join(self.dirs[state], jid))
+
+    # ---- results ----
+
+    def _append(self, records):
+        # one write per line, flushed and synced, so a crash leaves at most
+        # one torn last line (merge skips it)
+        with open(self.shard, "a") as fh:
+            for rec in records:
+                fh.write(json.dumps(rec) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def process(self, jid, claim):
+        job = _read_json(claim)
+        job["attempts"] += 1
+        job["worker"] = self.worker_id
+        if job["attempts"] > self.max_attempts:
+            # its workers kept dying on it (crash, OOM kill)
+            job["errors"].append("worker lost on every attempt")
+            self._settle(jid, claim, job, "failed")
+            return
+        _write_json(claim, job)
+
+        ref = job["ref"]
+        try:
+            with _Heartbeat(claim, max(self.stale_s / 4, 1.0)):
+                key = log_key(ref)
+                records = [{"key": key, "kind": kind, "name": log_ingest.log_name(ref),
+                            "ref": ref, "result": to_jsonable(
+                                run_analysis(kind, ref, self.memory_budget_mb))}
+                           for kind in BATCH_KINDS]
+        except Exception as ex:
+            job["errors"].append(f"{self.worker_id}: {type(ex).__name__}: {ex}")
+            state = "failed" if job["attempts"] >= self.max_attempts else "jobs"
+            log.warning("%s %s (attempt %d): %s", ref, "failed" if state == "failed"
+                        else "will be retried", job["attempts"], ex)
+            self._settle(jid, claim, job, state)
+            return
+
+        self._append(records)
+        self._settle(jid, claim, job, "done")
+        self.processed += 1
+        log.info("%s done", ref)
+
+    # ---- loop ----
+
+    def run(self, follow=False, poll_s=5.0):
+        """
+        Work until the queue is drained: nothing waiting and no claims
+        left to go stale.  follow=True keeps polling for new jobs.
+        """
+        while True:
+            got = self.claim()
+            if got is not None:
+                self.process(*got)
+                continue
+            if reap_stale(self.root, self.stale_s):
+                continue
+            if not follow and not _names(self.dirs["claimed"]):
+                return self.processed
+            time.sleep(poll_s)
+
+
+# ---------------- MERGE ----------------
+
+def iter_shards(root):
+    """Every result record in the shards; torn lines from crashes are skipped."""
+    dirs = _dirs(root)
+    for name in sorted(_names(dirs["shards"])):
+        with open(os.path.join(dirs["shards"], name)) as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    log.warning("skipping torn line in %s", name)
+
+
+def merge(root, db=None, fleet_out=None):
+    """
+    Load every shard into the results store at db.  Results of a job run
+    twice (a worker presumed dead finished after all) simply overwrite
+    each other.  With fleet_out, the batch's metrics are also sketched
+    into a fleet_norm file, each log once.
+    """
+    from results_store import ResultsStore
+
+    store = ResultsStore(db)
+    fleet = None
+    if fleet_out:
+        from fleet_norm import FleetSketches
+        fleet = FleetSketches()
+    sketched = set()
+    n = 0
+    for rec in iter_shards(root):
+        store.put(rec["kind"], rec["key"], rec["result"], name=rec["name"], ref=rec["ref"])
+        n += 1
+        if fleet is not None and rec["kind"] == "metrics" and rec["key"] not in sketched:
+            fleet.add(rec["result"])
+            sketched.add(rec["key"])
+    if fleet is not None:
+        fleet.save(fleet_out)
+    store.close()
+    return n
+
+
+# ---------------- LOCAL NODES ----------------
+
+def run_local(root, nodes, stale_s, max_attempts, memory_budget_mb):
+    """Run `nodes` worker processes on this machine, standing in for nodes."""
+    cmd = [sys.executable, os.path.abspath(__file__), "work", root,
+           "--stale", str(stale_s), "--max-attempts", str(max_attempts)]
+    if memory_budget_mb is not None:
+        cmd += ["--memory-budget-mb", str(memory_budget_mb)]
+    procs = [subprocess.Popen(cmd + ["--worker-id", f"local{k}"]) for k in range(nodes)]
+    return [p.wait() for p in procs]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch scoring over a shared spool directory")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    e = sub.add_parser("enqueue", help="queue the logs under paths")
+    e.add_argument("root")
+    e.add_argument("paths", nargs="+")
+
+    for name, help_ in (("work", "process jobs until the queue is drained"),
+                        ("local", "run several local worker processes")):
+        w = sub.add_parser(name, help=help_)
+        w.add_argument("root")
+        w.add_argument("--stale", type=float, default=600.0,
+                       help="seconds without heartbeat before a claim is requeued")
+        w.add_argument("--max-attempts", type=int, default=3)
+        w.add_argument("--memory-budget-mb", type=float, default=MEMORY_BUDGET_MB)
+        if name == "work":
+            w.add_argument("--worker-id", default=None, help="default: host-pid")
+            w.add_argument("--follow", action="store_true",
+                           help="keep waiting for new jobs instead of exiting")
+            w.add_argument("--poll", type=float, default=5.0)
+        else:
+            w.add_argument("--nodes", type=int, default=2)
+
+    s = sub.add_parser("status", help="job counts per state")
+    s.add_argument("root")
+
+    m = sub.add_parser("merge", help="load the shards into a results store")
+    m.add_argument("root")
+    m.add_argument("--db", default=None, help="results store (default: FLIGHT_RESULTS_DB)")
+    m.add_argument("--fleet", default=None, help="also write the batch's fleet sketches here")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if args.cmd == "enqueue":
+        print(json.dumps({"added": enqueue(args.root, args.paths)}))
+    elif args.cmd == "work":
+        worker = Worker(args.root, args.worker_id, args.stale, args.max_attempts,
+                        args.memory_budget_mb)
+        worker.run(follow=args.follow, poll_s=args.poll)
+    elif args.cmd == "local":
+        codes = run_local(args.root, args.nodes, args.stale, args.max_attempts,
+                          args.memory_budget_mb)
+        print(json.dumps({"exit_codes": codes, **status(args.root)}))
+    elif args.cmd == "status":
+        print(json.dumps(status(args.root), indent=2))
+    else:
+        print(json.dumps({"records": merge(args.root, args.db, args.fleet)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Cold-start benchmark for the Streamlit pages.
+
+    python startup_bench.py --repeat 5
+    python startup_bench.py --repeat 5 --out startup.json
+
+Each page is rendered by streamlit.testing's AppTest in a fresh
+interpreter, the way an autoscaled container or a new worker process
+first serves it.  Reported per page (median over --repeat runs):
+
+    first_render_s   page import and first script run, streamlit excluded
+    rerun_s          a second run of the same session (page switches)
+    streamlit_s      importing streamlit itself, for reference
+    heavy_loaded     heavy modules the first render pulled in (beyond
+                     what streamlit and AppTest import themselves)
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+PAGES = {
+    "home": os.path.join(ROOT, "Home.py"),
+    "filescore": os.path.join(ROOT, "pages", "1_FileScore.py"),
+    "degrade": os.path.join(ROOT, "pages", "FlightDegrade.py"),
+}
+
+HEAVY_MODULES = ("numpy", "pandas", "pymavlink.mavutil", "plotly.graph_objects")
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+loaded = set(sys.modules)
+t1 = time.perf_counter()
+at = AppTest.from_file({page!r}, default_timeout=120)
+at.run()
+t2 = time.perf_counter()
+at.run()
+t3 = time.perf_counter()
+if len(at.exception):
+    raise SystemExit(at.exception[0].value)
+print(json.dumps({{"streamlit_s": t1 - t0, "first_render_s": t2 - t1, "rerun_s": t3 - t2,
+                  "heavy_loaded": [m for m in {heavy!r} if m in sys.modules and m not in loaded]}}))
+"""
+
+
+def measure(page):
+    """One cold render of a page in a new interpreter."""
+    code = _CHILD.format(page=PAGES[page], heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                         text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(pages=tuple(PAGES), repeat=5):
+    report = {}
+    for page in pages:
+        runs = [measure(page) for _ in range(repeat)]
+        report[page] = {
+            **{k: float(np.median([r[k] for r in runs]))
+               for k in ("first_render_s", "rerun_s", "streamlit_s")},
+            "heavy_loaded": runs[-1]["heavy_loaded"],
+        }
+    return report
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--pages", nargs="+", choices=list(PAGES), default=list(PAGES))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", help="write the report JSON here")
+    args = ap.parse_args(argv)
+
+    report = run(args.pages, args.repeat)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Synthetic ArduPilot DataFlash logs for tests, load tests and local experiments.
+
+The logs carry the message types the analysis modules read (CTUN, ATT,
+VIBE, BAT, POWR, IMU, RCOU, MOTB, MCU, PARM, ARM, EV) at 50 Hz / 10 Hz
+rates, with a steady battery discharge and a short Vcc dip mid-flight.
+tlog_bytes() writes the same flight as MAVLink v2 telemetry (.tlog).
+"""
+
+import struct
+
+import numpy as np
+
+HEAD = b"\xa3\x95"
+
+# name: (type id, format, columns)
+FORMATS = {
+    "CTUN": (129, "Qfff", "TimeUS,ThI,ThO,ThH"),
+    "ATT": (130, "Qff", "TimeUS,Roll,Pitch"),
+    "VIBE": (131, "Qfff", "TimeUS,VibeX,VibeY,VibeZ"),
+    "BAT": (132, "Qff", "TimeUS,Volt,Curr"),
+    "POWR": (133, "Qf", "TimeUS,Vcc"),
+    "IMU": (134, "Qfff", "TimeUS,GyrX,GyrY,GyrZ"),
+    "RCOU": (135, "QHHHH", "TimeUS,C1,C2,C3,C4"),
+    "MOTB": (136, "Qff", "TimeUS,ThrOut,ThLimit"),
+    "MCU": (137, "Qf", "TimeUS,MTemp"),
+    "PARM": (138, "QNf", "TimeUS,Name,Value"),
+    "ARM": (139, "QB", "TimeUS,ArmState"),
+    "EV": (140, "QB", "TimeUS,Id"),
+}
+
+_STRUCT = {"Q": "Q", "f": "f", "H": "H", "B": "B", "N": "16s"}
+
+
+def _struct(fmt):
+    return struct.Struct("<" + "".join(_STRUCT[c] for c in fmt))
+
+
+def _fmt_record(msg_type, name, fmt, columns):
+    length = 3 + _struct(fmt).size
+    return HEAD + bytes([128]) + struct.pack(
+        "<BB4s16s64s", msg_type, length, name.encode(), fmt.encode(), columns.encode())
+
+
+def log_bytes(n_samples=2000, seed=0, cells=6, dip=True, arm_at=50):
+    """
+    A complete log as bytes; n_samples fast-rate (50 Hz) steps.
+    The vehicle arms (ARM and EV records) at sample arm_at; None: never.
+    """
+    rng = np.random.default_rng(seed)
+    packers = {name: (bytes([t]), _struct(f)) for name, (t, f, _) in FORMATS.items()}
+
+    def rec(name, *vals):
+        tid, st = packers[name]
+        return HEAD + tid + st.pack(*vals)
+
+    out = [HEAD + bytes([128]) + struct.pack(
+        "<BB4s16s64s", 128, 89, b"FMT", b"BBnNZ", b"Type,Length,Name,Format,Columns")]
+    out += [_fmt_record(t, name, f, c) for name, (t, f, c) in FORMATS.items()]
+    out.append(rec("PARM", 0, b"BATT_LOW_VOLT", cells * 3.5))
+    out.append(rec("PARM", 0, b"MOT_BAT_VOLT_MAX", cells * 4.2))
+
+    thr = 0.4 + 0.05 * rng.standard_normal(n_samples)
+    roll = rng.standard_normal(n_samples)
+    pitch = rng.standard_normal(n_samples)
+    gyro = 0.1 * rng.standard_normal((n_samples, 3))
+    pwm = (1500 + 50 * rng.standard_normal((n_samples, 4))).astype(int)
+    vibe = np.abs(5 * rng.standard_normal((n_samples, 3)))
+    v_full = cells * 4.15
+
+    for i in range(n_samples):
+        t = 1_000_000 + i * 20_000
+        if i == arm_at:
+            out.append(rec("ARM", t, 1))
+            out.append(rec("EV", t, 10))
+        out.append(rec("CTUN", t, thr[i], thr[i], 0.38))
+        out.append(rec("ATT", t, roll[i], pitch[i]))
+        out.append(rec("IMU", t, *gyro[i]))
+        out.append(rec("RCOU", t, *pwm[i]))
+        if i % 5 == 0:
+            volt = v_full - 0.5 * cells * i / n_samples - 0.5 * thr[i]
+            vcc = 4.6 if dip and n_samples // 2 < i < n_samples // 2 + 50 else 5.1
+            out.append(rec("VIBE", t, *vibe[i]))
+            out.append(rec("BAT", t, volt, 20 + 10 * thr[i]))
+            out.append(rec("POWR", t, vcc))
+            out.append(rec("MOTB", t, thr[i], 0.7))
+            out.append(rec("MCU", t, 45.0))
+
+    return b"".join(out)
+
+
+def write_log(path, n_samples=2000, seed=0, **kw):
+    with open(path, "wb") as fh:
+        fh.write((tlog_bytes if path.endswith(".tlog") else log_bytes)(n_samples, seed, **kw))
+    return path
+
+
+# ---------------- TELEMETRY ----------------
+
+# MAVLink CRC_EXTRA seeds of the messages written
+CRC_EXTRA = {"HEARTBEAT": 50, "SYS_STATUS": 124, "PARAM_VALUE": 220, "RAW_IMU": 144,
+             "ATTITUDE": 39, "SERVO_OUTPUT_RAW": 222, "VFR_HUD": 20,
+             "POWER_STATUS": 203, "VIBRATION": 90}
+
+
+def _x25(data, crc=0xFFFF):
+    for b in data:
+        tmp = b ^ (crc & 0xFF)
+        tmp = (tmp ^ (tmp << 4)) & 0xFF
+        crc = ((crc >> 8) ^ (tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF
+    return crc
+
+
+def tlog_bytes(n_samples=2000, seed=0, cells=6, dip=True, arm_at=50, start_us=1_700_000_000_000_000):
+    """
+    The flight of log_bytes() as a ground-station .tlog: MAVLink v2
+    packets (trailing zero bytes trimmed, as senders do) behind 8-byte
+    receive times, with ground-station heartbeats mixed in.
+    """
+    from tlog import MAVLINK_MESSAGES
+
+    rng = np.random.default_rng(seed)
+    seq = [0]
+
+    def rec(t, mav, sysid=1, compid=1, **fields):
+        msg_id, dtype = MAVLINK_MESSAGES[mav]
+        body = np.zeros(1, dtype)
+        for k, v in fields.items():
+            body[k] = v
+        payload = body.tobytes().rstrip(b"\0") or b"\0"
+        head = struct.pack("<BBBBBB", len(payload), 0, 0, seq[0] & 0xFF, sysid, compid)
+        head += struct.pack("<I", msg_id)[:3]
+        crc = _x25(bytes([CRC_EXTRA[mav]]), _x25(head + payload))
+        seq[0] += 1
+        return struct.pack(">Q", start_us + t) + b"\xfd" + head + payload + struct.pack("<H", crc)
+
+    thr = 0.4 + 0.05 * rng.standard_normal(n_samples)
+    roll = rng.standard_normal(n_samples)
+    pitch = rng.standard_normal(n_samples)
+    gyro = 0.1 * rng.standard_normal((n_samples, 3))
+    pwm = (1500 + 50 * rng.standard_normal((n_samples, 4))).astype(int)
+    vibe = np.abs(5 * rng.standard_normal((n_samples, 3)))
+    v_full = cells * 4.15
+    deg = np.pi / 180
+
+    out = [rec(0, "PARAM_VALUE", param_id=b"BATT_LOW_VOLT", param_value=cells * 3.5),
+           rec(0, "PARAM_VALUE", param_id=b"MOT_BAT_VOLT_MAX", param_value=cells * 4.2)]
+    for i in range(n_samples):
+        t = 1_000_000 + i * 20_000
+        if i % 50 == 0 or i == arm_at:
+            armed = arm_at is not None and i >= arm_at
+            out.append(rec(t, "HEARTBEAT", type=2, autopilot=3, mavlink_version=3,
+                           base_mode=0x59 | (128 if armed else 0)))
+            out.append(rec(t, "HEARTBEAT", sysid=255, compid=190, type=6, autopilot=8))
+        out.append(rec(t, "VFR_HUD", throttle=round(100 * thr[i])))
+        out.append(rec(t, "ATTITUDE", time_boot_ms=t // 1000,
+                       roll=roll[i] * deg, pitch=pitch[i] * deg))
+        out.append(rec(t, "RAW_IMU", time_usec=t, **dict(zip(
+            ("xgyro", "ygyro", "zgyro"), np.round(1000 * gyro[i]).astype(int)))))
+        out.append(rec(t, "SERVO_OUTPUT_RAW", time_usec=t,
+                       **{f"servo{k + 1}_raw": pwm[i, k] for k in range(4)}))
+        if i % 5 == 0:
+            volt = v_full - 0.5 * cells * i / n_samples - 0.5 * thr[i]
+            vcc = 4.6 if dip and n_samples // 2 < i < n_samples // 2 + 50 else 5.1
+            out.append(rec(t, "VIBRATION", time_usec=t, vibration_x=vibe[i, 0],
+                           vibration_y=vibe[i, 1], vibration_z=vibe[i, 2]))
+            out.append(rec(t, "SYS_STATUS", voltage_battery=round(1000 * volt),
+                           current_battery=round(100 * (20 + 10 * thr[i]))))
+            out.append(rec(t, "POWER_STATUS", Vcc=round(1000 * vcc)))
+
+    return b"".join(out)
@@ -0,0 +1,98 @@
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+import analysis_service
+import log_ingest
+from compute_flightscore import compute_flight_score
+from synthetic_log import write_log
+
+
+def test_result_cache_evicts_least_recently_used_by_bytes():
+    cache = analysis_service.ResultCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == b"1234"
+    cache.put("huge", b"x" * 11)
+    assert cache.get("huge") is None
+    assert cache.stats() == {"entries": 2, "bytes": 8, "max_bytes": 10}
+
+
+def test_client_falls_back_to_in_process(tmp_path):
+    path = write_log(str(tmp_path / "a.bin"), 500)
+    score = analysis_service.analyze("score", path, url="http://127.0.0.1:9")
+    assert score == pytest.approx(compute_flight_score(path))
+
+
+def test_service_caches_by_content(tmp_path):
+    a = write_log(str(tmp_path / "a.bin"), 500)
+    b = write_log(str(tmp_path / "b.bin"), 500)
+    service = analysis_service.AnalysisService(workers=1, cache_bytes=1 << 20)
+    try:
+        first = service.analyze("score", a)
+        assert json.loads(first) == pytest.approx(compute_flight_score(a))
+        assert service.analyze("score", b) is first
+        assert service.cache.stats()["entries"] == 1
+    finally:
+        service.shutdown()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_ingest, "SPOOL_DIR", str(tmp_path / "spool"))
+    httpd, service = analysis_service.make_server(port=0, workers=1)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield "http://%s:%d" % httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+    service.shutdown()
+
+
+def test_upload_streams_a_log_to_the_daemon(server, tmp_path):
+    path = write_log(str(tmp_path / "a.bin"), 500)
+    out = analysis_service.upload_analyze("score", path, url=server, chunk_bytes=4096)
+    assert out["digest"] == analysis_service.file_digest(path)
+    [entry] = out["logs"]
+    assert entry["result"] == pytest.approx(compute_flight_score(path))
+
+
+def test_batch_reports_errors_in_place(server, tmp_path):
+    good = write_log(str(tmp_path / "a.bin"), 500)
+    out = analysis_service.analyze_batch("score", [good, str(tmp_path / "missing.bin")],
+                                         url=server)
+    ok, bad = out["results"]
+    assert ok["result"] == pytest.approx(compute_flight_score(good))
+    assert "error" in bad and bad["path"].endswith("missing.bin")
+
+
+def test_dataset_cache_drops_least_recent_logs_over_budget(tmp_path):
+    a = write_log(str(tmp_path / "a.bin"), 500)
+    b = write_log(str(tmp_path / "b.bin"), 500)
+    cache = analysis_service.DatasetCache(0)
+    cache.get("a", a).columns
+    one = cache.get("a", a).nbytes
+    cache.max_bytes = int(1.5 * one)
+    cache.get("b", b).columns
+    cache.trim()
+    assert not cache.decoded("a") and cache.decoded("b")
+
+
+def test_dead_worker_is_replaced(tmp_path):
+    path = write_log(str(tmp_path / "a.bin"), 500)
+    service = analysis_service.AnalysisService(workers=1, cache_bytes=0)
+    try:
+        service.analyze("score", path)
+        [pid] = list(service.pools[0]._processes)
+        os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+        body = service.analyze("score", path)
+        assert json.loads(body) == pytest.approx(compute_flight_score(path))
+    finally:
+        service.shutdown()
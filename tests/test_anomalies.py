@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import anomalies
+from compute_logic1 import analyze_log
+from synthetic_log import write_log
+
+
+def _naive(x, w, fn):
+    return np.array([fn(x[max(0, i - w + 1):i + 1]) for i in range(len(x))])
+
+
+@pytest.mark.parametrize("w", [1, 3, 7, 50, 200])
+def test_rolling_stats_match_naive_windows(w):
+    x = np.random.default_rng(0).standard_normal(120) + 3.0
+    np.testing.assert_allclose(anomalies.rolling_mean(x, w), _naive(x, w, np.mean))
+    np.testing.assert_allclose(anomalies.rolling_rms(x, w),
+                               _naive(x, w, lambda v: np.sqrt(np.mean(v * v))))
+    np.testing.assert_allclose(anomalies.rolling_std(x, w), _naive(x, w, np.std), atol=1e-6)
+    np.testing.assert_array_equal(anomalies.rolling_min(x, w), _naive(x, w, np.min))
+
+
+def test_vcc_dip_is_found_and_timed(tmp_path):
+    # the synthetic log holds Vcc at 4.6 V for one second mid-flight
+    _, series = analyze_log(write_log(str(tmp_path / "f.bin"), 2000))
+    dips = [e for e in anomalies.detect_events(series) if e["type"] == "vcc_dip"]
+    assert len(dips) == 1
+    assert dips[0]["subsystem"] == "fc"
+    assert dips[0]["value"] == pytest.approx(4.6)
+    assert 19.0 < dips[0]["start"] < dips[0]["end"] < 22.0
+    assert dips[0]["end"] - dips[0]["start"] == pytest.approx(0.9, abs=0.15)
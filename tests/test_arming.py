@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from compute_logic1 import analyze_log, first_arm_us
+from online_stats import minmax_decimate
+from synthetic_log import write_log
+
+
+def test_first_arm_takes_the_earliest_of_arm_and_ev():
+    arm = {"TimeUS": np.array([5, 9]), "ArmState": np.array([0, 1])}
+    ev = {"TimeUS": np.array([3, 7]), "Id": np.array([11, 10])}
+    assert first_arm_us(arm, ev) == 7
+    assert first_arm_us(arm, {}) == 9
+    assert first_arm_us({}, {}) is None
+
+
+@pytest.mark.parametrize("budget", [None, 0.001])
+def test_arm_time_is_seconds_from_log_start(tmp_path, budget):
+    armed = write_log(str(tmp_path / "a.bin"), 1000, arm_at=150)
+    never = write_log(str(tmp_path / "n.bin"), 1000, arm_at=None)
+    assert analyze_log(armed, memory_budget_mb=budget)[1]["arm_time"] == pytest.approx(3.0)
+    assert analyze_log(never, memory_budget_mb=budget)[1]["arm_time"] is None
+
+
+def test_minmax_decimate_keeps_extremes_in_time_order():
+    t = np.arange(10000.0)
+    x = np.sin(t / 100)
+    x[4321] = -5.0
+    td, xd = minmax_decimate(t, x, 200)
+    assert len(xd) <= 200
+    assert np.all(np.diff(td) > 0)
+    assert xd.min() == -5.0 and xd.max() == x.max()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import battery_model
+
+
+def _flight(n=600, v0=25.0, slope=-0.002, r_int=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) * 0.5
+    curr = 20 + 10 * rng.random(n)
+    volt = v0 + slope * t - r_int * curr + 0.005 * rng.standard_normal(n)
+    return t, volt, curr
+
+
+def test_fit_recovers_the_discharge_model_despite_spikes():
+    t, volt, curr = _flight()
+    volt[::50] -= 3.0                    # sensor glitches
+    fit = battery_model.fit_flight(t, volt, curr, params={"MOT_BAT_VOLT_MAX": 25.2})
+    assert fit["slope"] == pytest.approx(-0.002, rel=0.05)
+    assert fit["r_int"] == pytest.approx(0.02, rel=0.1)
+    assert fit["cells"] == 6 and fit["cell_source"] == "MOT_BAT_VOLT_MAX"
+    assert fit["cutoff"] == pytest.approx(6 * battery_model.CELL_CUTOFF_V)
+    assert fit["endurance_s"] > fit["duration"] and fit["remaining_s"] > 0
+
+
+def test_batch_fit_matches_single_flights():
+    flights = [_flight(n, seed=s) for s, n in enumerate([50, 400, 900])]
+    batch = battery_model.fit_discharge_batch(flights)
+    for k, f in enumerate(flights):
+        one = battery_model.fit_discharge_batch([f])
+        for name in ("v0", "slope", "r_int", "resid_std", "duration"):
+            assert batch[name][k] == pytest.approx(one[name][0], rel=1e-6)
+
+
+def test_flight_without_current_drops_the_sag_term():
+    t, volt, _ = _flight(r_int=0.0)
+    fit = battery_model.fit_flight(t, volt)
+    assert np.isnan(fit["r_int"]) and fit["sag_v"] is None
+    assert fit["slope"] == pytest.approx(-0.002, rel=0.05)
+    assert fit["cell_source"] == "voltage" and fit["cells"] == 6
+
+
+
+def test_default_low_voltage_does_not_turn_a_6s_pack_into_3s():
+    t, volt, curr = _flight()
+    fit = battery_model.fit_flight(t, volt, curr, params={"BATT_LOW_VOLT": 10.5})
+    assert fit["cells"] == 6 and fit["cell_source"] == "voltage"
+    assert fit["cutoff"] == pytest.approx(6 * battery_model.CELL_CUTOFF_V)
+    assert battery_model.cell_count({"BATT_LOW_VOLT": 10.5}, [12.4]) == (3, "BATT_LOW_VOLT")
+
+def test_fleet_fit_carries_identifying_keys():
+    recs = [{"key": f"k{s}", "t": t, "volt": v, "curr": c,
+             "params": {"BATT_LOW_VOLT": 21.0}}
+            for s, (t, v, c) in enumerate(_flight(seed=s) for s in range(3))]
+    frame = battery_model.fit_fleet(recs)
+    assert list(frame["key"]) == ["k0", "k1", "k2"]
+    assert list(frame["cutoff"]) == [21.0] * 3
+    assert frame["endurance_s"].notna().all()
+
+
+def test_nan_samples_are_dropped_not_spread_over_the_flight():
+    t, volt, curr = _flight()
+    volt[10] = np.nan
+    fit = battery_model.fit_discharge_batch([(t, volt, curr), _flight(seed=1)])
+    assert fit["n"][0] == len(t) - 1
+    assert fit["slope"][0] == pytest.approx(-0.002, rel=0.05)
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import dataflash
+from compute_flightscore import compute_flight_metrics
+from compute_logic1 import analyze_log
+from synthetic_log import log_bytes
+
+WANTED = {"ATT": ["TimeUS", "Roll", "Pitch"], "BAT": ["TimeUS", "Volt", "Curr"]}
+
+
+def _decode(data, block=None):
+    dec = dataflash.StreamDecoder(WANTED)
+    block = block or len(data)
+    for s in range(0, len(data), block):
+        dec.feed(data[s:s + block])
+    return dec.finish(), dec.health()
+
+
+def test_clean_log_is_complete():
+    data = log_bytes(500)
+    cols, health = _decode(data)
+    assert health.clean and health.completeness == 1.0
+    assert dataflash.scan_log(data) == health
+    assert len(cols["ATT"]["Roll"]) == 500
+    assert len(cols["BAT"]["Volt"]) == 100
+
+
+def test_block_boundaries_do_not_change_the_decode():
+    data = log_bytes(300)
+    whole, _ = _decode(data)
+    pieces, health = _decode(data, block=997)
+    assert health.clean
+    for name, cols in whole.items():
+        for c, v in cols.items():
+            np.testing.assert_array_equal(pieces[name][c], v)
+
+
+
+def test_region_decode_matches_the_stream_decode():
+    data = log_bytes(300)
+    whole, _ = _decode(data)
+    formats = dataflash.read_head_formats(data, WANTED)
+    region = dataflash.decode_region(data, 0, len(data), formats, WANTED)
+    for name, cols in whole.items():
+        for c, v in cols.items():
+            np.testing.assert_array_equal(region[name][c], v)
+
+
+def test_late_format_falls_back_to_the_whole_log():
+    data = log_bytes(300)
+    assert dataflash.read_head_formats(data, WANTED, head_bytes=64) == dataflash.read_formats(data)
+
+def test_damaged_region_is_skipped_and_reported():
+    clean = log_bytes(500)
+    mid = len(clean) // 2
+    junk = bytes(np.random.default_rng(1).integers(0, 256, 4000, dtype=np.uint8))
+    data = clean[:mid] + junk + clean[mid + 4000:]
+
+    cols, health = _decode(data, block=1 << 12)
+    assert not health.clean
+    assert len(health.damaged) >= 1
+    assert 4000 <= health.skipped_bytes < 4000 + 200     # junk plus the messages it cut
+    assert health.completeness < 1.0 and not health.truncated
+    assert dataflash.scan_log(data) == health
+
+    # nothing made up from the junk: only intact messages, in time order
+    roll_t = cols["ATT"]["TimeUS"]
+    assert 0 < len(roll_t) < 500
+    assert np.all(np.diff(roll_t) > 0)
+
+
+def test_truncated_log_is_reported():
+    data = log_bytes(200)[:-5]
+    _, health = _decode(data)
+    assert health.truncated
+    assert health.damaged[-1][1] == len(data)
+    assert dataflash.scan_log(data).truncated
+
+
+def _damaged(n=2000):
+    clean = log_bytes(n)
+    mid = len(clean) // 2
+    junk = bytes(np.random.default_rng(1).integers(0, 256, 4000, dtype=np.uint8))
+    return clean, clean[:mid] + junk + clean[mid + 4000:]
+
+
+@pytest.mark.parametrize("budget", [None, 0.001])
+def test_score_paths_report_completeness(tmp_path, budget):
+    clean, damaged = _damaged()
+    good, bad = tmp_path / "good.bin", tmp_path / "bad.bin"
+    good.write_bytes(clean)
+    bad.write_bytes(damaged)
+
+    ok = compute_flight_metrics(str(good), memory_budget_mb=budget)
+    assert ok["data_complete"] and ok["completeness"] == 1.0
+
+    hurt = compute_flight_metrics(str(bad), memory_budget_mb=budget)
+    assert not hurt["data_complete"]
+    assert hurt["completeness"] < 1.0 and hurt["skipped_bytes"] >= 4000
+    assert len(hurt["damaged_regions"]) >= 1
+    assert 0 < hurt["flight_score"] <= 100
+
+    metrics, _ = analyze_log(str(bad), memory_budget_mb=budget)
+    assert metrics["completeness"] == hurt["completeness"]
+    assert not metrics["data_complete"]
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from fleet_norm import FleetSketches, feature_values
+from online_stats import QuantileSketch
+
+
+def test_sketch_quantiles_are_within_the_relative_accuracy():
+    x = np.random.default_rng(0).lognormal(size=20000) - 0.5
+    sk = QuantileSketch(0.01).update(x)
+    for q in (0.05, 0.5, 0.95):
+        assert sk.quantile(q) == pytest.approx(np.quantile(x, q), rel=0.02, abs=1e-3)
+    assert sk.rank(np.median(x)) == pytest.approx(0.5, abs=0.01)
+
+    halves = QuantileSketch(0.01).update(x[:7000]).merge(QuantileSketch(0.01).update(x[7000:]))
+    assert halves.to_dict() == sk.to_dict()
+
+
+def _metrics(rng):
+    return {"roll_var": rng.random(), "pitch_var": rng.random(),
+            "hover_throttle": 0.3 + 0.2 * rng.random(), "rms_vibe": 5 * rng.random(),
+            "vcc_std": 0.1 * rng.random(), "volt_drop": rng.random(),
+            "endurance_est": 600 + 600 * rng.random(), "endurance_unit": "s", "cells": 6}
+
+
+def test_fleet_percentiles_place_a_flight_in_its_class():
+    rng = np.random.default_rng(0)
+    flights = [_metrics(rng) for _ in range(200)]
+    a, b = FleetSketches(), FleetSketches()
+    for i, m in enumerate(flights):
+        (a if i % 2 else b).add(m)
+    fleet = FleetSketches.from_dict(a.merge(b).to_dict())
+    assert fleet.count("6S") == 200 and fleet.count("4S") == 0
+
+    best = {**flights[0], "vcc_std": 0.0001, "endurance_est": 5000.0}
+    pct = fleet.fleet_scores(best)
+    assert pct["electrical"] > 99 and pct["endurance"] > 99
+    assert 0 <= pct["fleet_score"] <= 100
+    assert fleet.percentiles(best, airframe="4S")["electrical"] is None
+
+
+def test_stability_feature_is_the_attitude_spread():
+    # the same sqrt(roll_var + pitch_var) the stability score uses
+    assert feature_values({"roll_var": 3.0, "pitch_var": 1.0})["stability"] == pytest.approx(2.0)
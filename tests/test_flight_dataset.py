@@ -0,0 +1,39 @@
+import pytest
+
+import log_ingest
+from compute_flightscore import compute_flight_metrics, compute_flight_score
+from compute_logic1 import analyze_log
+from flight_dataset import SESSION_DATASETS, FlightDataset, session_dataset
+from synthetic_log import write_log
+
+
+def test_one_decode_serves_both_analyses(tmp_path, monkeypatch):
+    path = write_log(str(tmp_path / "f.bin"), 800)
+    expected_score = compute_flight_score(path)
+    expected_degrade, _ = analyze_log(path)
+
+    decodes = []
+    real = log_ingest.decode_log
+
+    def counting(*args, **kw):
+        decodes.append(args)
+        return real(*args, **kw)
+    monkeypatch.setattr(log_ingest, "decode_log", counting)
+
+    ds = FlightDataset(path)
+    assert not ds.decoded and ds.nbytes == 0
+    assert compute_flight_score(ds) == pytest.approx(expected_score)
+    assert compute_flight_metrics(ds)["flight_score"] == pytest.approx(expected_score)
+    metrics, _ = analyze_log(ds)
+    assert metrics["vcc_min"] == pytest.approx(expected_degrade["vcc_min"])
+    assert len(decodes) == 1 and ds.decoded and ds.nbytes > 0
+
+
+def test_session_keeps_the_most_recent_datasets():
+    state = {}
+    first = session_dataset(state, "k0", "a.bin")
+    assert session_dataset(state, "k0", "a.bin") is first
+    for i in range(1, SESSION_DATASETS + 1):
+        session_dataset(state, f"k{i}", f"{i}.bin")
+    assert "k0" not in state["flight_datasets"]
+    assert len(state["flight_datasets"]) == SESSION_DATASETS
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import sys
+import analysis_service, compute_flightscore, compute_logic1, dataflash, log_ingest, ranking
+heavy = ("pandas", "pymavlink.mavutil", "plotly")
+print(",".join(m for m in heavy if m in sys.modules))
+"""
+
+
+def test_analysis_modules_do_not_import_heavy_dependencies():
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, check=True,
+                         capture_output=True, text=True)
+    assert out.stdout.strip() == ""
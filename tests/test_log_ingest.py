@@ -0,0 +1,79 @@
+import gzip
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+import log_ingest
+from analysis_service import run_analysis
+from compute_flightscore import compute_flight_score
+from synthetic_log import log_bytes, write_log
+
+
+def _assert_same_columns(a, b):
+    assert a.keys() == b.keys()
+    for name, cols in a.items():
+        for c, v in cols.items():
+            np.testing.assert_array_equal(b[name][c], v)
+
+
+def test_compressed_logs_decode_like_the_plain_file(tmp_path):
+    plain = write_log(str(tmp_path / "f.bin"), 500)
+    data = log_bytes(500)
+    with gzip.open(tmp_path / "f.bin.gz", "wb") as fh:
+        fh.write(data)
+    with zipfile.ZipFile(tmp_path / "logs.zip", "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("b.bin", log_bytes(300, seed=1))
+        zf.writestr("a.bin", data)
+        zf.writestr("notes.txt", "not a log")
+
+    expected = log_ingest.decode_log(plain)
+    _assert_same_columns(expected, log_ingest.decode_log(str(tmp_path / "f.bin.gz")))
+
+    refs = log_ingest.list_logs(str(tmp_path / "logs.zip"))
+    assert [log_ingest.log_name(r) for r in refs] == ["a.bin", "b.bin"]
+    assert all(log_ingest.is_compressed(r) for r in refs)
+    _assert_same_columns(expected, log_ingest.decode_log(refs[0]))
+
+    assert run_analysis("score", str(tmp_path / "f.bin.gz")) == pytest.approx(
+        compute_flight_score(plain))
+
+
+def test_split_ref():
+    assert log_ingest.split_ref("a/logs.zip::x/f.bin") == ("a/logs.zip", "x/f.bin")
+    assert log_ingest.split_ref("f.bin") == ("f.bin", None)
+    assert not log_ingest.is_compressed("f.bin")
+
+
+def test_time_range_read_through_the_index_matches_a_trimmed_decode(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_ingest, "INDEX_DIR", str(tmp_path / "index"))
+    data = log_bytes(2000)
+    plain = str(tmp_path / "f.bin")
+    with open(plain, "wb") as fh:
+        fh.write(data)
+    with gzip.open(tmp_path / "f.bin.gz", "wb") as fh:
+        fh.write(data)
+
+    wanted = {"ATT": ["TimeUS", "Roll"], "BAT": ["Volt"]}
+    t0, t1 = 11_000_000, 23_500_000
+    ranged = log_ingest.decode_log(plain, wanted, time_range=(t0, t1))
+    # saved under the content digest, not next to the log
+    assert os.path.exists(log_ingest.index_path(log_ingest.file_sha256(plain)))
+    assert sorted(os.listdir(tmp_path)) == ["f.bin", "f.bin.gz", "index"]
+    copy = str(tmp_path / "copy.bin")
+    with open(copy, "wb") as fh:
+        fh.write(data)
+    log_ingest.load_index(copy)
+    assert len(os.listdir(tmp_path / "index")) == 1
+    t = ranged["ATT"]["TimeUS"]
+    assert t.min() >= t0 and t.max() <= t1 and len(t) == 626
+    _assert_same_columns(
+        log_ingest.decode_log(str(tmp_path / "f.bin.gz"), wanted, time_range=(t0, t1)),
+        ranged)
+
+    # the sidecar is reused, and rebuilt once the log changes
+    assert log_ingest.load_index(plain) is log_ingest.load_index(plain)
+    with open(plain, "ab") as fh:
+        fh.write(b"\0")
+    _assert_same_columns(ranged, log_ingest.decode_log(plain, wanted, time_range=(t0, t1)))
@@ -0,0 +1,37 @@
+import pytest
+
+from compute_flightscore import (
+    SCORE_WEIGHTS, compute_flight_score, compute_flight_score_preview,
+)
+from synthetic_log import write_log
+
+
+def test_small_log_is_scored_exactly(tmp_path):
+    path = write_log(str(tmp_path / "small.bin"), 500)
+    pv = compute_flight_score_preview(path)
+    assert pv["exact"] and pv["coverage"] == 1.0
+    assert pv["score"] == pytest.approx(compute_flight_score(path))
+    assert pv["ci_low"] == pv["ci_high"] == pv["score"]
+
+
+def test_large_log_is_sampled_with_an_interval(tmp_path):
+    path = write_log(str(tmp_path / "big.bin"), 20000)
+    pv = compute_flight_score_preview(path, n_chunks=16, chunk_bytes=16 * 1024)
+    assert not pv["exact"] and 0 < pv["coverage"] < 1
+    assert pv["ci_low"] <= pv["score"] <= pv["ci_high"]
+    assert compute_flight_score_preview(path, n_chunks=16, chunk_bytes=16 * 1024) == pv
+
+
+def test_resampled_chunks_stay_in_file_order(tmp_path):
+    # shuffled chunks swing the first/last voltage terms by several points
+    path = write_log(str(tmp_path / "big.bin"), 20000)
+    pv = compute_flight_score_preview(path)
+    assert pv["unbounded"] == ["electrical"]
+    assert pv["ci_high"] - pv["ci_low"] < 2.0 + 100 * SCORE_WEIGHTS["electrical"]
+
+
+def test_interval_covers_a_missed_vcc_dip(tmp_path):
+    # the 50-sample dip falls between the sampled chunks
+    path = write_log(str(tmp_path / "big.bin"), 60000)
+    pv = compute_flight_score_preview(path)
+    assert pv["ci_low"] <= compute_flight_score(path) <= pv["ci_high"]
@@ -0,0 +1,51 @@
+from ranking import Ranking, weakest_subsystem
+
+
+def _row(key, score, **kw):
+    return {"key": key, "name": key, "score": score, **kw}
+
+
+def test_rows_come_out_best_first_with_ties_by_key():
+    r = Ranking([_row("b", 50), _row("c", 90), _row("a", 50)])
+    assert [x["key"] for x in r.ordered()] == ["c", "a", "b"]
+
+
+def test_add_replaces_and_discard_removes():
+    r = Ranking([_row("a", 40, exact=False), _row("b", 60)])
+    r.add(_row("a", 80, exact=True))
+    assert len(r) == 2
+    assert [x["key"] for x in r.ordered()] == ["a", "b"]
+    assert r.rows["a"]["exact"]
+
+    r.discard("b")
+    r.discard("missing")
+    assert "b" not in r and len(r) == 1
+
+
+def test_page_and_filters():
+    r = Ranking([_row(f"k{i:02d}", float(i), stability=i, control=50) for i in range(30)])
+    frame, n = r.page(1, 10)
+    assert n == 30
+    assert list(frame["rank"]) == list(range(11, 21))
+    assert list(frame.index) == [f"k{i:02d}" for i in range(19, 9, -1)]
+
+    frame, n = r.page(0, 10, score_range=(5, 8))
+    assert n == 4 and list(frame["score"]) == [8, 7, 6, 5]
+
+    # stability below control for scores < 50, so every row matches
+    assert len(r.matching(weakest="stability")) == 30
+    assert r.matching(weakest="control") == []
+    assert weakest_subsystem(_row("x", 1)) is None
+
+
+def test_incomplete_logs_are_flagged_in_the_page():
+    r = Ranking([_row("a", 70, complete=False), _row("b", 60)])
+    frame, _ = r.page()
+    assert list(frame["complete"]) == [False, True]
+
+
+def test_preview_interval_is_shown_until_the_exact_score():
+    r = Ranking([_row("a", 70, ci=[65.0, 74.0], exact=False)])
+    assert list(r.page()[0]["ci"]) == [[65.0, 74.0]]
+    r.add(_row("a", 71, exact=True))
+    assert list(r.page()[0]["ci"]) == [None]
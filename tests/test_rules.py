@@ -0,0 +1,33 @@
+import pandas as pd
+
+from compute_logic1 import SUBSYSTEM_RULES, assess_subsystems, evaluate_rules, overall_bottleneck
+
+HEALTHY = {"th_limit_max": 0.5, "bat_volt_mean": 23.0, "vcc_min": 5.0, "gyro_rms": 0.1,
+           "motor_imbalance": 10.0, "hover_throttle": 0.35, "mcu_temp_mean": 40.0}
+
+
+def test_levels_follow_the_rule_table():
+    subs = assess_subsystems({**HEALTHY, "th_limit_max": 0.85, "vcc_min": 4.5})
+    assert subs["thrust"]["health"] == 0.6
+    assert subs["fc"]["health"] == 0.3
+    assert subs["battery"]["health"] == 1.0
+    assert overall_bottleneck(subs)[0] == "fc"
+
+
+def test_vectorised_rules_match_the_single_flight_path():
+    flights = [HEALTHY, {**HEALTHY, "th_limit_max": 0.97}, {**HEALTHY, "bat_volt_mean": 18.0,
+               "mcu_temp_mean": 90.0}]
+    out = evaluate_rules(pd.DataFrame(flights))
+    for i, m in enumerate(flights):
+        subs = assess_subsystems(m)
+        for rule in SUBSYSTEM_RULES:
+            name = rule["subsystem"]
+            assert out.at[i, f"{name}_health"] == subs[name]["health"]
+        assert out.at[i, "bottleneck"] == overall_bottleneck(subs)[0]
+
+
+def test_airframe_overrides():
+    frame = pd.DataFrame([{**HEALTHY, "hover_throttle": 0.5, "airframe": "heavy"},
+                          {**HEALTHY, "hover_throttle": 0.5, "airframe": "quad"}])
+    out = evaluate_rules(frame, overrides={"heavy": {"efficiency": [0.6]}})
+    assert list(out["efficiency_health"]) == [1.0, 0.4]
@@ -0,0 +1,62 @@
+import os
+import time
+
+import spool_batch
+from synthetic_log import write_log
+
+
+def _queue(tmp_path, n=2):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    for i in range(n):
+        write_log(str(logs / f"f{i}.bin"), n_samples=200, seed=i)
+    root = str(tmp_path / "spool")
+    assert spool_batch.enqueue(root, [str(logs)]) == n
+    assert spool_batch.enqueue(root, [str(logs)]) == 0     # already queued
+    return root
+
+
+def test_a_job_is_claimed_once(tmp_path):
+    root = _queue(tmp_path, n=1)
+    a = spool_batch.Worker(root, "a")
+    b = spool_batch.Worker(root, "b")
+    assert a.claim() is not None
+    assert b.claim() is None
+    assert spool_batch.status(root)["claimed"] == 1
+
+
+def test_stale_claim_is_requeued(tmp_path):
+    root = _queue(tmp_path, n=1)
+    jid, claim = spool_batch.Worker(root, "dead").claim()
+
+    assert spool_batch.reap_stale(root, stale_s=60) == 0   # fresh claim is left alone
+    time.sleep(0.3)
+    assert spool_batch.reap_stale(root, stale_s=0.2) == 1
+    assert not os.path.exists(claim)
+    assert spool_batch.status(root)["jobs"] == 1
+
+    # another worker picks it up and finishes it
+    w = spool_batch.Worker(root, "alive")
+    assert w.run() == 1
+    counts = spool_batch.status(root)
+    assert counts["done"] == 1 and counts["claimed"] == 0
+
+
+def test_heartbeat_keeps_a_claim_alive(tmp_path):
+    root = _queue(tmp_path, n=1)
+    _, claim = spool_batch.Worker(root, "busy").claim()
+    with spool_batch._Heartbeat(claim, 0.05):
+        time.sleep(0.4)
+        assert spool_batch.reap_stale(root, stale_s=0.2) == 0
+
+
+def test_shards_merge_into_the_results_store(tmp_path):
+    root = _queue(tmp_path, n=2)
+    assert spool_batch.Worker(root, "w").run() == 2
+    db = str(tmp_path / "results.sqlite")
+    assert spool_batch.merge(root, db) == 2 * len(spool_batch.BATCH_KINDS)
+
+    from results_store import ResultsStore
+    store = ResultsStore(db)
+    assert len(store.entries("metrics")) == 2
+    store.close()
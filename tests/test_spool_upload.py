@@ -0,0 +1,46 @@
+import gzip
+import hashlib
+import io
+
+import numpy as np
+
+import dataflash
+import log_ingest
+from synthetic_log import log_bytes, tlog_bytes
+
+
+def test_upload_is_spooled_once_under_its_digest(tmp_path):
+    data = log_bytes(500)
+    first = log_ingest.spool_upload(io.BytesIO(data), "a.bin", str(tmp_path), chunk_bytes=4096)
+    assert first.digest == hashlib.sha256(data).hexdigest()
+    assert first.size == len(data)
+    assert open(first.path, "rb").read() == data
+    assert "ATT" in {f.name for f in first.formats.values()}
+
+    again = log_ingest.spool_upload(io.BytesIO(data), "copy of a.bin", str(tmp_path))
+    assert again.path == first.path
+    assert sorted(p.name for p in tmp_path.iterdir()) == [first.digest + ".bin"]
+
+
+def test_decoder_runs_during_a_compressed_upload(tmp_path):
+    data = log_bytes(300)
+    wanted = {"ATT": ["Roll"]}
+    dec = dataflash.StreamDecoder(wanted)
+    spooled = log_ingest.spool_upload(io.BytesIO(gzip.compress(data)), "a.bin.gz",
+                                      str(tmp_path), chunk_bytes=1000, decoder=dec)
+    assert spooled.path.endswith(".gz")
+    np.testing.assert_array_equal(
+        dec.finish()["ATT"]["Roll"],
+        log_ingest.decode_log(spooled.path, wanted)["ATT"]["Roll"])
+
+
+def test_telemetry_upload_is_not_scanned_for_dataflash_formats(tmp_path):
+    data = tlog_bytes(300)
+    wanted = {"ATT": ["Roll"]}
+    dec = log_ingest.log_decoder("a.tlog.gz", wanted)
+    spooled = log_ingest.spool_upload(io.BytesIO(gzip.compress(data)), "a.tlog.gz",
+                                      str(tmp_path), chunk_bytes=1000, decoder=dec)
+    assert spooled.path.endswith(".tlog.gz") and spooled.formats == {}
+    np.testing.assert_array_equal(
+        dec.finish()["ATT"]["Roll"],
+        log_ingest.decode_log(spooled.path, wanted)["ATT"]["Roll"])
@@ -0,0 +1,72 @@
+import numpy as np
+
+import log_ingest
+import tlog
+from compute_flightscore import compute_flight_metrics
+from compute_logic1 import analyze_log
+from synthetic_log import tlog_bytes
+
+
+WANTED = {**log_ingest.default_fields(), "ATT": ["TimeUS", "Roll", "Pitch"]}
+
+
+def _decode(data, block=None):
+    dec = tlog.TlogDecoder(WANTED)
+    block = block or len(data)
+    for s in range(0, len(data), block):
+        dec.feed(data[s:s + block])
+    return dec.finish(), dec.health()
+
+
+def test_frames_every_record():
+    cols, health = _decode(tlog_bytes(400))
+    assert health.clean
+    assert len(cols["ATT"]["Roll"]) == 400
+    assert len(cols["BAT"]["Volt"]) == 80
+    assert len(cols["IMU"]["GyrX"]) == 400
+    # receive times counted from the first record
+    assert cols["ATT"]["TimeUS"][0] == 1_000_000
+
+
+def test_arming_transition_from_vehicle_heartbeats():
+    cols, _ = _decode(tlog_bytes(400, arm_at=120))
+    np.testing.assert_array_equal(cols["ARM"]["ArmState"], [1.0])
+    assert cols["ARM"]["TimeUS"][0] == 1_000_000 + 120 * 20_000
+
+
+def test_block_boundaries_do_not_change_the_decode():
+    data = tlog_bytes(300)
+    whole, _ = _decode(data)
+    pieces, health = _decode(data, block=1000)
+    assert health.clean
+    for name, cols in whole.items():
+        for c, v in cols.items():
+            np.testing.assert_array_equal(pieces[name][c], v)
+
+
+def test_damage_and_truncation_are_skipped():
+    clean = tlog_bytes(400)
+    mid = len(clean) // 2
+    junk = np.random.default_rng(2).integers(0, 256, 3000, dtype=np.uint8)
+    # no packet start bytes: without CRC checks, random bytes can (rarely)
+    # frame as a record that happens to end at the next real one
+    junk = bytes(np.where(junk >= 0xFD, 0, junk).astype(np.uint8))
+    data = clean[:mid] + junk + clean[mid + 3000:-7]
+
+    cols, health = _decode(data, block=4096)
+    assert not health.clean and health.truncated
+    assert health.skipped_bytes >= 3000
+    assert 0 < len(cols["ATT"]["Roll"]) < 400
+    assert np.all(np.diff(cols["ATT"]["TimeUS"]) > 0)
+    assert np.all(np.abs(cols["ATT"]["Roll"]) < 10)     # no garbage decoded as attitude
+
+
+def test_tlog_files_go_through_the_score_paths(tmp_path):
+    path = tmp_path / "flight.tlog"
+    path.write_bytes(tlog_bytes(1000))
+    metrics = compute_flight_metrics(str(path))
+    assert 0 < metrics["flight_score"] <= 100
+    assert metrics["data_complete"]
+    degrade, series = analyze_log(str(path))
+    assert degrade["vcc_min"] < 4.8
+    assert series["arm_time"] is not None
@@ -0,0 +1,107 @@
+import os
+import shutil
+
+import pytest
+
+import analysis_service
+import log_ingest
+import results_store
+import watch_folder
+from compute_flightscore import compute_flight_score
+from results_store import ResultsStore
+from synthetic_log import write_log
+from watch_folder import Watcher
+
+
+def _watch(root, store, **kw):
+    Watcher(str(root), store, workers=2, settle_s=0.0, poll_s=0.05, **kw).run(once=True)
+
+
+@pytest.fixture
+def drop(tmp_path):
+    root = tmp_path / "drop"
+    root.mkdir()
+    write_log(str(root / "f1.bin"), 500, seed=1)
+    write_log(str(root / "f2.bin"), 500, seed=2)
+    shutil.copy(root / "f1.bin", root / "f1 copy.bin")
+    (root / "notes.txt").write_text("not a log")
+    return root
+
+
+def test_new_logs_are_scored_once_per_content(drop, tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    _watch(drop, store)
+    for kind in ("metrics", "degrade"):
+        assert len(store.entries(kind)) == 2
+
+    digest = analysis_service.file_digest(str(drop / "f2.bin"))
+    key = log_ingest.ref_digest(digest, str(drop / "f2.bin"))
+    assert store.get("metrics", key)["flight_score"] == pytest.approx(
+        compute_flight_score(str(drop / "f2.bin")))
+
+
+def test_restart_does_not_rescore(drop, tmp_path, monkeypatch):
+    db = str(tmp_path / "results.sqlite")
+    _watch(drop, ResultsStore(db))
+
+    store = ResultsStore(db)
+    puts = []
+    monkeypatch.setattr(store, "put", lambda *a, **kw: puts.append(a))
+    _watch(drop, store)
+    assert puts == []
+
+
+def test_pages_read_the_store_before_computing(drop, tmp_path, monkeypatch):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    _watch(drop, store)
+    monkeypatch.setattr(results_store, "_shared", store)
+
+    def fail(*a, **kw):
+        raise AssertionError("computed a stored result")
+    monkeypatch.setattr(analysis_service, "run_analysis", fail)
+
+    path = str(drop / "f1 copy.bin")
+    digest = analysis_service.file_digest(path)
+    score = analysis_service.analyze("score", path, digest=digest, url="http://127.0.0.1:9")
+    assert score == pytest.approx(compute_flight_score(path))
+
+
+def _crash_on_f2(kind, ref, memory_budget_mb):
+    if ref.endswith("f2.bin"):
+        os._exit(1)     # a worker killed mid-analysis, e.g. by the OOM killer
+    return watch_folder.to_jsonable(watch_folder.run_analysis(kind, ref, memory_budget_mb))
+
+
+def _fail_on_f2(kind, ref, memory_budget_mb):
+    if ref.endswith("f2.bin"):
+        raise ValueError("corrupt log")
+    return watch_folder.to_jsonable(watch_folder.run_analysis(kind, ref, memory_budget_mb))
+
+
+def test_copies_of_a_failing_log_fail_once(drop, tmp_path, monkeypatch):
+    monkeypatch.setattr(watch_folder, "_analyze", _fail_on_f2)
+    shutil.copy(drop / "f2.bin", drop / "copy of f2.bin")
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    _watch(drop, store)
+
+    f2 = str(drop / "f2.bin")
+    key = log_ingest.ref_digest(analysis_service.file_digest(f2), f2)
+    assert store.attempts("metrics", key) == store.attempts("degrade", key) == 1
+
+
+def test_crashing_log_is_given_up_on(drop, tmp_path, monkeypatch):
+    monkeypatch.setattr(watch_folder, "_analyze", _crash_on_f2)
+    shutil.copy(drop / "f2.bin", drop / "copy of f2.bin")
+    db = str(tmp_path / "results.sqlite")
+    store = ResultsStore(db)
+    _watch(drop, store, max_attempts=2)
+
+    f2 = str(drop / "f2.bin")
+    key = log_ingest.ref_digest(analysis_service.file_digest(f2), f2)
+    assert store.attempts("metrics", key) == 2
+    assert store.get("metrics", key) is None
+    assert len(store.entries("metrics")) == len(store.entries("degrade")) == 1
+
+    # given up on across restarts too
+    _watch(drop, ResultsStore(db), max_attempts=2)
+    assert ResultsStore(db).attempts("metrics", key) == 2
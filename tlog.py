@@ -0,0 +1,325 @@
+"""
+MAVLink telemetry logs (.tlog) decoded into the DataFlash column schema.
+
+A .tlog, as ground stations write it, is a run of records
+
+    <uint64 big-endian receive time, us since the Unix epoch><MAVLink v1 or v2 packet>
+
+TlogDecoder frames and decodes them with array operations, keeps only
+the message types TLOG_COLUMNS maps onto DataFlash names (ATTITUDE ->
+ATT, VIBRATION -> VIBE, SYS_STATUS -> BAT, ...), converts them to the
+DataFlash units and returns the {name: {column: np.ndarray}} layout of
+dataflash.StreamDecoder, so the scoring and degradation code runs on
+telemetry unchanged.  log_ingest.log_decoder() picks the decoder by
+file name.
+
+TimeUS is the receive time from the first record of the log.  Telemetry
+has no MOTB, MCU or EV equivalent, nor the hover throttle (CTUN.ThH);
+those columns come back empty, as for a DataFlash log without them.
+"""
+
+import numpy as np
+
+from dataflash import LogHealth
+
+STX_V1 = 0xFE
+STX_V2 = 0xFD
+
+# receive time + the largest v2 packet (header, payload, crc, signature)
+MAX_RECORD = 8 + 10 + 255 + 2 + 13
+# bytes past a record start needed to judge it: the record and the
+# header of the one after it
+_HORIZON = MAX_RECORD + 8 + 10
+
+
+# ---------------- MESSAGES ----------------
+#
+# Wire layout (fields sorted by size, as MAVLink sends them) of the
+# common-dialect messages read here.  v2 senders drop trailing zero
+# bytes of a payload; they are zero-filled back before decoding.
+
+MAVLINK_MESSAGES = {
+    "HEARTBEAT": (0, np.dtype([
+        ("custom_mode", "<u4"), ("type", "u1"), ("autopilot", "u1"),
+        ("base_mode", "u1"), ("system_status", "u1"), ("mavlink_version", "u1")])),
+    "SYS_STATUS": (1, np.dtype([
+        ("present", "<u4"), ("enabled", "<u4"), ("health", "<u4"), ("load", "<u2"),
+        ("voltage_battery", "<u2"), ("current_battery", "<i2"), ("drop_rate_comm", "<u2"),
+        ("errors_comm", "<u2"), ("errors_count", "<u2", 4), ("battery_remaining", "i1")])),
+    "PARAM_VALUE": (22, np.dtype([
+        ("param_value", "<f4"), ("param_count", "<u2"), ("param_index", "<u2"),
+        ("param_id", "S16"), ("param_type", "u1")])),
+    "RAW_IMU": (27, np.dtype([
+        ("time_usec", "<u8"), ("xacc", "<i2"), ("yacc", "<i2"), ("zacc", "<i2"),
+        ("xgyro", "<i2"), ("ygyro", "<i2"), ("zgyro", "<i2"),
+        ("xmag", "<i2"), ("ymag", "<i2"), ("zmag", "<i2"), ("id", "u1"),
+        ("temperature", "<i2")])),
+    "ATTITUDE": (30, np.dtype([
+        ("time_boot_ms", "<u4"), ("roll", "<f4"), ("pitch", "<f4"), ("yaw", "<f4"),
+        ("rollspeed", "<f4"), ("pitchspeed", "<f4"), ("yawspeed", "<f4")])),
+    "SERVO_OUTPUT_RAW": (36, np.dtype(
+        [("time_usec", "<u4")] + [(f"servo{k}_raw", "<u2") for k in range(1, 9)]
+        + [("port", "u1")])),
+    "VFR_HUD": (74, np.dtype([
+        ("airspeed", "<f4"), ("groundspeed", "<f4"), ("alt", "<f4"), ("climb", "<f4"),
+        ("heading", "<i2"), ("throttle", "<u2")])),
+    "POWER_STATUS": (125, np.dtype([("Vcc", "<u2"), ("Vservo", "<u2"), ("flags", "<u2")])),
+    "VIBRATION": (241, np.dtype([
+        ("time_usec", "<u8"), ("vibration_x", "<f4"), ("vibration_y", "<f4"),
+        ("vibration_z", "<f4"), ("clipping_0", "<u4"), ("clipping_1", "<u4"),
+        ("clipping_2", "<u4")])),
+}
+
+MAV_AUTOPILOT_INVALID = 8           # heartbeats of ground stations, not vehicles
+MAV_MODE_FLAG_SAFETY_ARMED = 128
+
+RAD_TO_DEG = 180.0 / np.pi
+
+# DataFlash message -> (MAVLink message, (field, value) rows must have or
+# None, {column: (field, scale (None: string), value meaning "unknown")})
+TLOG_COLUMNS = {
+    "ATT": ("ATTITUDE", None, {
+        "Roll": ("roll", RAD_TO_DEG, None),
+        "Pitch": ("pitch", RAD_TO_DEG, None),
+    }),
+    "VIBE": ("VIBRATION", None, {
+        "VibeX": ("vibration_x", 1.0, None),
+        "VibeY": ("vibration_y", 1.0, None),
+        "VibeZ": ("vibration_z", 1.0, None),
+    }),
+    "BAT": ("SYS_STATUS", None, {
+        "Volt": ("voltage_battery", 1e-3, 0xFFFF),      # mV
+        "Curr": ("current_battery", 1e-2, -1),          # cA
+    }),
+    "POWR": ("POWER_STATUS", None, {
+        "Vcc": ("Vcc", 1e-3, None),                     # mV
+    }),
+    "CTUN": ("VFR_HUD", None, {
+        "ThO": ("throttle", 1e-2, None),                # percent
+    }),
+    "RCOU": ("SERVO_OUTPUT_RAW", ("port", 0), {
+        f"C{k}": (f"servo{k}_raw", 1.0, None) for k in range(1, 9)
+    }),
+    # ArduPilot sends RAW_IMU gyro rates in mrad/s; first IMU only
+    "IMU": ("RAW_IMU", ("id", 0), {
+        "GyrX": ("xgyro", 1e-3, None),
+        "GyrY": ("ygyro", 1e-3, None),
+        "GyrZ": ("zgyro", 1e-3, None),
+    }),
+    "PARM": ("PARAM_VALUE", None, {
+        "Name": ("param_id", None, None),
+        "Value": ("param_value", 1.0, None),
+    }),
+}
+# ARM rows are the arming transitions of the vehicle's HEARTBEAT base_mode
+
+
+# ---------------- FRAMING ----------------
+
+def _chain(nxt, first):
+    """first, nxt[first], nxt[nxt[first]], ... up to a negative entry (pointer doubling)."""
+    n = len(nxt)
+    jump = np.append(np.where(nxt < 0, n, nxt), n)
+    path = np.array([first])
+    while True:
+        ext = jump[path]            # jump is nxt applied len(path) times
+        stop = np.flatnonzero(ext == n)
+        if len(stop):
+            return np.concatenate((path, ext[:stop[0]]))
+        path = np.concatenate((path, ext))
+        jump = jump[jump]
+
+
+def _payloads(raw, offsets, lengths, dtype):
+    """Records of dtype from the payloads at offsets, zero-filled to full size."""
+    cols = np.arange(dtype.itemsize)
+    idx = np.minimum(offsets[:, None] + cols, len(raw) - 1)
+    mat = np.where(cols < lengths[:, None], raw[idx], 0).astype(np.uint8)
+    return mat.view(dtype).reshape(-1)
+
+
+class TlogDecoder:
+    """
+    Incremental .tlog decoder with the interface of dataflash.StreamDecoder
+    (feed / flush / finish / drain / health).
+
+    Packet starts are found with a vectorised byte search; a record is
+    only taken when the next record starts exactly where its length says
+    it ends (or the log ends there), so bytes inside payloads that look
+    like packet starts, and damaged regions, are never decoded.  Chains
+    of records are followed by pointer doubling, so framing costs a few
+    array passes per block rather than a Python step per message.
+    """
+
+    def __init__(self, wanted):
+        self.wanted = wanted
+        self._maps = {name: TLOG_COLUMNS[name] for name in wanted if name in TLOG_COLUMNS}
+        self._out = self._empty()
+        self._tail = b""
+        self._base = 0
+        self._damaged = []
+        self._flushed = False
+        self._t0 = None         # receive time of the first record
+        self._armed = False
+
+    def _empty(self):
+        return {name: {c: [] for c in cols} for name, cols in self.wanted.items()}
+
+    def _bad(self, start, end):
+        if end <= start:
+            return
+        if self._damaged and self._damaged[-1][1] == start:
+            self._damaged[-1] = (self._damaged[-1][0], end)
+        else:
+            self._damaged.append((start, end))
+
+    def feed(self, block):
+        self._consume(self._tail + bytes(block) if self._tail else bytes(block), final=False)
+
+    def flush(self):
+        """End of stream: frame the last records, count any cut-off bytes."""
+        if not self._flushed:
+            self._flushed = True
+            self._consume(self._tail, final=True)
+
+    def _consume(self, data, final):
+        n = len(data)
+        base = self._base
+        raw = np.frombuffer(data + bytes(16), dtype=np.uint8)     # header lookups past n
+        m = np.flatnonzero((raw[8:n] == STX_V1) | (raw[8:n] == STX_V2)) + 8
+        limit = n if final else n - _HORIZON
+
+        pos = 0
+        taken = []
+        pending = False
+        if len(m):
+            v2 = raw[m] == STX_V2
+            end = (m + np.where(v2, 10, 6) + raw[m + 1] + 2
+                   + np.where(v2 & (raw[m + 2] & 1 == 1), 13, 0))
+            j = np.minimum(np.searchsorted(m, end + 8), len(m) - 1)
+            nxt = np.where(m[j] == end + 8, j, -1)
+            ok = (nxt >= 0) | (final & (end == n))
+            live = int(np.searchsorted(m, limit + 8))   # records starting before limit
+
+            while True:
+                k = int(np.searchsorted(m, pos + 8))
+                cand = np.flatnonzero(ok[k:live])
+                if not len(cand):
+                    break
+                i = k + int(cand[0])
+                self._bad(base + pos, base + int(m[i]) - 8)
+                sub = nxt[i:live] - i
+                sub[(nxt[i:live] < 0) | (nxt[i:live] >= live)] = -1
+                path = _chain(sub, 0) + i
+                last = int(path[-1])
+                if nxt[last] >= live:
+                    # followed by a record we cannot judge yet
+                    taken.append(path)
+                    pos = int(m[nxt[last]]) - 8
+                    pending = True
+                    break
+                if final and end[last] == n:
+                    taken.append(path)
+                    pos = n
+                    break
+                # the last one is not followed by a record: damage starts there
+                taken.append(path[:-1])
+                pos = int(m[last]) - 8
+
+        if final:
+            self._bad(base + pos, base + n)     # cut off mid-record
+            pos = n
+        elif not pending and limit > pos:
+            # no record starts in [pos, limit): damaged, do not carry it
+            self._bad(base + pos, base + limit)
+            pos = limit
+
+        if taken:
+            self._emit(raw, m[np.concatenate(taken)])
+        self._tail = bytes(data[pos:])
+        self._base = base + pos
+
+    # ---- decoding ----
+
+    def _emit(self, raw, marks):
+        if not len(marks):
+            return
+        v2 = raw[marks] == STX_V2
+        msgid = np.where(v2, raw[marks + 7].astype(np.int64)
+                         | raw[marks + 8].astype(np.int64) << 8
+                         | raw[marks + 9].astype(np.int64) << 16,
+                         raw[marks + 5])
+        offsets = marks + np.where(v2, 10, 6)
+        lengths = raw[marks + 1]
+        ts = raw[(marks - 8)[:, None] + np.arange(8)].copy().view(">u8").reshape(-1)
+        if self._t0 is None:
+            self._t0 = int(ts[0])
+        time_us = (ts - self._t0).astype(np.float64)
+
+        def rows(mav, where=None):
+            msg_id, dtype = MAVLINK_MESSAGES[mav]
+            sel = np.flatnonzero(msgid == msg_id)
+            recs = _payloads(raw, offsets[sel], lengths[sel], dtype)
+            t = time_us[sel]
+            if where is not None:
+                keep = recs[where[0]] == where[1]
+                recs, t = recs[keep], t[keep]
+            return recs, t
+
+        for name, (mav, where, cols) in self._maps.items():
+            recs, t = rows(mav, where)
+            dest = self._out[name]
+            for c in dest:
+                if c == "TimeUS":
+                    dest[c].append(t)
+                elif c in cols:
+                    dest[c].append(_convert(recs[cols[c][0]], *cols[c][1:]))
+
+        if "ARM" in self.wanted:
+            self._arm_rows(*rows("HEARTBEAT"))
+
+    def _arm_rows(self, hb, t):
+        vehicle = hb["autopilot"] != MAV_AUTOPILOT_INVALID
+        hb, t = hb[vehicle], t[vehicle]
+        if not len(hb):
+            return
+        armed = (hb["base_mode"] & MAV_MODE_FLAG_SAFETY_ARMED) > 0
+        before = np.concatenate(([self._armed], armed[:-1]))
+        change = armed != before
+        self._armed = bool(armed[-1])
+        dest = self._out["ARM"]
+        if "TimeUS" in dest:
+            dest["TimeUS"].append(t[change])
+        if "ArmState" in dest:
+            dest["ArmState"].append(armed[change].astype(np.float64))
+
+    # ---- results ----
+
+    def health(self):
+        """LogHealth of everything fed so far (call after finish() / flush())."""
+        size = self._base + len(self._tail)
+        return LogHealth.from_regions(size, list(self._damaged))
+
+    def finish(self):
+        self.flush()
+        return self._columns()
+
+    def _columns(self):
+        return {name: {c: np.concatenate(v) if v else np.array([], dtype=float)
+                       for c, v in cols.items()}
+                for name, cols in self._out.items()}
+
+    def drain(self):
+        """Columns decoded since the last drain(); they are not kept."""
+        cols = self._columns()
+        self._out = self._empty()
+        return cols
+
+
+def _convert(values, scale, missing):
+    if scale is None:
+        return np.array([v.decode("ascii", errors="ignore") for v in values], dtype=object)
+    out = values.astype(np.float64) * scale
+    if missing is not None:
+        out[values == missing] = np.nan
+    return out
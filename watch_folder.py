@@ -0,0 +1,362 @@
+"""
+Watch-folder ingestion daemon.
+
+    python watch_folder.py /srv/flight_logs --workers 4 --db fleet.sqlite
+
+Ground stations drop logs into a shared directory after each flight.
+The daemon picks up every complete log, hashes it, skips content it has
+already analysed, and runs the FlightScore metrics and the degradation
+report (analyze_log + assess_subsystems) on a worker pool.  Results go
+to the results store, where analysis_service finds them, so the pages
+have them ready before anyone opens them.
+
+- Changes are noticed with inotify on Linux, falling back to polling.
+- A file is only taken once its size and mtime have been unchanged for
+  --settle seconds, so logs still being copied are not read half-written.
+- At most --max-pending analyses are in flight; further files wait in
+  the queue un-hashed until workers free up (backpressure).
+- The store records each file's digest and every finished result, so a
+  restarted daemon neither re-hashes unchanged files nor rescores logs.
+- Each new metrics result is folded into the fleet sketches (--fleet,
+  see fleet_norm.py) that the pages use for fleet percentiles.
+- A worker that dies (say, out of memory) is replaced.  The analyses
+  that were running with it are rerun one at a time, so the crash is
+  pinned on the right log; failures are counted in the store per
+  content digest (copies of a log are analysed once) and a log is given
+  up on after --max-attempts, across restarts too.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import log_ingest
+from analysis_service import MEMORY_BUDGET_MB, run_analysis, to_jsonable
+from fleet_norm import FLEET_SKETCHES, FleetSketches
+from results_store import ResultsStore
+
+log = logging.getLogger("watch_folder")
+
+# analyses run for every new log
+WATCH_KINDS = ("metrics", "degrade")
+
+LOG_SUFFIXES = (".bin", log_ingest.TLOG_SUFFIX) + log_ingest.COMPRESSED_SUFFIXES
+
+
+# ---------------- DIRECTORY EVENTS ----------------
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+
+class DirectoryEvents:
+    """
+    wait(timeout) returns once something in the directory changed or the
+    timeout passed.  Uses inotify through libc where available; otherwise
+    it simply sleeps and the caller's rescan does the polling.
+    """
+
+    def __init__(self, root):
+        self.fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+            if libc.inotify_add_watch(fd, os.fsencode(root), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            self.fd = fd
+        except (OSError, AttributeError, TypeError) as ex:
+            log.info("inotify unavailable (%s), polling", ex)
+
+    @property
+    def mode(self):
+        return "inotify" if self.fd is not None else "polling"
+
+    def wait(self, timeout):
+        if self.fd is None:
+            time.sleep(timeout)
+            return True
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+# ---------------- WORKER ----------------
+
+def _analyze(kind, ref, memory_budget_mb):
+    return to_jsonable(run_analysis(kind, ref, memory_budget_mb))
+
+
+def _sha256(path, chunk_bytes=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_bytes), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ---------------- WATCHER ----------------
+
+class Watcher:
+    def __init__(self, root, store, workers=2, settle_s=5.0, poll_s=2.0,
+                 max_pending=None, memory_budget_mb=MEMORY_BUDGET_MB, fleet_path=None,
+                 max_attempts=3):
+        self.root = os.path.abspath(root)
+        self.store = store
+        self.settle_s = settle_s
+        self.poll_s = poll_s
+        self.max_pending = max_pending or 2 * workers
+        self.memory_budget_mb = memory_budget_mb
+        self.max_attempts = max_attempts
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.events = DirectoryEvents(self.root)
+        self.fleet_path = fleet_path
+        self.fleet = FleetSketches.load(fleet_path) if fleet_path else None
+
+        self._stat = {}         # path -> (size, mtime, unchanged since)
+        self._done = set()      # (path, size, mtime) fully handled
+        self._queued = set()
+        self._queue = deque()   # settled paths not yet hashed
+        self._jobs = deque()    # (kind, key, ref, name) waiting for a worker
+        self._inflight = {}     # future -> (kind, key, ref, name)
+        self._claimed = set()   # (kind, key) queued, running or failed this run
+        self._suspects = deque()  # jobs running when a worker died, rerun alone
+
+    # ---- discovery ----
+
+    def scan(self):
+        """Queue logs whose size and mtime have settled."""
+        now = time.monotonic()
+        present = set()
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.lower().endswith(LOG_SUFFIXES):
+                    continue
+                st = entry.stat()
+                path = entry.path
+                present.add(path)
+                sig = (st.st_size, st.st_mtime)
+                if (path, *sig) in self._done or path in self._queued:
+                    continue
+                prev = self._stat.get(path)
+                if prev is None or prev[:2] != sig:
+                    self._stat[path] = (*sig, now)
+                elif now - prev[2] >= self.settle_s:
+                    self._queue.append(path)
+                    self._queued.add(path)
+
+        for path in [p for p in self._stat if p not in present]:
+            del self._stat[path]
+
+    @property
+    def settling(self):
+        return any(p not in self._queued for p in self._stat)
+
+    # ---- ingestion ----
+
+    def _ingest(self, path):
+        self._queued.discard(path)
+        size, mtime, _ = self._stat.pop(path, (None, None, None))
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        if (st.st_size, st.st_mtime) != (size, mtime):
+            return      # changed again since it settled: scan() will retake it
+
+        digest = self.store.file_digest(path, st.st_size, st.st_mtime)
+        if digest is None:
+            digest = _sha256(path)
+            self.store.remember_file(path, st.st_size, st.st_mtime, digest)
+
+        try:
+            refs = log_ingest.list_logs(path)
+        except Exception as ex:     # unreadable archive
+            log.warning("skipping %s: %s", path, ex)
+            refs = []
+
+        for ref in refs:
+            key = log_ingest.ref_digest(digest, ref)
+            have = self.store.kinds(key)
+            for kind in WATCH_KINDS:
+                if kind in have or (kind, key) in self._claimed or self._given_up(kind, key):
+                    continue    # done, or the same content under another name
+                self._jobs.append((kind, key, ref, log_ingest.log_name(ref)))
+                self._claimed.add((kind, key))
+
+        self._done.add((path, st.st_size, st.st_mtime))
+
+    def _given_up(self, kind, key):
+        return self.store.attempts(kind, key) >= self.max_attempts
+
+    def _start(self, job):
+        kind, key, ref, name = job
+        try:
+            fut = self.pool.submit(_analyze, kind, ref, self.memory_budget_mb)
+        except BrokenProcessPool:
+            self._jobs.appendleft(job)
+            self._recover()
+            return False
+        self._inflight[fut] = job
+        return True
+
+    def _submit(self):
+        if self._suspects:
+            # after a worker died: one job at a time until the culprit is found
+            if not self._inflight:
+                self._start(self._suspects.popleft())
+            return
+        while self._jobs and len(self._inflight) < self.max_pending:
+            kind, key, ref, name = job = self._jobs.popleft()
+            if kind in self.store.kinds(key) or self._given_up(kind, key):
+                continue
+            if not self._start(job):
+                return
+
+    def _failed(self, job, ex):
+        kind, key, ref, name = job
+        attempts = self.store.record_failure(kind, key, ex, name=name)
+        if attempts >= self.max_attempts:
+            log.error("%s %s failed %d times, giving up: %s", kind, name, attempts, ex)
+        else:
+            # left out of the results, so the next restart retries it
+            log.warning("%s %s failed: %s", kind, name, ex)
+
+    def _recover(self):
+        """Replace a pool whose worker died; sort out the jobs that were on it."""
+        broken = []
+        for fut, job in list(self._inflight.items()):
+            if fut.done() and fut.exception() is None:
+                continue    # finished before the crash: _collect stores it
+            self._inflight.pop(fut)
+            broken.append(job)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        if len(broken) == 1:
+            self._failed(broken[0], "worker process died")
+            if not self._given_up(*broken[0][:2]):
+                self._suspects.append(broken[0])
+        else:
+            log.warning("worker process died, rerunning %d analyses one at a time", len(broken))
+            self._suspects.extend(broken)
+
+    def _collect(self, timeout=0):
+        if not self._inflight:
+            return
+        done, _ = wait(list(self._inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+        if any(isinstance(fut.exception(), BrokenProcessPool) for fut in done):
+            self._recover()
+            done = [fut for fut in done if fut in self._inflight]
+        fleet_changed = False
+        for fut in done:
+            job = kind, key, ref, name = self._inflight.pop(fut)
+            try:
+                result = fut.result()
+                self.store.put(kind, key, result, name=name, ref=ref)
+                self._claimed.discard((kind, key))
+                log.info("%s %s done", kind, name)
+            except Exception as ex:
+                self._failed(job, ex)
+                continue
+            if kind == "metrics" and self.fleet is not None:
+                self.fleet.add(result)
+                fleet_changed = True
+        if fleet_changed:
+            self.fleet.save(self.fleet_path)
+
+    def step(self):
+        """One scan / ingest / submit / collect round."""
+        self.scan()
+        self._collect()
+        while self._queue and not self._jobs and len(self._inflight) < self.max_pending:
+            self._ingest(self._queue.popleft())
+            self._submit()
+        self._submit()
+
+    @property
+    def idle(self):
+        return not (self._stat or self._queue or self._jobs or self._inflight or self._suspects)
+
+    def run(self, once=False):
+        """
+        Process the directory until interrupted.  once=True returns as soon
+        as everything present has been analysed (settle delay included).
+        """
+        log.info("watching %s (%s)", self.root, self.events.mode)
+        try:
+            while True:
+                self.step()
+                if once and self.idle:
+                    return
+                if self._inflight:
+                    self._collect(timeout=self.poll_s)
+                elif self.settling or self._queue or self.events.mode == "polling":
+                    self.events.wait(min(self.poll_s, self.settle_s))
+                else:
+                    self.events.wait(60.0)
+        finally:
+            self.close()
+
+    def close(self):
+        self.events.close()
+        self.pool.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Score flight logs dropped into a directory")
+    ap.add_argument("root", help="directory the ground stations write logs to")
+    ap.add_argument("--db", default=None, help="results store (default: FLIGHT_RESULTS_DB)")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--settle", type=float, default=5.0,
+                    help="seconds a file must stay unchanged before it is read")
+    ap.add_argument("--poll", type=float, default=2.0)
+    ap.add_argument("--max-pending", type=int, default=None,
+                    help="analyses in flight at once (default: 2 x workers)")
+    ap.add_argument("--memory-budget-mb", type=float, default=MEMORY_BUDGET_MB)
+    ap.add_argument("--fleet", default=FLEET_SKETCHES,
+                    help="fleet sketch file new metrics are added to ('' to disable)")
+    ap.add_argument("--max-attempts", type=int, default=3,
+                    help="failed attempts after which a log is given up on")
+    ap.add_argument("--once", action="store_true", help="exit when the directory is done")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    watcher = Watcher(args.root, ResultsStore(args.db), args.workers, args.settle,
+                      args.poll, args.max_pending, args.memory_budget_mb, args.fleet or None,
+                      args.max_attempts)
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()